@@ -8,9 +8,12 @@ import time
 from datetime import datetime
 from playwright.sync_api import sync_playwright
 
+from agent.cache.menu_store import MenuStore
+
 # 路徑配置
 PROFILE_PATH = os.path.join(os.path.dirname(__file__), "chromium_profile")
 RESULTS_PATH = os.path.join(os.path.dirname(__file__), "results")
+MENU_STORE_PATH = os.path.join(RESULTS_PATH, "menu_store.db")
 
 def find_latest_search_result():
     """找到最新的搜尋結果 JSON"""
@@ -165,6 +168,12 @@ def main():
         
         print(f"[OK] JSON saved: {json_path}")
         
+        # 寫入菜單快取（05_add_to_cart.py / LINE bot 評分都從這裡讀）
+        menu_store = MenuStore(MENU_STORE_PATH)
+        changed = menu_store.save(store_url, {"name": store_name, "menu_items": menu_items})
+        menu_store.close()
+        print(f"[OK] Menu store updated: {MENU_STORE_PATH} ({'changed' if changed else 'unchanged'})")
+        
         # 輸出摘要
         print("\n" + "=" * 60)
         print("RESULT")
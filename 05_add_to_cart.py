@@ -9,9 +9,12 @@ import time
 from datetime import datetime
 from playwright.sync_api import sync_playwright
 
+from agent.cache.menu_store import MenuStore
+
 # 路徑配置
 PROFILE_PATH = os.path.join(os.path.dirname(__file__), "chromium_profile")
 RESULTS_PATH = os.path.join(os.path.dirname(__file__), "results")
+MENU_STORE_PATH = os.path.join(RESULTS_PATH, "menu_store.db")
 
 def find_latest_menu_result():
     """找到最新的菜單結果 JSON"""
@@ -21,6 +24,30 @@ def find_latest_menu_result():
     latest = sorted(json_files)[-1]
     return os.path.join(RESULTS_PATH, latest)
 
+def load_latest_menu():
+    """
+    讀取 03_scrape_menu.py 最近抓取的菜單
+    以 results/ 底下最新的 JSON 決定是哪一家店（menu store 與 LINE bot 共用，
+    「最近寫入」不一定是 03 抓的店），再從 menu store 讀這家店的菜單，沒有才用 JSON 內容
+    """
+    menu_json = find_latest_menu_result()
+    if not menu_json:
+        return None
+    
+    print(f"\n[*] Reading menu result: {os.path.basename(menu_json)}")
+    with open(menu_json, "r", encoding="utf-8") as f:
+        menu_data = json.load(f)
+    
+    if os.path.exists(MENU_STORE_PATH) and menu_data.get("store_url"):
+        menu_store = MenuStore(MENU_STORE_PATH)
+        stored = menu_store.get(menu_data["store_url"])
+        menu_store.close()
+        if stored:
+            print(f"[*] Menu items from menu store: {os.path.basename(MENU_STORE_PATH)}")
+            menu_data["menu_items"] = stored["menu_items"]
+    
+    return menu_data
+
 def add_item_to_cart(page, item_name):
     """尋找並點擊指定品項加入購物車"""
     print(f"\n[*] Looking for menu item...")
@@ -167,17 +194,12 @@ def main():
     print("=" * 60)
     
     # 讀取上一步的菜單結果
-    menu_json = find_latest_menu_result()
-    if not menu_json:
+    menu_data = load_latest_menu()
+    if not menu_data:
         print("\n[ERROR] No menu result found!")
         print("Please run 03_scrape_menu.py first.")
         return
     
-    print(f"\n[*] Reading menu result: {os.path.basename(menu_json)}")
-    
-    with open(menu_json, "r", encoding="utf-8") as f:
-        menu_data = json.load(f)
-    
     store_url = menu_data["store_url"]
     store_name = menu_data["store_name"]
     
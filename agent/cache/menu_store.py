@@ -0,0 +1,270 @@
+"""
+Menu Store - 店家菜單持久化快取（SQLite）
+以 store UUID 為 key，記錄最後抓取時間、內容 hash 與 TTL；
+菜單項目另存一張表，價格轉成數字並建索引，評分 / 購物車 / 菜單補充都從這裡讀
+"""
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from agent.scrapers.ubereats.parsing import parse_price
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stores (
+    store_uuid    TEXT PRIMARY KEY,
+    url           TEXT NOT NULL,
+    name          TEXT,
+    rating        REAL,
+    review_count  TEXT,
+    delivery_fee  TEXT,
+    service_fee   TEXT,
+    min_order     TEXT,
+    content_hash  TEXT NOT NULL,
+    scraped_at    REAL NOT NULL,
+    changed_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_stores_url ON stores(url);
+CREATE INDEX IF NOT EXISTS idx_stores_scraped_at ON stores(scraped_at);
+
+CREATE TABLE IF NOT EXISTS menu_items (
+    store_uuid   TEXT NOT NULL REFERENCES stores(store_uuid) ON DELETE CASCADE,
+    position     INTEGER NOT NULL,
+    name         TEXT NOT NULL,
+    price_text   TEXT,
+    price        REAL,
+    description  TEXT,
+    PRIMARY KEY (store_uuid, position)
+);
+CREATE INDEX IF NOT EXISTS idx_menu_items_price ON menu_items(store_uuid, price);
+CREATE INDEX IF NOT EXISTS idx_menu_items_name ON menu_items(name);
+"""
+
+# scrape_store 回傳的表頭欄位（和 StorePageSnapshot.HEADER_FIELDS 對應）
+STORE_FIELDS = ("name", "rating", "review_count", "delivery_fee", "service_fee", "min_order")
+
+def store_uuid_from_url(store_url: str) -> str:
+    """
+    從店家 URL 取出 store UUID
+    Uber Eats 店家 URL 格式：/tw/store/<slug>/<base64url 編碼的 UUID>
+    解不出來時用正規化 URL 的 hash（同一家店仍然對到同一個 key）
+    """
+    parsed = urlparse(store_url or "")
+    segments = [s for s in parsed.path.split("/") if s]
+    if "store" in segments:
+        tail = segments[segments.index("store") + 1:]
+        if len(tail) >= 2:
+            encoded = tail[1]
+            try:
+                raw = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+                if len(raw) == 16:
+                    return str(uuid.UUID(bytes=raw))
+            except (ValueError, TypeError):
+                pass
+            return encoded
+
+    normalized = f"{parsed.netloc}{parsed.path}".rstrip("/").lower()
+    return "url-" + hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+def content_hash(store_info: Dict) -> str:
+    """表頭欄位 + 菜單項目的 hash（判斷店家頁內容是否變動）"""
+    payload = {
+        "fields": {key: store_info.get(key) for key in STORE_FIELDS},
+        "items": [
+            (item.get("name"), item.get("price"), item.get("description"))
+            for item in store_info.get("menu_items", [])
+        ],
+    }
+    return hashlib.sha1(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+class MenuStore:
+    """店家菜單 SQLite 快取（可跨 thread 使用）"""
+
+    def __init__(self, db_path: str, ttl: float = 86400):
+        """
+        Args:
+            db_path: SQLite 檔案路徑（":memory:" 可用於測試）
+            ttl: 菜單新鮮度秒數，超過視為過期（讀得到但 fresh=False）
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        self._stats = {"reads": 0, "fresh_hits": 0, "stale_hits": 0, "misses": 0, "writes": 0, "unchanged": 0}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def save(self, store_url: str, store_info: Dict, scraped_at: Optional[float] = None) -> bool:
+        """
+        寫入 scrape_store 結果
+
+        Returns:
+            內容是否有變動（沒變只更新 scraped_at，不重寫菜單）
+        """
+        store_uuid = store_uuid_from_url(store_url)
+        digest = content_hash(store_info)
+        now = scraped_at if scraped_at is not None else time.time()
+
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT content_hash FROM stores WHERE store_uuid = ?", (store_uuid,)
+            ).fetchone()
+
+            if row and row["content_hash"] == digest:
+                self._conn.execute(
+                    "UPDATE stores SET scraped_at = ?, url = ? WHERE store_uuid = ?",
+                    (now, store_url, store_uuid),
+                )
+                self._stats["unchanged"] += 1
+                return False
+
+            self._conn.execute(
+                """
+                INSERT INTO stores (store_uuid, url, name, rating, review_count, delivery_fee,
+                                    service_fee, min_order, content_hash, scraped_at, changed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(store_uuid) DO UPDATE SET
+                    url = excluded.url, name = excluded.name, rating = excluded.rating,
+                    review_count = excluded.review_count, delivery_fee = excluded.delivery_fee,
+                    service_fee = excluded.service_fee, min_order = excluded.min_order,
+                    content_hash = excluded.content_hash, scraped_at = excluded.scraped_at,
+                    changed_at = excluded.changed_at
+                """,
+                (
+                    store_uuid, store_url,
+                    *(store_info.get(key) for key in STORE_FIELDS),
+                    digest, now, now,
+                ),
+            )
+            self._conn.execute("DELETE FROM menu_items WHERE store_uuid = ?", (store_uuid,))
+            self._conn.executemany(
+                """
+                INSERT INTO menu_items (store_uuid, position, name, price_text, price, description)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (store_uuid, position, item["name"], item.get("price"),
+                     parse_price(item.get("price")), item.get("description"))
+                    for position, item in enumerate(store_info.get("menu_items", []))
+                    if item.get("name")
+                ],
+            )
+            self._stats["writes"] += 1
+            return True
+
+    def get(self, store_url: str, max_age: Optional[float] = None) -> Optional[Dict]:
+        """
+        讀取單一店家（scrape_store 格式，另加 store_url / store_uuid / scraped_at / fresh）
+
+        Args:
+            max_age: 只接受幾秒內抓的資料（預設不限，用 fresh 欄位判斷）
+        """
+        result = self.get_many([store_url], max_age=max_age)
+        return result.get(store_url)
+
+    def get_many(self, store_urls: Iterable[str], max_age: Optional[float] = None) -> Dict[str, Dict]:
+        """
+        批次讀取（一次查詢），回傳 {store_url: store_info}
+        max_age 內沒有資料的店家不會出現在結果中
+        """
+        by_uuid = {}
+        for url in store_urls:
+            if url:
+                by_uuid.setdefault(store_uuid_from_url(url), url)
+        if not by_uuid:
+            return {}
+
+        now = time.time()
+        placeholders = ",".join("?" * len(by_uuid))
+        with self._lock:
+            stores = self._conn.execute(
+                f"SELECT * FROM stores WHERE store_uuid IN ({placeholders})", tuple(by_uuid)
+            ).fetchall()
+            items = self._conn.execute(
+                f"""
+                SELECT store_uuid, name, price_text, price, description FROM menu_items
+                WHERE store_uuid IN ({placeholders}) ORDER BY store_uuid, position
+                """,
+                tuple(by_uuid),
+            ).fetchall()
+
+        items_by_store: Dict[str, List[Dict]] = {}
+        for row in items:
+            items_by_store.setdefault(row["store_uuid"], []).append({
+                "name": row["name"],
+                "price": row["price_text"],
+                "price_value": row["price"],
+                "description": row["description"],
+            })
+
+        result = {}
+        for row in stores:
+            age = now - row["scraped_at"]
+            if max_age is not None and age > max_age:
+                continue
+            fresh = age <= self.ttl
+            self._stats["fresh_hits" if fresh else "stale_hits"] += 1
+            result[by_uuid[row["store_uuid"]]] = {
+                **{key: row[key] for key in STORE_FIELDS},
+                "menu_items": items_by_store.get(row["store_uuid"], []),
+                "store_url": row["url"],
+                "store_uuid": row["store_uuid"],
+                "scraped_at": row["scraped_at"],
+                "fresh": fresh,
+            }
+
+        self._stats["reads"] += len(by_uuid)
+        self._stats["misses"] += len(by_uuid) - len(result)
+        return result
+
+    def get_fresh_many(self, store_urls: Iterable[str]) -> Dict[str, Dict]:
+        """只回傳 TTL 內的店家"""
+        return self.get_many(store_urls, max_age=self.ttl)
+
+    def find_items(
+        self,
+        store_url: str,
+        name_contains: Optional[str] = None,
+        max_price: Optional[float] = None,
+    ) -> List[Dict]:
+        """查詢單一店家的菜單項目（依名稱關鍵字 / 價格上限，價格由低到高）"""
+        sql = "SELECT name, price_text, price, description FROM menu_items WHERE store_uuid = ?"
+        params: list = [store_uuid_from_url(store_url)]
+        if name_contains:
+            sql += " AND name LIKE ?"
+            params.append(f"%{name_contains}%")
+        if max_price is not None:
+            sql += " AND price IS NOT NULL AND price <= ?"
+            params.append(max_price)
+        sql += " ORDER BY price IS NULL, price, position"
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            {"name": r["name"], "price": r["price_text"], "price_value": r["price"], "description": r["description"]}
+            for r in rows
+        ]
+
+    def get_stats(self) -> Dict:
+        """讀寫統計 + 店家數"""
+        with self._lock:
+            stores = self._conn.execute("SELECT COUNT(*) FROM stores").fetchone()[0]
+            fresh = self._conn.execute(
+                "SELECT COUNT(*) FROM stores WHERE scraped_at >= ?", (time.time() - self.ttl,)
+            ).fetchone()[0]
+        return {**self._stats, "stores": stores, "fresh_stores": fresh, "ttl": self.ttl}
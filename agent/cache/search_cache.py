@@ -0,0 +1,169 @@
+"""
+Search Cache - 搜尋結果快取
+以「正規化搜尋字串 + 外送地點」為 key，快取 scraper 抓回的候選店家（TTL + LRU）
+命中時不開瀏覽器，呼叫端直接用各用戶自己的 intent 重新評分（worker_v2._rank）
+
+Stale-while-revalidate：超過 soft TTL（ttl）但未超過 hard TTL（stale_ttl）的快取仍會回傳，
+標記 stale=True，由呼叫端在背景重新抓取
+"""
+import copy
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 評分結果是每個用戶各自算的，不放進快取
+SCORE_FIELDS = ("score", "score_detail")
+
+class CacheEntry:
+    """單筆快取：候選店家 + 菜單資料（可能沒有）"""
+
+    __slots__ = ("restaurants", "menu_data", "created_at", "hits", "stale")
+
+    def __init__(
+        self,
+        restaurants: List[Dict],
+        menu_data: Optional[Dict],
+        created_at: float,
+        stale: bool = False,
+    ):
+        self.restaurants = restaurants
+        self.menu_data = menu_data
+        self.created_at = created_at
+        self.hits = 0
+        self.stale = stale  # 超過 soft TTL，需要背景更新
+
+class SearchCache:
+    """搜尋結果快取（TTL + LRU）"""
+
+    def __init__(
+        self,
+        ttl: float = 300,
+        max_entries: int = 256,
+        clock: Callable[[], float] = time.monotonic,
+        stale_ttl: Optional[float] = None,
+    ):
+        """
+        Args:
+            ttl: soft TTL，每筆快取新鮮的秒數
+            max_entries: 最多幾筆，超過時淘汰最久沒用的
+            clock: 時間來源（預設 time.monotonic）
+            stale_ttl: hard TTL，超過 ttl 但在此秒數內仍回傳（stale=True）；
+                None 或不大於 ttl = 關閉 stale-while-revalidate
+        """
+        self.ttl = ttl
+        self.stale_ttl = max(ttl, stale_ttl or 0)
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple[str, str], CacheEntry]" = OrderedDict()
+        self._stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "expirations": 0,
+            "evictions": 0,
+            "stores": 0,
+            "revalidations": 0,
+            "ranking_changed": 0,
+        }
+
+    @staticmethod
+    def make_key(search_query: str, location: str) -> Tuple[str, str]:
+        """
+        正規化 key：全形 / 半形統一、大小寫、多餘空白
+        「宵夜 辣」「宵夜　辣」「 宵夜  辣 」視為同一個查詢
+        """
+        query = unicodedata.normalize("NFKC", search_query or "").lower()
+        query = " ".join(query.split())
+        location = " ".join(unicodedata.normalize("NFKC", location or "").lower().split())
+        return query, location
+
+    def get(self, search_query: str, location: str, allow_expired: bool = False) -> Optional[CacheEntry]:
+        """
+        取得快取（回傳副本，呼叫端可自由修改）
+
+        Args:
+            allow_expired: 超過 hard TTL 但還沒被淘汰的也回傳（stale=True，過載降級用）
+
+        Returns:
+            CacheEntry（超過 soft TTL 時 stale=True），超過 hard TTL 或不存在回傳 None
+        """
+        key = self.make_key(search_query, location)
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+
+        age = self._clock() - entry.created_at
+        if age > self.stale_ttl and not allow_expired:
+            del self._entries[key]
+            self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return None
+
+        stale = age > self.ttl
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        self._stats["stale_hits" if stale else "hits"] += 1
+        return CacheEntry(
+            copy.deepcopy(entry.restaurants),
+            copy.deepcopy(entry.menu_data),
+            entry.created_at,
+            stale=stale,
+        )
+
+    def is_fresh(self, search_query: str, location: str) -> bool:
+        """是否有 TTL 內的快取（不計入命中統計、不影響 LRU 順序，給預熱用）"""
+        entry = self._entries.get(self.make_key(search_query, location))
+        return entry is not None and self._clock() - entry.created_at <= self.ttl
+
+    def contains(self, search_query: str, location: str, allow_expired: bool = False) -> bool:
+        """是否有 hard TTL 內（新鮮或 stale）的快取（不計入統計、不影響 LRU 順序，給排程分流用）"""
+        entry = self._entries.get(self.make_key(search_query, location))
+        if entry is None:
+            return False
+        return allow_expired or self._clock() - entry.created_at <= self.stale_ttl
+
+    def put(
+        self,
+        search_query: str,
+        location: str,
+        restaurants: List[Dict],
+        menu_data: Optional[Dict] = None,
+    ):
+        """寫入快取（存副本，並去掉評分欄位）"""
+        key = self.make_key(search_query, location)
+        stored = [
+            {k: v for k, v in r.items() if k not in SCORE_FIELDS}
+            for r in copy.deepcopy(restaurants)
+        ]
+        self._entries[key] = CacheEntry(stored, copy.deepcopy(menu_data), self._clock())
+        self._entries.move_to_end(key)
+        self._stats["stores"] += 1
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def record_revalidation(self, ranking_changed: bool):
+        """記錄一次背景更新，以及更新後推薦排名是否改變"""
+        self._stats["revalidations"] += 1
+        if ranking_changed:
+            self._stats["ranking_changed"] += 1
+
+    def get_stats(self) -> Dict:
+        """命中 / 未命中 / 淘汰 / stale 統計"""
+        served = self._stats["hits"] + self._stats["stale_hits"]
+        lookups = served + self._stats["misses"]
+        revalidations = self._stats["revalidations"]
+        return {
+            **self._stats,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+            "hit_rate": round(served / lookups, 3) if lookups else 0.0,
+            "stale_rate": round(self._stats["stale_hits"] / served, 3) if served else 0.0,
+            "ranking_change_rate": round(self._stats["ranking_changed"] / revalidations, 3) if revalidations else 0.0,
+        }
@@ -0,0 +1,71 @@
+"""
+Single Flight - 合併同時進行中的相同請求
+同一個 key 同時只跑一次：第一個呼叫者（leader）執行，其他呼叫者（follower）
+等同一個 future 的結果；leader 被取消時，follower 會重新搶 leader 自己執行
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    """async 請求合併（單一 event loop 內使用）"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._stats = {"leaders": 0, "followers": 0, "errors": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        執行 fn()，同一個 key 進行中時直接等待進行中的結果
+
+        Returns:
+            fn() 的結果（leader 與 follower 拿到同一個物件，需要修改請自行複製）
+        """
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                break
+
+            self._stats["followers"] += 1
+            try:
+                # shield：follower 自己被取消時不影響 leader
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if future.cancelled():
+                    # leader 被取消，重新搶 leader
+                    self._stats["followers"] -= 1
+                    continue
+                raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self._stats["leaders"] += 1
+
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            self._stats["errors"] += 1
+            future.set_exception(e)
+            # 沒有 follower 時避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def in_flight(self) -> int:
+        """目前進行中的 key 數"""
+        return len(self._inflight)
+
+    def get_stats(self) -> Dict:
+        """leader / follower 次數與合併比例（follower 佔所有呼叫的比例）"""
+        calls = self._stats["leaders"] + self._stats["followers"]
+        return {
+            **self._stats,
+            "in_flight": len(self._inflight),
+            "coalescing_ratio": round(self._stats["followers"] / calls, 3) if calls else 0.0,
+        }
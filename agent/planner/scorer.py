@@ -4,6 +4,8 @@ Scoring Engine - 評分引擎
 """
 from typing import List, Dict, Optional
 
+from agent.scrapers.ubereats.parsing import parse_price
+
 class ScoringEngine:
     """餐廳評分引擎"""
     
@@ -109,8 +111,7 @@ class ScoringEngine:
         if not budget:
             return 0.8  # 無預算限制，給中等分數
         
-        # 如果有菜單資料，估算實際價格
-        # 這裡簡化：用店名判斷價位（實際應該用菜單平均價格）
+        # 有菜單資料用實際價格，沒有才用店名判斷價位
         estimated_price = self._estimate_price(restaurant, menu_data)
         
         if estimated_price is None:
@@ -268,11 +269,29 @@ class ScoringEngine:
     ) -> Optional[float]:
         """
         估算餐廳價位
-        如果有菜單資料，用平均價格；否則用店名判斷
-        """
-        # TODO: 實際實作應該用菜單資料計算平均價格
-        # 這裡簡化版本：用店名推測
+        如果有菜單資料，用菜單價格中位數；否則用店名判斷
         
+        menu_data 格式：{store_url: UberEatsMenuScraper.scrape_store 結果 / MenuStore.get 結果}
+        """
+        if menu_data:
+            store = menu_data.get(restaurant.get("url"))
+            if store:
+                # MenuStore 讀出的項目已有數字價格（price_value），剛抓的才需要解析
+                prices = sorted(
+                    price for price in (
+                        item.get("price_value") or parse_price(item.get("price"))
+                        for item in store.get("menu_items", [])
+                    )
+                    if price
+                )
+                if prices:
+                    # 中位數：避免飲料 / 加點小菜 / 家庭餐拉偏平均
+                    mid = len(prices) // 2
+                    if len(prices) % 2:
+                        return prices[mid]
+                    return (prices[mid - 1] + prices[mid]) / 2
+        
+        # 沒有菜單資料：用店名推測
         name = restaurant.get("name", "").lower()
         
         # 簡易價位判斷
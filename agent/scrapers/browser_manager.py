@@ -2,14 +2,39 @@
 Browser Manager - 統一管理 Playwright 瀏覽器實例
 """
 import os
+from typing import Optional
 from playwright.sync_api import sync_playwright, Browser, BrowserContext, Page
 
+from agent.scrapers.resource_blocking import BlockingProfile, ResourceBlocker
+from agent.scrapers.recording import FixtureReplayer, har_path, save_page_html
+
 class BrowserManager:
     """管理持久化的 Chromium 瀏覽器實例"""
     
-    def __init__(self, profile_path: str, headless: bool = False):
+    def __init__(
+        self,
+        profile_path: str,
+        headless: bool = False,
+        blocking_profile: Optional[BlockingProfile] = None,
+        record_dir: Optional[str] = None,
+        replay_dir: Optional[str] = None,
+    ):
+        """
+        Args:
+            profile_path: Chromium profile 路徑
+            headless: 是否無頭模式
+            blocking_profile: 要攔截的資源（None = 不攔截）
+            record_dir: 錄製模式，HAR + 頁面 HTML 存到這個資料夾
+            replay_dir: 重播模式，從這個資料夾回放，完全不連網
+        """
+        if record_dir and replay_dir:
+            raise ValueError("record_dir and replay_dir are mutually exclusive")
+        
         self.profile_path = profile_path
         self.headless = headless
+        self.blocker = ResourceBlocker(blocking_profile) if blocking_profile else None
+        self.record_dir = record_dir
+        self.replayer = FixtureReplayer(replay_dir) if replay_dir else None
         self.playwright = None
         self.context = None
         
@@ -17,24 +42,48 @@ class BrowserManager:
         """Context manager 進入"""
         self.playwright = sync_playwright().start()
         
+        record_options = {}
+        if self.record_dir:
+            # HAR 在 context 關閉時寫入
+            record_options = {
+                "record_har_path": har_path(self.record_dir),
+                "record_har_content": "embed",
+            }
+        
         self.context = self.playwright.chromium.launch_persistent_context(
             user_data_dir=self.profile_path,
             headless=self.headless,
             viewport={"width": 1280, "height": 900},
             locale="zh-TW",
             timezone_id="Asia/Taipei",
-            args=["--disable-blink-features=AutomationControlled"]
+            args=["--disable-blink-features=AutomationControlled"],
+            **record_options
         )
         
+        if self.blocker:
+            self.context.route("**/*", self.blocker.handle_sync)
+        if self.replayer:
+            # 後註冊的 route 先執行：replay 攔下所有請求
+            self.context.route("**/*", self.replayer.handle_sync)
+        
         return self.context
     
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Context manager 退出"""
+        if self.blocker:
+            print(f"[BrowserManager] Requests: {self.blocker.stats.to_dict()}")
+        if self.replayer:
+            print(f"[BrowserManager] Replay: {self.replayer.stats}")
         if self.context:
             self.context.close()
         if self.playwright:
             self.playwright.stop()
     
+    def save_html(self, page: Page, label: str):
+        """錄製模式：存下目前頁面的 HTML（replay 時用來回應 document 請求）"""
+        if self.record_dir:
+            save_page_html(page.content(), page.url, self.record_dir, label)
+    
     def get_page(self, context: BrowserContext) -> Page:
         """取得或建立新頁面"""
         if context.pages:
@@ -0,0 +1,65 @@
+"""
+Deadline - 單一任務的整體時間預算
+任務進 Queue 時建立，一路傳到解析、導航、抽取、菜單補充與推送；
+各階段用剩餘時間決定自己的 timeout（不超過原本的上限），預算用完就回傳已拿到的部分結果
+
+以 epoch 秒記錄到期時間（time.time），可以寫進磁碟 Queue、傳給分片子程序
+"""
+import time
+from typing import Optional
+
+class Deadline:
+    """任務到期時間"""
+
+    __slots__ = ("expires_at",)
+
+    def __init__(self, expires_at: float):
+        """
+        Args:
+            expires_at: 到期時間（epoch 秒）
+        """
+        self.expires_at = expires_at
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        """從現在起 seconds 秒後到期"""
+        return cls(time.time() + seconds)
+
+    @classmethod
+    def from_epoch(cls, expires_at: Optional[float]) -> Optional["Deadline"]:
+        """從 Queue / 分片訊息中的到期時間還原（None 表示沒有預算限制）"""
+        return cls(expires_at) if expires_at is not None else None
+
+    def remaining(self) -> float:
+        """剩餘秒數（不小於 0）"""
+        return max(0.0, self.expires_at - time.time())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def shrink(self, seconds: float) -> "Deadline":
+        """提早 seconds 秒到期的子預算（保留時間給後面的階段，例如推送）"""
+        return Deadline(self.expires_at - seconds)
+
+    def timeout(self, cap: float, reserve: float = 0.0) -> float:
+        """
+        階段 timeout（秒）：min(原本的上限, 剩餘時間 - 保留給後面階段的時間)
+
+        Returns:
+            不小於 0；呼叫端自行判斷 0 是否要跳過這個階段
+        """
+        return max(0.0, min(cap, self.remaining() - reserve))
+
+    def timeout_ms(self, cap_ms: int, reserve: float = 0.0) -> int:
+        """
+        Playwright 用的 timeout（毫秒）
+        注意 Playwright 的 timeout=0 代表「不限時」，所以最少回傳 1
+        """
+        return max(1, int(self.timeout(cap_ms / 1000, reserve) * 1000))
+
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.1f}s)"
+
+def stage_timeout_ms(deadline: Optional[Deadline], cap_ms: int, reserve: float = 0.0) -> int:
+    """沒有 deadline 時用原本的上限，有的話用剩餘時間縮短"""
+    return deadline.timeout_ms(cap_ms, reserve) if deadline else cap_ms
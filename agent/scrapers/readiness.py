@@ -0,0 +1,168 @@
+"""
+Readiness - 以具體訊號取代固定 sleep
+等待 selector 出現、卡片數量穩定或 DOM 停止變動，
+每個等待都有上限，並記錄實際花費的時間
+"""
+import time
+from typing import Dict, List
+
+# 卡片數量 > 0 且 settle_ms 內沒有變化 → 視為穩定
+COUNT_SETTLED_JS = """
+({selector, settleMs, timeoutMs}) => new Promise((resolve) => {
+    const count = () => document.querySelectorAll(selector).length;
+    let last = count();
+    let settleTimer = null;
+    let hardTimer = null;
+    let observer = null;
+
+    const finish = (settled) => {
+        if (observer) observer.disconnect();
+        clearTimeout(settleTimer);
+        clearTimeout(hardTimer);
+        resolve({count: count(), settled});
+    };
+    const arm = () => {
+        clearTimeout(settleTimer);
+        settleTimer = setTimeout(() => finish(true), settleMs);
+    };
+
+    observer = new MutationObserver(() => {
+        const n = count();
+        if (n !== last) {
+            last = n;
+            if (n > 0) arm();
+        }
+    });
+    observer.observe(document.documentElement, {childList: true, subtree: true});
+    hardTimer = setTimeout(() => finish(false), timeoutMs);
+    if (last > 0) arm();
+})
+"""
+
+# idle_ms 內沒有任何 DOM 變動 → 視為 idle
+DOM_IDLE_JS = """
+({idleMs, timeoutMs}) => new Promise((resolve) => {
+    let idleTimer = null;
+    let hardTimer = null;
+    let observer = null;
+
+    const finish = (idle) => {
+        if (observer) observer.disconnect();
+        clearTimeout(idleTimer);
+        clearTimeout(hardTimer);
+        resolve(idle);
+    };
+    const arm = () => {
+        clearTimeout(idleTimer);
+        idleTimer = setTimeout(() => finish(true), idleMs);
+    };
+
+    observer = new MutationObserver(arm);
+    observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+    hardTimer = setTimeout(() => finish(false), timeoutMs);
+    arm();
+})
+"""
+
+class _ReadinessBase:
+    """共用的等待紀錄"""
+
+    def __init__(self, page):
+        self.page = page
+        self.wait_log: List[Dict] = []
+
+    def reset(self):
+        """清除紀錄（每次搜尋 / 抓取開始時呼叫）"""
+        self.wait_log = []
+
+    def _record(self, signal: str, target: str, started: float, satisfied: bool) -> float:
+        """記錄一次等待，回傳耗時（ms）"""
+        elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+        self.wait_log.append({
+            "signal": signal,
+            "target": target,
+            "elapsed_ms": elapsed_ms,
+            "satisfied": satisfied,
+        })
+        status = "ok" if satisfied else "timeout"
+        print(f"[Readiness] {signal}({target}) {status} in {elapsed_ms}ms")
+        return elapsed_ms
+
+    def total_wait_ms(self) -> float:
+        """所有等待的總耗時"""
+        return round(sum(entry["elapsed_ms"] for entry in self.wait_log), 1)
+
+class Readiness(_ReadinessBase):
+    """同步版（playwright.sync_api）"""
+
+    def selector(self, selector: str, timeout_ms: int = 10000) -> bool:
+        """等待 selector 出現在 DOM"""
+        started = time.monotonic()
+        try:
+            self.page.wait_for_selector(selector, state="attached", timeout=timeout_ms)
+            satisfied = True
+        except Exception:
+            satisfied = False
+        self._record("selector", selector, started, satisfied)
+        return satisfied
+
+    def count_settled(self, selector: str, settle_ms: int = 500, timeout_ms: int = 8000) -> int:
+        """等待符合 selector 的元素數量穩定，回傳最後的數量"""
+        started = time.monotonic()
+        try:
+            result = self.page.evaluate(
+                COUNT_SETTLED_JS,
+                {"selector": selector, "settleMs": settle_ms, "timeoutMs": timeout_ms},
+            )
+        except Exception:
+            # 例如等待期間發生導航，execution context 被銷毀
+            result = {"count": 0, "settled": False}
+        self._record("count_settled", selector, started, result["settled"])
+        return result["count"]
+
+    def dom_idle(self, idle_ms: int = 300, timeout_ms: int = 3000) -> bool:
+        """等待 DOM 在 idle_ms 內沒有變動"""
+        started = time.monotonic()
+        try:
+            idle = self.page.evaluate(DOM_IDLE_JS, {"idleMs": idle_ms, "timeoutMs": timeout_ms})
+        except Exception:
+            idle = False
+        self._record("dom_idle", f"{idle_ms}ms", started, idle)
+        return idle
+
+class AsyncReadiness(_ReadinessBase):
+    """非同步版（playwright.async_api）"""
+
+    async def selector(self, selector: str, timeout_ms: int = 10000) -> bool:
+        """等待 selector 出現在 DOM"""
+        started = time.monotonic()
+        try:
+            await self.page.wait_for_selector(selector, state="attached", timeout=timeout_ms)
+            satisfied = True
+        except Exception:
+            satisfied = False
+        self._record("selector", selector, started, satisfied)
+        return satisfied
+
+    async def count_settled(self, selector: str, settle_ms: int = 500, timeout_ms: int = 8000) -> int:
+        """等待符合 selector 的元素數量穩定，回傳最後的數量"""
+        started = time.monotonic()
+        try:
+            result = await self.page.evaluate(
+                COUNT_SETTLED_JS,
+                {"selector": selector, "settleMs": settle_ms, "timeoutMs": timeout_ms},
+            )
+        except Exception:
+            result = {"count": 0, "settled": False}
+        self._record("count_settled", selector, started, result["settled"])
+        return result["count"]
+
+    async def dom_idle(self, idle_ms: int = 300, timeout_ms: int = 3000) -> bool:
+        """等待 DOM 在 idle_ms 內沒有變動"""
+        started = time.monotonic()
+        try:
+            idle = await self.page.evaluate(DOM_IDLE_JS, {"idleMs": idle_ms, "timeoutMs": timeout_ms})
+        except Exception:
+            idle = False
+        self._record("dom_idle", f"{idle_ms}ms", started, idle)
+        return idle
@@ -0,0 +1,150 @@
+"""
+Recording - 錄製 / 重播 scraper 的網路流量
+record：context 用 record_har_path 存 HAR，並另存頁面 HTML
+replay：以 route.fulfill 回放 HAR 與 HTML，完全不連網（離線 benchmark 用）
+"""
+import os
+import re
+import json
+import base64
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+PAGES_INDEX = "pages.json"
+
+def fixture_name(query: str) -> str:
+    """查詢字串 → 錄製資料夾名稱（中文 / 特殊字元轉為 hash）"""
+    digest = hashlib.sha1(query.encode("utf-8")).hexdigest()[:10]
+    return f"query_{digest}"
+
+def har_path(fixture_dir: str, label: str = "session") -> str:
+    """錄製用的 HAR 路徑（每個 context 一個檔案）"""
+    os.makedirs(fixture_dir, exist_ok=True)
+    return os.path.join(fixture_dir, f"{label}.har")
+
+def _strip_fragment(url: str) -> str:
+    return url.split("#", 1)[0]
+
+def save_page_html(html: str, url: str, fixture_dir: str, label: str) -> str:
+    """存下頁面 HTML，並在 pages.json 記錄 URL → 檔案"""
+    pages_dir = os.path.join(fixture_dir, "pages")
+    os.makedirs(pages_dir, exist_ok=True)
+
+    safe_label = re.sub(r"[^\w\-]+", "_", label)
+    filename = f"{safe_label}.html"
+    with open(os.path.join(pages_dir, filename), "w", encoding="utf-8") as f:
+        f.write(html)
+
+    index_path = os.path.join(fixture_dir, PAGES_INDEX)
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    index[_strip_fragment(url)] = filename
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+
+    return filename
+
+class FixtureReplayer:
+    """
+    以錄製資料回應所有請求（route handler）
+    - document 請求：優先用另存的 HTML
+    - 其他請求：依 (method, url) 找 HAR entry；同一 URL 多筆時依序輪流
+    - 找不到：abort（不連網）
+    - fixture_dir 底下的子資料夾（每個查詢一份錄製資料）也一併載入，可把多個查詢合併到同一個重播目錄
+    """
+
+    def __init__(self, fixture_dir: str):
+        self.fixture_dir = fixture_dir
+        self.entries: Dict[Tuple[str, str], List[Dict]] = {}
+        self.pages: Dict[str, str] = {}
+        self._cursor: Dict[Tuple[str, str], int] = {}
+        self.stats = {"served_har": 0, "served_html": 0, "missed": 0}
+        self._load()
+
+    def _load(self):
+        if not os.path.isdir(self.fixture_dir):
+            raise FileNotFoundError(f"Fixture directory not found: {self.fixture_dir}")
+
+        self._load_dir(self.fixture_dir)
+        for name in sorted(os.listdir(self.fixture_dir)):
+            sub_dir = os.path.join(self.fixture_dir, name)
+            if name != "pages" and os.path.isdir(sub_dir):
+                self._load_dir(sub_dir)
+
+        print(f"[Replay] Loaded {sum(len(v) for v in self.entries.values())} HAR entries, "
+              f"{len(self.pages)} pages from {self.fixture_dir}")
+
+    def _load_dir(self, fixture_dir: str):
+        """載入單一錄製資料夾的 HAR 與 pages.json"""
+        for filename in sorted(os.listdir(fixture_dir)):
+            if filename.endswith(".har"):
+                with open(os.path.join(fixture_dir, filename), "r", encoding="utf-8") as f:
+                    har = json.load(f)
+                for entry in har.get("log", {}).get("entries", []):
+                    if entry["response"].get("status", 0) <= 0:
+                        # 錄製時被 abort 的請求
+                        continue
+                    request = entry["request"]
+                    key = (request["method"], _strip_fragment(request["url"]))
+                    self.entries.setdefault(key, []).append(entry["response"])
+
+        index_path = os.path.join(fixture_dir, PAGES_INDEX)
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            for url, filename in index.items():
+                with open(os.path.join(fixture_dir, "pages", filename), "r", encoding="utf-8") as f:
+                    self.pages[url] = f.read()
+
+    def _lookup(self, request) -> Optional[Dict]:
+        """回傳 route.fulfill 的參數，找不到則回傳 None"""
+        url = _strip_fragment(request.url)
+
+        if request.resource_type == "document" and url in self.pages:
+            self.stats["served_html"] += 1
+            return {
+                "status": 200,
+                "content_type": "text/html; charset=utf-8",
+                "body": self.pages[url],
+            }
+
+        key = (request.method, url)
+        responses = self.entries.get(key)
+        if not responses:
+            self.stats["missed"] += 1
+            return None
+
+        idx = self._cursor.get(key, 0)
+        self._cursor[key] = idx + 1
+        response = responses[idx % len(responses)]
+
+        content = response.get("content", {})
+        text = content.get("text", "")
+        body = base64.b64decode(text) if content.get("encoding") == "base64" else text.encode("utf-8")
+        headers = {
+            h["name"]: h["value"]
+            for h in response.get("headers", [])
+            # body 已解壓 / 重組，這些 header 不再正確
+            if h["name"].lower() not in ("content-encoding", "content-length", "transfer-encoding")
+        }
+
+        self.stats["served_har"] += 1
+        return {"status": response.get("status", 200), "headers": headers, "body": body}
+
+    def handle_sync(self, route):
+        """playwright.sync_api 用"""
+        fulfill = self._lookup(route.request)
+        if fulfill is None:
+            route.abort("internetdisconnected")
+        else:
+            route.fulfill(**fulfill)
+
+    async def handle_async(self, route):
+        """playwright.async_api 用"""
+        fulfill = self._lookup(route.request)
+        if fulfill is None:
+            await route.abort("internetdisconnected")
+        else:
+            await route.fulfill(**fulfill)
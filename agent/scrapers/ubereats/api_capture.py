@@ -0,0 +1,262 @@
+"""
+Uber Eats API 回應擷取
+搜尋頁的 store card 由 XHR / fetch 回傳的 JSON 產生，
+直接監聽 page.on("response") 解析 feed / search API，比走訪 DOM 便宜，
+也能在頁面 render 完成前就拿到結果（DOM 解析保留為 fallback）
+"""
+import re
+import time
+from typing import Dict, List, Optional
+
+# feed / search API 路徑（/_p/api/ 底下）
+FEED_API_MARKERS = [
+    "/_p/api/getFeedV1",
+    "/_p/api/getSearchFeedV1",
+    "/_p/api/getInstantSearchV1",
+    "/_p/api/getStoresV1",
+]
+
+STORE_URL_TEMPLATE = "https://www.ubereats.com/tw/store/{slug}/{uuid}"
+
+def is_feed_response(response) -> bool:
+    """是否為 feed / search API 的成功回應"""
+    if response.status != 200:
+        return False
+    return any(marker in response.url for marker in FEED_API_MARKERS)
+
+def _text(value) -> Optional[str]:
+    """API 的文字欄位可能是字串或 {"text": ...}"""
+    if isinstance(value, str):
+        return value.strip() or None
+    if isinstance(value, dict):
+        for key in ("text", "title", "accessibilityText"):
+            if isinstance(value.get(key), str) and value[key].strip():
+                return value[key].strip()
+    return None
+
+def _iter_texts(value):
+    """遞迴取出所有文字（用來掃 meta / signposts 之類的陣列）"""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from _iter_texts(v)
+    elif isinstance(value, list):
+        for v in value:
+            yield from _iter_texts(v)
+
+def _parse_rating(store: Dict) -> tuple:
+    """回傳 (rating, review_count)"""
+    rating_field = store.get("rating")
+    rating = None
+    review_count = None
+
+    if isinstance(rating_field, (int, float)):
+        rating = float(rating_field)
+    else:
+        rating_text = _text(rating_field)
+        if rating_text:
+            match = re.search(r'(\d+(?:\.\d+)?)', rating_text)
+            if match:
+                rating = float(match.group(1))
+
+    # 評論數：「評分：4.7 顆星. 500+ 評論」或 ratingCount 欄位
+    for key in ("ratingCount", "reviewCount", "numRatings"):
+        if store.get(key) is not None:
+            review_count = str(_text(store[key]) or store[key])
+            break
+    if review_count is None and isinstance(rating_field, dict):
+        accessibility = rating_field.get("accessibilityText") or ""
+        match = re.search(r'([\d,]+\+?)\s*(?:評論|ratings?|reviews?)', accessibility)
+        if match:
+            review_count = match.group(1)
+
+    if rating is not None and not 0 <= rating <= 5:
+        rating = None
+    return rating, review_count
+
+def _parse_eta_and_fee(store: Dict) -> tuple:
+    """回傳 (eta, delivery_fee)"""
+    eta = _text(store.get("etaRange")) or _text(store.get("eta"))
+    fee = _text(store.get("deliveryFee")) or _text(store.get("fareBadge"))
+
+    if eta is None or fee is None:
+        for text in _iter_texts(store.get("meta") or store.get("signposts") or []):
+            if eta is None and ("分鐘" in text or "min" in text.lower()):
+                eta = text.strip()
+            elif fee is None and ("$" in text or "運費" in text or "fee" in text.lower()):
+                fee = text.strip()
+
+    return eta, fee
+
+def _store_url(store: Dict, uuid: str) -> Optional[str]:
+    action_url = store.get("actionUrl")
+    if isinstance(action_url, str) and "/store/" in action_url:
+        return action_url if action_url.startswith("http") else f"https://www.ubereats.com{action_url}"
+    slug = store.get("slug")
+    if slug and uuid:
+        return STORE_URL_TEMPLATE.format(slug=slug, uuid=uuid)
+    return None
+
+def parse_store(store: Dict) -> Optional[Dict]:
+    """把 API 的 store 物件轉為 restaurant record（格式與 DOM 解析相同，另加 API 才有的欄位）"""
+    uuid = store.get("storeUuid") or store.get("uuid")
+    name = _text(store.get("title")) or _text(store.get("name"))
+    if not uuid or not name:
+        return None
+
+    rating, review_count = _parse_rating(store)
+    eta, delivery_fee = _parse_eta_and_fee(store)
+
+    return {
+        "name": name,
+        "rating": rating,
+        "review_count": review_count,
+        "eta": eta,
+        "url": _store_url(store, uuid) or "https://www.ubereats.com/tw",
+        "store_uuid": uuid,
+        "delivery_fee": delivery_fee,
+        "price_bucket": _text(store.get("priceBucket")),
+        "source": "api",
+    }
+
+def parse_feed_payload(payload) -> List[Dict]:
+    """
+    從 feed JSON 中找出所有 store 物件
+    回應結構常變動，這裡不依賴固定路徑：遞迴找帶 storeUuid 的 dict
+    """
+    records = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if node.get("storeUuid") or (node.get("uuid") and "title" in node and "rating" in node):
+                record = parse_store(node)
+                if record:
+                    records.append(record)
+                    return
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(payload)
+    return records
+
+class FeedResponseCollector:
+    """
+    監聽 page 的 response 事件，收集 feed API 解析出的餐廳（依 store UUID 去重）
+
+    同步版：collector.attach_sync(page) / collector.wait_for_records_sync(page)
+    非同步版：collector.attach_async(page) / await collector.wait_for_records_async(page)
+
+    第一份 feed 回應可能只是第一頁，使用結果前用 wait_for_settled_* 等到
+    解析中的回應都完成、且 settle_ms 內沒有新回應
+    """
+
+    def __init__(self):
+        self.records: List[Dict] = []
+        self.responses = 0
+        self.errors = 0
+        self.first_record_ms: Optional[float] = None
+        self._seen_uuids = set()
+        self._started = time.monotonic()
+        self._last_response = self._started  # 最後一份 feed 回應解析完的時間
+        self._parsing = 0  # 收到 response、body 還在解析中的 feed 回應數
+        self._handler = None
+
+    def ingest(self, payload):
+        """解析一份 JSON payload"""
+        self.responses += 1
+        for record in parse_feed_payload(payload):
+            if record["store_uuid"] in self._seen_uuids:
+                continue
+            self._seen_uuids.add(record["store_uuid"])
+            self.records.append(record)
+        if self.records and self.first_record_ms is None:
+            self.first_record_ms = round((time.monotonic() - self._started) * 1000, 1)
+        self._last_response = time.monotonic()
+
+    def clear(self):
+        """丟棄目前收到的結果（例如首頁 feed，不是搜尋結果）"""
+        self.records = []
+        self._seen_uuids = set()
+        self.first_record_ms = None
+
+    def handle_sync(self, response):
+        if not is_feed_response(response):
+            return
+        try:
+            self.ingest(response.json())
+        except Exception as e:
+            self.errors += 1
+            print(f"[ApiCapture] Failed to parse {response.url[:80]}: {e}")
+
+    async def handle_async(self, response):
+        if not is_feed_response(response):
+            return
+        self._parsing += 1
+        try:
+            self.ingest(await response.json())
+        except Exception as e:
+            self.errors += 1
+            print(f"[ApiCapture] Failed to parse {response.url[:80]}: {e}")
+        finally:
+            self._parsing -= 1
+
+    def attach_sync(self, page):
+        self._handler = self.handle_sync
+        page.on("response", self._handler)
+
+    def attach_async(self, page):
+        self._handler = self.handle_async
+        page.on("response", self._handler)
+
+    def detach(self, page):
+        if self._handler:
+            page.remove_listener("response", self._handler)
+            self._handler = None
+
+    def wait_for_records_sync(self, page, timeout_ms: int = 5000, poll_ms: int = 100) -> bool:
+        """等到收到至少一筆餐廳（wait_for_timeout 期間事件照常派送）"""
+        deadline = time.monotonic() + timeout_ms / 1000
+        while not self.records and time.monotonic() < deadline:
+            page.wait_for_timeout(poll_ms)
+        return bool(self.records)
+
+    async def wait_for_records_async(self, page, timeout_ms: int = 5000, poll_ms: int = 100) -> bool:
+        deadline = time.monotonic() + timeout_ms / 1000
+        while not self.records and time.monotonic() < deadline:
+            await page.wait_for_timeout(poll_ms)
+        return bool(self.records)
+
+    def settled(self, settle_ms: int = 600, enough: Optional[int] = None) -> bool:
+        """有結果、沒有解析中的回應，且 settle_ms 內沒有新回應（或已收到 enough 筆）"""
+        if not self.records or self._parsing:
+            return False
+        if enough and len(self.records) >= enough:
+            return True
+        return (time.monotonic() - self._last_response) * 1000 >= settle_ms
+
+    def wait_for_settled_sync(self, page, settle_ms: int = 600, timeout_ms: int = 3000,
+                              enough: Optional[int] = None, poll_ms: int = 100) -> bool:
+        """等 feed 結果穩定（後續分頁的回應都收完）；逾時回傳 False，目前的結果可能不完整"""
+        deadline = time.monotonic() + timeout_ms / 1000
+        while not self.settled(settle_ms, enough) and time.monotonic() < deadline:
+            page.wait_for_timeout(poll_ms)
+        return self.settled(settle_ms, enough)
+
+    async def wait_for_settled_async(self, page, settle_ms: int = 600, timeout_ms: int = 3000,
+                                     enough: Optional[int] = None, poll_ms: int = 100) -> bool:
+        deadline = time.monotonic() + timeout_ms / 1000
+        while not self.settled(settle_ms, enough) and time.monotonic() < deadline:
+            await page.wait_for_timeout(poll_ms)
+        return self.settled(settle_ms, enough)
+
+    def get_stats(self) -> Dict:
+        return {
+            "responses": self.responses,
+            "records": len(self.records),
+            "errors": self.errors,
+            "first_record_ms": self.first_record_ms,
+        }
@@ -0,0 +1,62 @@
+"""
+Uber Eats 菜單抓取（async 版）
+與同步版 UberEatsMenuScraper 共用 parsing 核心
+"""
+from typing import Dict, List, Optional
+from playwright.async_api import Page
+
+from agent.scrapers.deadline import Deadline, stage_timeout_ms
+from agent.scrapers.readiness import AsyncReadiness
+from agent.scrapers.ubereats.parsing import (
+    STORE_TITLE_SELECTOR,
+    MENU_EXTRACTION_JS,
+    STORE_PAGE_SNAPSHOT_JS,
+    StorePageSnapshot,
+)
+
+class AsyncUberEatsMenuScraper:
+    """Uber Eats 店家菜單抓取器（async Playwright）"""
+
+    def __init__(self, page: Page):
+        self.page = page
+        self.readiness = AsyncReadiness(page)
+
+    async def scrape_store(self, store_url: str, menu_limit: int = 20, deadline: Optional[Deadline] = None) -> Dict:
+        """
+        抓取店家完整資訊
+
+        Args:
+            store_url: 店家 URL
+            menu_limit: 最多抓幾個菜單項目
+            deadline: 時間預算；導航 / 等待依剩餘時間縮短，不夠時少滾動幾次（菜單可能較少）
+
+        Returns:
+            與 UberEatsMenuScraper.scrape_store 相同格式
+        """
+        print(f"[UberEats Menu] Scraping: {store_url}")
+        self.readiness.reset()
+
+        # 導航到店家頁面（保留 0.5 秒給抽取）
+        await self.page.goto(
+            store_url, wait_until="domcontentloaded", timeout=stage_timeout_ms(deadline, 30000, reserve=0.5)
+        )
+        await self.readiness.selector(STORE_TITLE_SELECTOR, timeout_ms=stage_timeout_ms(deadline, 10000, reserve=0.5))
+
+        # 滾動載入菜單（每次滾動後等 lazy-load 的 DOM 變動停止）
+        for i in range(3):
+            if deadline and deadline.remaining() <= 0.5:
+                break
+            await self.page.evaluate("window.scrollBy(0, 400)")
+            await self.readiness.dom_idle(idle_ms=250, timeout_ms=stage_timeout_ms(deadline, 1500, reserve=0.5))
+
+        # 店名 + body 文字一次取回，菜單項目一次 DOM 走訪
+        snapshot = StorePageSnapshot.from_evaluate(
+            await self.page.evaluate(STORE_PAGE_SNAPSHOT_JS, STORE_TITLE_SELECTOR)
+        )
+        menu_items: List[Dict] = await self.page.evaluate(MENU_EXTRACTION_JS, menu_limit)
+        store_info = snapshot.to_store_info(menu_items)
+
+        print(f"[UberEats Menu] Extracted {len(menu_items)} menu items")
+        print(f"[UberEats Menu] Waited {self.readiness.total_wait_ms()}ms for page readiness")
+
+        return store_info
@@ -0,0 +1,177 @@
+"""
+Uber Eats 搜尋功能（async 版）
+與同步版 UberEatsSearcher 共用 parsing 核心，供 LINE worker 直接使用
+"""
+from typing import List, Dict, Optional
+from playwright.async_api import Page
+
+from agent.scrapers.deadline import Deadline, stage_timeout_ms
+from agent.scrapers.readiness import AsyncReadiness
+from agent.scrapers.ubereats.api_capture import FeedResponseCollector
+from agent.scrapers.ubereats.parsing import (
+    BASE_URL,
+    CARD_SELECTORS,
+    SEARCH_BOX_SELECTORS,
+    CARD_EXTRACTION_JS,
+    build_search_url,
+    finalize_restaurants,
+)
+
+# 有 deadline 時保留給抽取階段的秒數（導航的 timeout 會扣掉這段）
+EXTRACT_RESERVE = 1.0
+# 直接開 URL 失敗後，剩餘時間至少要這麼多才改走首頁搜尋框
+MIN_FALLBACK_SECONDS = 5.0
+
+class AsyncUberEatsSearcher:
+    """Uber Eats 餐廳搜尋器（async Playwright）"""
+
+    def __init__(self, page: Page, use_api: bool = True, deadline: Optional[Deadline] = None):
+        """
+        Args:
+            page: async Playwright page
+            use_api: 優先使用 feed API 回應（拿不到才解析 DOM）
+            deadline: 任務預算；各步驟 timeout 依剩餘時間縮短，用完時回傳已拿到的部分結果
+        """
+        self.page = page
+        self.use_api = use_api
+        self.deadline = deadline
+        self.partial = False  # 預算用完，結果可能不完整
+        self.collector: Optional[FeedResponseCollector] = None
+        self.readiness = AsyncReadiness(page)
+        self.last_strategy = None  # "direct_url" / "search_box" / "direct_url_failed"（沒時間 fallback）
+        self.last_source = None    # "api" / "dom"
+
+    async def search(self, keyword: str, limit: int = 10) -> List[Dict]:
+        """
+        搜尋餐廳
+
+        Args:
+            keyword: 搜尋關鍵字
+            limit: 最多回傳幾家店
+
+        Returns:
+            List of {name, eta, rating, review_count, url}
+        """
+        print(f"[UberEats] Searching for: {keyword}")
+        self.readiness.reset()
+        self.partial = False
+        card_selector = ", ".join(CARD_SELECTORS)
+
+        # 監聽 feed API 回應（在導航前掛上）
+        self.collector = FeedResponseCollector() if self.use_api else None
+        if self.collector:
+            self.collector.attach_async(self.page)
+
+        try:
+            # 導航到搜尋結果頁（直接開 URL，失敗才走首頁搜尋框）
+            if await self._navigate_direct(keyword, card_selector):
+                self.last_strategy = "direct_url"
+            elif self._has_time(MIN_FALLBACK_SECONDS):
+                print("[UberEats] Direct search URL failed, falling back to search box")
+                await self._navigate_search_box(keyword, card_selector)
+                self.last_strategy = "search_box"
+            else:
+                # 預算不夠再走一次首頁，直接用目前頁面上有的結果
+                print(f"[UberEats] Direct search URL failed, no time for fallback ({self.deadline})")
+                self.last_strategy = "direct_url_failed"
+                self.partial = True
+            print(f"[UberEats] Navigation strategy: {self.last_strategy}")
+
+            if self.collector and self.collector.records:
+                # API 已回傳結果，不需等 DOM render；第一份回應可能只是第一頁，等後續回應收完
+                settled = self._has_time(EXTRACT_RESERVE) and await self.collector.wait_for_settled_async(
+                    self.page, settle_ms=600, timeout_ms=self._timeout_ms(3000, reserve=0.3), enough=limit
+                )
+                if not settled:
+                    self.partial = True
+                raw_results = list(self.collector.records)
+                self.last_source = "api"
+                print(f"[UberEats] Using {len(raw_results)} stores from feed API {self.collector.get_stats()}")
+            else:
+                # 等卡片數量穩定後，一次 evaluate 抓完所有卡片（沒時間就直接抓目前的卡片）
+                if self._has_time(EXTRACT_RESERVE):
+                    await self.readiness.count_settled(
+                        card_selector, settle_ms=600, timeout_ms=self._timeout_ms(6000, reserve=0.3)
+                    )
+                else:
+                    self.partial = True
+                data = await self.page.evaluate(CARD_EXTRACTION_JS, CARD_SELECTORS)
+                raw_results = data["cards"]
+                # 與舊版 worker 相同：卡片沒有可見的店名時用「店家 N」，不丟掉這張卡片
+                for idx, card in enumerate(raw_results):
+                    if not card.get("name"):
+                        card["name"] = f"店家 {idx+1}"
+                self.last_source = "dom"
+                print(f"[UberEats] Found {len(raw_results)} cards using: {data['selector']}")
+        finally:
+            if self.collector:
+                self.collector.detach(self.page)
+
+        results = finalize_restaurants(raw_results, limit)
+
+        print(f"[UberEats] Found {len(raw_results)} raw → {len(results)} returned"
+              f"{' (partial, deadline reached)' if self.partial else ''}")
+        print(f"[UberEats] Waited {self.readiness.total_wait_ms()}ms for page readiness")
+
+        return results
+
+    def _timeout_ms(self, cap_ms: int, reserve: float = EXTRACT_RESERVE) -> int:
+        """步驟 timeout：原本的上限，有 deadline 時再扣掉保留給抽取的時間"""
+        return stage_timeout_ms(self.deadline, cap_ms, reserve)
+
+    def _has_time(self, seconds: float) -> bool:
+        return self.deadline is None or self.deadline.remaining() > seconds
+
+    async def _wait_for_results(self, card_selector: str, timeout_ms: int) -> bool:
+        """等 feed API 回傳結果，或卡片出現在 DOM"""
+        timeout_ms = self._timeout_ms(timeout_ms)
+        if self.collector and await self.collector.wait_for_records_async(self.page, timeout_ms=min(timeout_ms, 5000)):
+            return True
+        return await self.readiness.selector(card_selector, timeout_ms=self._timeout_ms(timeout_ms))
+
+    async def _navigate_direct(self, keyword: str, card_selector: str) -> bool:
+        """直接開搜尋結果頁，收到 feed API 結果或卡片有出現才算成功"""
+        try:
+            await self.page.goto(
+                build_search_url(keyword), wait_until="domcontentloaded", timeout=self._timeout_ms(30000)
+            )
+        except Exception as e:
+            print(f"[WARN] Direct navigation failed: {e}")
+            return False
+        return await self._wait_for_results(card_selector, timeout_ms=8000)
+
+    async def _navigate_search_box(self, keyword: str, card_selector: str):
+        """從首頁搜尋框輸入關鍵字"""
+        await self.page.goto(BASE_URL, wait_until="domcontentloaded", timeout=self._timeout_ms(30000))
+        await self.readiness.selector(", ".join(SEARCH_BOX_SELECTORS), timeout_ms=self._timeout_ms(10000))
+
+        search_box = await self._find_search_box()
+        if not search_box:
+            raise Exception("Search box not found")
+
+        await search_box.click()
+        await search_box.fill(keyword)
+        if self.collector:
+            # 首頁 feed 不是搜尋結果
+            self.collector.clear()
+        await search_box.press("Enter")
+
+        print("[UberEats] Waiting for search results...")
+        if not await self._wait_for_results(card_selector, timeout_ms=10000):
+            if not self._has_time(EXTRACT_RESERVE):
+                # 預算用完：不當成失敗，回傳目前頁面上有的結果
+                self.partial = True
+                return
+            raise Exception("Search results did not appear")
+
+    async def _find_search_box(self):
+        """找搜尋框"""
+        for selector in SEARCH_BOX_SELECTORS:
+            try:
+                box = self.page.locator(selector).first
+                if await box.is_visible():
+                    return box
+            except Exception:
+                continue
+
+        return None
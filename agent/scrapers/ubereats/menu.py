@@ -2,15 +2,25 @@
 Uber Eats 菜單抓取
 抓取單一店家的詳細資訊：菜單項目、費用、評分、營業時間等
 """
-import time
 from typing import List, Dict, Optional
 from playwright.sync_api import Page
 
+from agent.scrapers.readiness import Readiness
+from agent.scrapers.ubereats.parsing import (
+    STORE_TITLE_SELECTOR,
+    MENU_EXTRACTION_JS,
+    STORE_PAGE_SNAPSHOT_JS,
+    StorePageSnapshot,
+    parse_menu_item_text,
+    deduplicate_menu_items,
+)
+
 class UberEatsMenuScraper:
     """Uber Eats 店家菜單抓取器"""
     
     def __init__(self, page: Page):
         self.page = page
+        self.readiness = Readiness(page)
     
     def scrape_store(self, store_url: str, menu_limit: int = 20) -> Dict:
         """
@@ -32,28 +42,23 @@ class UberEatsMenuScraper:
             }
         """
         print(f"[UberEats Menu] Scraping: {store_url}")
+        self.readiness.reset()
         
         # 導航到店家頁面
         self.page.goto(store_url, wait_until="domcontentloaded", timeout=30000)
-        time.sleep(3)
+        self.readiness.selector(STORE_TITLE_SELECTOR, timeout_ms=10000)
         
-        # 滾動載入菜單
+        # 滾動載入菜單（每次滾動後等 lazy-load 的 DOM 變動停止）
         for i in range(3):
             self.page.evaluate("window.scrollBy(0, 400)")
-            time.sleep(0.5)
+            self.readiness.dom_idle(idle_ms=250, timeout_ms=1500)
         
-        # 抓取店家基本資訊
-        store_info = {
-            "name": self._extract_store_name(),
-            "rating": self._extract_rating(),
-            "review_count": self._extract_review_count(),
-            "delivery_fee": self._extract_delivery_fee(),
-            "service_fee": self._extract_service_fee(),
-            "min_order": self._extract_min_order(),
-            "menu_items": self._extract_menu_items(menu_limit),
-        }
+        # 抓取店家基本資訊（店名 + body 文字只擷取一次）
+        snapshot = self._capture_snapshot()
+        store_info = snapshot.to_store_info(self._extract_menu_items(menu_limit))
         
         print(f"[UberEats Menu] Extracted {len(store_info['menu_items'])} menu items")
+        print(f"[UberEats Menu] Waited {self.readiness.total_wait_ms()}ms for page readiness")
         
         return store_info
     
@@ -71,85 +76,37 @@ class UberEatsMenuScraper:
         
         return None
     
-    def _extract_rating(self) -> Optional[float]:
-        """抓取評分"""
+    def _capture_snapshot(self) -> StorePageSnapshot:
+        """擷取頁面快照（一次 evaluate），失敗時改用 locator + inner_text"""
         try:
-            page_text = self.page.inner_text("body")
-            # 尋找格式如 "4.7" 的評分
-            for line in page_text.split("\n"):
-                line = line.strip()
-                if len(line) > 1 and len(line) < 5:
-                    try:
-                        rating = float(line)
-                        if 0 <= rating <= 5:
-                            return rating
-                    except:
-                        continue
-        except:
-            pass
+            return StorePageSnapshot.from_evaluate(
+                self.page.evaluate(STORE_PAGE_SNAPSHOT_JS, STORE_TITLE_SELECTOR)
+            )
+        except Exception as e:
+            print(f"[WARN] Snapshot evaluate failed, falling back to locators: {e}")
         
-        return None
-    
-    def _extract_review_count(self) -> Optional[str]:
-        """抓取評論數"""
         try:
-            page_text = self.page.inner_text("body")
-            for line in page_text.split("\n"):
-                # 格式如 "(5,000+)" 或 "5000 ratings"
-                if "(" in line and ")" in line and any(c.isdigit() for c in line):
-                    return line.strip()
-                if "rating" in line.lower() and any(c.isdigit() for c in line):
-                    return line.strip()
-        except:
-            pass
-        
-        return None
-    
-    def _extract_delivery_fee(self) -> Optional[str]:
-        """抓取運費"""
-        try:
-            page_text = self.page.inner_text("body")
-            for line in page_text.split("\n"):
-                line = line.strip()
-                # 運費關鍵字
-                if ("運費" in line or "delivery" in line.lower() or "fee" in line.lower()) and "$" in line:
-                    return line
-        except:
-            pass
-        
-        return None
+            return StorePageSnapshot(self.page.inner_text("body"), name=self._extract_store_name())
+        except Exception as e:
+            print(f"[WARN] Snapshot capture failed: {e}")
+            return StorePageSnapshot("")
     
-    def _extract_service_fee(self) -> Optional[str]:
-        """抓取服務費"""
+    def _extract_menu_items(self, limit: int) -> List[Dict]:
+        """抓取菜單項目（bulk 失敗時 fallback 到逐一元素）"""
         try:
-            page_text = self.page.inner_text("body")
-            for line in page_text.split("\n"):
-                line = line.strip()
-                # 服務費關鍵字
-                if ("服務費" in line or "service" in line.lower()) and "$" in line:
-                    return line
-        except:
-            pass
+            return self._extract_menu_items_bulk(limit)
+        except Exception as e:
+            print(f"[WARN] Bulk menu extraction failed, falling back to locators: {e}")
         
-        return None
+        return self._extract_menu_items_locator(limit)
     
-    def _extract_min_order(self) -> Optional[str]:
-        """抓取最低消費"""
-        try:
-            page_text = self.page.inner_text("body")
-            for line in page_text.split("\n"):
-                line = line.strip()
-                # 最低消費關鍵字
-                if ("最低" in line or "minimum" in line.lower()) and "$" in line:
-                    return line
-        except:
-            pass
-        
-        return None
+    def _extract_menu_items_bulk(self, limit: int) -> List[Dict]:
+        """單次 page.evaluate 走訪 DOM，在頁面內去重並在湊滿 limit 時停止"""
+        return self.page.evaluate(MENU_EXTRACTION_JS, limit)
     
-    def _extract_menu_items(self, limit: int) -> List[Dict]:
+    def _extract_menu_items_locator(self, limit: int) -> List[Dict]:
         """
-        抓取菜單項目
+        抓取菜單項目（逐一元素 inner_text，元素多時很慢）
         使用 Phase 0 驗證過的簡化策略：找所有包含 $ 的元素
         """
         menu_items = []
@@ -162,38 +119,9 @@ class UberEatsMenuScraper:
                 try:
                     text = elem.inner_text(timeout=500)
                     
-                    # 檢查是否包含價格
-                    if "$" not in text:
-                        continue
-                    
-                    # 解析文字
-                    lines = [l.strip() for l in text.split("\n") if l.strip()]
-                    
-                    item = {
-                        "name": None,
-                        "price": None,
-                        "description": None,
-                    }
-                    
-                    # 找品項名稱（最長的那行，且不含 $）
-                    for line in lines:
-                        if "$" not in line and len(line) > 3:
-                            item["name"] = line
-                            break
-                    
-                    # 找價格（包含 $）
-                    for line in lines:
-                        if "$" in line:
-                            item["price"] = line
-                            break
-                    
-                    # 找描述（第二長的不含 $ 的行）
-                    desc_lines = [l for l in lines if "$" not in l and l != item["name"]]
-                    if desc_lines:
-                        item["description"] = desc_lines[0]
-                    
-                    # 過濾：至少要有名稱和價格
-                    if item["name"] and item["price"]:
+                    # 解析文字（至少要有名稱和價格）
+                    item = parse_menu_item_text(text)
+                    if item:
                         menu_items.append(item)
                     
                     if len(menu_items) >= limit:
@@ -210,13 +138,4 @@ class UberEatsMenuScraper:
     
     def _deduplicate_menu_items(self, items: List[Dict]) -> List[Dict]:
         """菜單項目去重"""
-        seen_names = set()
-        unique_items = []
-        
-        for item in items:
-            name = item.get("name")
-            if name and name not in seen_names:
-                unique_items.append(item)
-                seen_names.add(name)
-        
-        return unique_items
+        return deduplicate_menu_items(items)
@@ -0,0 +1,334 @@
+"""
+Uber Eats 解析核心（純函數，不依賴 Playwright）
+同步 / 非同步 scraper 與 LINE worker 共用：URL、selector、in-page 抓取腳本、
+卡片 / 菜單 / 店家頁文字解析、去重
+"""
+import re
+from typing import List, Dict, Optional
+from urllib.parse import quote
+
+BASE_URL = "https://www.ubereats.com/tw"
+SEARCH_URL_TEMPLATE = "https://www.ubereats.com/tw/search?q={query}"
+
+# 搜尋結果卡片（依序嘗試，第一個有結果的為準）
+CARD_SELECTORS = [
+    "[data-testid*='store-card']",
+    "a[href*='/store/']",
+]
+
+SEARCH_BOX_SELECTORS = [
+    "input[data-testid='search-suggestions-input']",
+    "input[placeholder*='搜尋']",
+    "input[placeholder*='Search']",
+    "input[type='text'][name*='search']",
+]
+
+STORE_TITLE_SELECTOR = "h1, [data-testid='store-title']"
+
+def parse_price(price_text: Optional[str]) -> Optional[float]:
+    """解析菜單價格（例如 "$120"、"NT$1,280.00"）"""
+    if not price_text:
+        return None
+    match = re.search(r"\$\s*([\d,]+(?:\.\d+)?)", price_text)
+    if not match:
+        return None
+    try:
+        return float(match.group(1).replace(",", ""))
+    except ValueError:
+        return None
+
+def build_search_url(keyword: str) -> str:
+    """組出搜尋結果頁 URL（中文 / 空白 / 特殊字元都會編碼）"""
+    return SEARCH_URL_TEMPLATE.format(query=quote(keyword.strip(), safe=""))
+
+def normalize_url(href: str) -> str:
+    """標準化 URL"""
+    if href.startswith("http"):
+        return href
+    elif href.startswith("/"):
+        return f"https://www.ubereats.com{href}"
+    else:
+        return f"https://www.ubereats.com/{href}"
+
+# 一次 page.evaluate 抓取所有卡片（取代逐一 locator 的 IPC round-trip）
+#   評分 / 評論數：優先解析 aria-label「評分：4.1 顆星. 29 評論」，沒有才掃卡片文字
+#   ETA：優先解析 aria-label「預估出發時間：31 分鐘」，沒有才找含「分鐘」/「min」的行
+CARD_EXTRACTION_JS = """
+(selectors) => {
+    let cards = [];
+    let usedSelector = null;
+    for (const sel of selectors) {
+        cards = Array.from(document.querySelectorAll(sel));
+        if (cards.length > 0) { usedSelector = sel; break; }
+    }
+
+    const isVisible = (el) => !!(el && el.getClientRects().length && getComputedStyle(el).visibility !== 'hidden');
+    const normalizeUrl = (href) => {
+        if (href.startsWith('http')) return href;
+        if (href.startsWith('/')) return 'https://www.ubereats.com' + href;
+        return 'https://www.ubereats.com/' + href;
+    };
+    const afterColon = (label) => (label && label.includes('：')) ? label.split('：')[1].trim() : null;
+
+    const results = cards.map((card) => {
+        const r = {name: null, eta: null, rating: null, review_count: null, url: null};
+
+        for (const sel of ['h3', 'h4', "[data-test*='store-title']"]) {
+            const el = card.querySelector(sel);
+            if (isVisible(el)) { r.name = el.innerText.trim(); break; }
+        }
+
+        const ratingEl = card.querySelector('[aria-label*="評分"]');
+        const ratingLabel = ratingEl ? ratingEl.getAttribute('aria-label') : null;
+        const ratingText = afterColon(ratingLabel);
+        if (ratingText) {
+            const first = ratingText.split(/\\s+/)[0];
+            if (/^\\d+(\\.\\d+)?$/.test(first)) r.rating = parseFloat(first);
+        }
+        if (ratingLabel) {
+            const match = ratingLabel.match(/(\\d[\\d,]*\\+?)\\s*評論/);
+            if (match) r.review_count = match[1];
+        }
+
+        const etaEl = card.querySelector('[aria-label*="預估出發時間"]');
+        r.eta = afterColon(etaEl ? etaEl.getAttribute('aria-label') : null);
+
+        const lines = (card.innerText || '').split('\\n');
+        if (r.eta === null) {
+            for (const line of lines) {
+                if (line.includes('分鐘') || line.toLowerCase().includes('min')) { r.eta = line.trim(); break; }
+            }
+        }
+        if (r.rating === null && r.review_count === null) {
+            for (const line of lines) {
+                if (/\\d/.test(line) && (line.includes('.') || line.includes('('))) {
+                    const parts = line.split('(');
+                    const ratingPart = parts[0].trim();
+                    if (/^[-+]?(\\d+\\.?\\d*|\\.\\d+)$/.test(ratingPart)) r.rating = parseFloat(ratingPart);
+                    if (parts.length >= 2) r.review_count = parts[1].replace(')', '').trim();
+                    break;
+                }
+            }
+        }
+
+        let href = null;
+        if (card.tagName === 'A') href = card.getAttribute('href');
+        if (!href) {
+            const link = card.querySelector("a[href*='/store/']");
+            if (link) href = link.getAttribute('href');
+        }
+        if (href) r.url = normalizeUrl(href);
+
+        return r;
+    });
+
+    return {selector: usedSelector, cards: results};
+}
+"""
+
+# 在頁面內一次走訪 DOM 抓取菜單項目（取代逐一元素 inner_text(timeout=500)）
+# 名稱 = 第一個不含 $ 且長度 > 3 的行、價格 = 第一個含 $ 的行、
+# 描述 = 其餘不含 $ 的第一行；在頁面內依名稱去重，湊滿 limit 筆就停止
+MENU_EXTRACTION_JS = """
+(limit) => {
+    const items = [];
+    const seen = new Set();
+
+    for (const el of document.querySelectorAll('li, button, a')) {
+        // textContent 不觸發 layout，先用它過濾掉沒有價格的節點
+        if (!el.textContent || !el.textContent.includes('$')) continue;
+
+        const text = el.innerText || '';
+        if (!text.includes('$')) continue;
+
+        const lines = text.split('\\n').map((l) => l.trim()).filter((l) => l);
+        const name = lines.find((l) => !l.includes('$') && l.length > 3) || null;
+        const price = lines.find((l) => l.includes('$')) || null;
+        if (!name || !price || seen.has(name)) continue;
+
+        const description = lines.find((l) => !l.includes('$') && l !== name) || null;
+        seen.add(name);
+        items.push({name, price, description});
+
+        if (items.length >= limit) break;
+    }
+
+    return items;
+}
+"""
+
+# 店家頁：店名 + body 文字一次取回
+STORE_PAGE_SNAPSHOT_JS = """
+(titleSelector) => {
+    const isVisible = (el) => !!(el && el.getClientRects().length && getComputedStyle(el).visibility !== 'hidden');
+    let name = null;
+    for (const sel of titleSelector.split(',')) {
+        const el = document.querySelector(sel.trim());
+        if (isVisible(el)) { name = el.innerText.trim(); break; }
+    }
+    return {name, body_text: document.body ? document.body.innerText : ''};
+}
+"""
+
+def parse_card_text(text: str) -> Dict:
+    """
+    從卡片文字解析 ETA / 評分 / 評論數（locator fallback 用）
+    格式通常是 "4.9\\n(5,000+)" 或 "4.9 (5,000+)"
+    """
+    result = {"eta": None, "rating": None, "review_count": None}
+    lines = text.split("\n")
+
+    for line in lines:
+        if "分鐘" in line or "min" in line.lower():
+            result["eta"] = line.strip()
+            break
+
+    for line in lines:
+        if any(c.isdigit() for c in line) and ("." in line or "(" in line):
+            parts = line.split("(")
+            try:
+                result["rating"] = float(parts[0].strip())
+            except ValueError:
+                pass
+            if len(parts) >= 2:
+                result["review_count"] = parts[1].replace(")", "").strip()
+            break
+
+    return result
+
+def parse_menu_item_text(text: str) -> Optional[Dict]:
+    """解析單一菜單元素文字，至少要有名稱和價格，否則回傳 None"""
+    if "$" not in text:
+        return None
+
+    lines = [l.strip() for l in text.split("\n") if l.strip()]
+    name = next((l for l in lines if "$" not in l and len(l) > 3), None)
+    price = next((l for l in lines if "$" in l), None)
+    if not name or not price:
+        return None
+
+    desc_lines = [l for l in lines if "$" not in l and l != name]
+    return {
+        "name": name,
+        "price": price,
+        "description": desc_lines[0] if desc_lines else None,
+    }
+
+def deduplicate_restaurants(results: List[Dict]) -> List[Dict]:
+    """
+    去重（根據店名和 URL）
+    同一家店可能出現多次（不同 DOM 元素）
+    """
+    seen_names = set()
+    seen_urls = set()
+    unique_results = []
+
+    for restaurant in results:
+        name = restaurant.get("name")
+        url = restaurant.get("url")
+
+        # 用名字或 URL 判斷是否重複
+        key = url if url else name
+
+        if key and key not in seen_urls and name not in seen_names:
+            unique_results.append(restaurant)
+            if url:
+                seen_urls.add(url)
+            if name:
+                seen_names.add(name)
+
+    return unique_results
+
+def finalize_restaurants(records: List[Dict], limit: int) -> List[Dict]:
+    """過濾沒有店名的卡片 → 去重 → 限制數量"""
+    named = [r for r in records if r.get("name")]
+    return deduplicate_restaurants(named)[:limit]
+
+def deduplicate_menu_items(items: List[Dict]) -> List[Dict]:
+    """菜單項目去重（根據名稱）"""
+    seen_names = set()
+    unique_items = []
+
+    for item in items:
+        name = item.get("name")
+        if name and name not in seen_names:
+            unique_items.append(item)
+            seen_names.add(name)
+
+    return unique_items
+
+class StorePageSnapshot:
+    """
+    店家頁面文字快照
+    每次 scrape_store 只序列化一次 body 文字，單次掃描所有行填入表頭欄位
+    （取代每個欄位各自呼叫 inner_text("body") + split）
+    """
+
+    HEADER_FIELDS = ("rating", "review_count", "delivery_fee", "service_fee", "min_order")
+
+    def __init__(self, body_text: str, name: Optional[str] = None):
+        self.name = name
+        self.body_text = body_text
+        self.lines = body_text.split("\n")
+        self.fields = self._classify_lines()
+
+    @classmethod
+    def from_evaluate(cls, data: Dict) -> "StorePageSnapshot":
+        """由 STORE_PAGE_SNAPSHOT_JS 的回傳值建立"""
+        return cls(data.get("body_text") or "", name=data.get("name"))
+
+    def _classify_lines(self) -> Dict:
+        """單次掃描：每一行依序檢查尚未找到的欄位，每個欄位取第一個符合的行"""
+        fields = {name: None for name in self.HEADER_FIELDS}
+        remaining = len(fields)
+
+        for raw_line in self.lines:
+            line = raw_line.strip()
+            lower = line.lower()
+            has_digit = any(c.isdigit() for c in line)
+            has_dollar = "$" in line
+
+            # 評分：格式如 "4.7"
+            if fields["rating"] is None and 1 < len(line) < 5:
+                try:
+                    rating = float(line)
+                    if 0 <= rating <= 5:
+                        fields["rating"] = rating
+                        remaining -= 1
+                except ValueError:
+                    pass
+
+            # 評論數：格式如 "(5,000+)" 或 "5000 ratings"
+            if fields["review_count"] is None and has_digit:
+                if ("(" in line and ")" in line) or "rating" in lower:
+                    fields["review_count"] = line
+                    remaining -= 1
+
+            if has_dollar:
+                # 運費
+                if fields["delivery_fee"] is None and ("運費" in line or "delivery" in lower or "fee" in lower):
+                    fields["delivery_fee"] = line
+                    remaining -= 1
+
+                # 服務費
+                if fields["service_fee"] is None and ("服務費" in line or "service" in lower):
+                    fields["service_fee"] = line
+                    remaining -= 1
+
+                # 最低消費
+                if fields["min_order"] is None and ("最低" in line or "minimum" in lower):
+                    fields["min_order"] = line
+                    remaining -= 1
+
+            if remaining == 0:
+                break
+
+        return fields
+
+    def to_store_info(self, menu_items: List[Dict]) -> Dict:
+        """組成 scrape_store 的回傳格式"""
+        return {
+            "name": self.name,
+            **self.fields,
+            "menu_items": menu_items,
+        }
@@ -2,17 +2,42 @@
 Uber Eats 搜尋功能
 從關鍵字搜尋餐廳，回傳結構化的店家列表
 """
-import time
 from typing import List, Dict, Optional
 from playwright.sync_api import Page
 
+from agent.scrapers.readiness import Readiness
+from agent.scrapers.ubereats.api_capture import FeedResponseCollector
+from agent.scrapers.ubereats.parsing import (
+    BASE_URL,
+    CARD_SELECTORS,
+    SEARCH_BOX_SELECTORS,
+    CARD_EXTRACTION_JS,
+    build_search_url,
+    normalize_url,
+    parse_card_text,
+    deduplicate_restaurants,
+)
+
 class UberEatsSearcher:
     """Uber Eats 餐廳搜尋器"""
     
-    BASE_URL = "https://www.ubereats.com/tw"
+    BASE_URL = BASE_URL
+    CARD_SELECTORS = CARD_SELECTORS
+    SEARCH_BOX_SELECTORS = SEARCH_BOX_SELECTORS
     
-    def __init__(self, page: Page):
+    def __init__(self, page: Page, extraction_mode: str = "bulk", use_api: bool = True):
+        """
+        Args:
+            page: Playwright page
+            extraction_mode: "bulk"（一次 evaluate 抓完）或 "locator"（逐一 locator，較慢）
+            use_api: 優先使用 feed API 回應（拿不到才解析 DOM）
+        """
         self.page = page
+        self.extraction_mode = extraction_mode
+        self.use_api = use_api
+        self.collector: Optional[FeedResponseCollector] = None
+        self.readiness = Readiness(page)
+        self.last_strategy = None  # 上次搜尋成功的導航方式："direct_url" / "search_box"
     
     def search(self, keyword: str, limit: int = 10) -> List[Dict]:
         """
@@ -26,45 +51,82 @@ class UberEatsSearcher:
             List of {name, eta, rating, review_count, url}
         """
         print(f"[UberEats] Searching for: {keyword}")
+        self.readiness.reset()
+        
+        # 監聽 feed API 回應（在導航前掛上）
+        self.collector = FeedResponseCollector() if self.use_api else None
+        if self.collector:
+            self.collector.attach_sync(self.page)
+        
+        try:
+            # 導航到搜尋結果頁（直接開 URL，失敗才走首頁搜尋框）
+            card_selector = ", ".join(self.CARD_SELECTORS)
+            if self._navigate_direct(keyword, card_selector):
+                self.last_strategy = "direct_url"
+            else:
+                print("[UberEats] Direct search URL failed, falling back to search box")
+                self._navigate_search_box(keyword, card_selector)
+                self.last_strategy = "search_box"
+            print(f"[UberEats] Navigation strategy: {self.last_strategy}")
+            
+            if self.collector and self.collector.records:
+                # API 已回傳結果，不需等 DOM render；第一份回應可能只是第一頁，等後續回應收完
+                self.collector.wait_for_settled_sync(self.page, settle_ms=600, timeout_ms=3000, enough=limit)
+                raw_results = list(self.collector.records)
+                print(f"[UberEats] Using {len(raw_results)} stores from feed API {self.collector.get_stats()}")
+            else:
+                # 等卡片數量穩定（結果陸續 render）後解析 DOM
+                self.readiness.count_settled(card_selector, settle_ms=600, timeout_ms=6000)
+                raw_results = self._extract_restaurant_cards()
+        finally:
+            if self.collector:
+                self.collector.detach(self.page)
+        
+        # 去重 + 限制數量
+        deduplicated = self._deduplicate_results(raw_results)
+        limited = deduplicated[:limit]
         
-        # 導航到首頁
+        print(f"[UberEats] Found {len(raw_results)} raw → {len(deduplicated)} unique → {len(limited)} returned")
+        print(f"[UberEats] Waited {self.readiness.total_wait_ms()}ms for page readiness")
+        
+        return limited
+    
+    def _navigate_direct(self, keyword: str, card_selector: str) -> bool:
+        """直接開搜尋結果頁，收到 feed API 結果或卡片有出現才算成功"""
+        try:
+            self.page.goto(build_search_url(keyword), wait_until="domcontentloaded", timeout=30000)
+        except Exception as e:
+            print(f"[WARN] Direct navigation failed: {e}")
+            return False
+        if self.collector and self.collector.wait_for_records_sync(self.page, timeout_ms=5000):
+            return True
+        return self.readiness.selector(card_selector, timeout_ms=8000)
+    
+    def _navigate_search_box(self, keyword: str, card_selector: str):
+        """從首頁搜尋框輸入關鍵字"""
         self.page.goto(self.BASE_URL, wait_until="domcontentloaded", timeout=30000)
-        time.sleep(3)
+        self.readiness.selector(", ".join(self.SEARCH_BOX_SELECTORS), timeout_ms=10000)
         
-        # 找搜尋框並輸入關鍵字
+        # 找搜尋框並輸入關鍵字（click / fill 會自動等待元素可操作）
         search_box = self._find_search_box()
         if not search_box:
             raise Exception("Search box not found")
         
         search_box.click()
-        time.sleep(0.5)
         search_box.fill(keyword)
-        time.sleep(0.5)
+        if self.collector:
+            # 首頁 feed 不是搜尋結果
+            self.collector.clear()
         search_box.press("Enter")
         
         print("[UberEats] Waiting for search results...")
-        time.sleep(4)
-        
-        # 抓取餐廳卡片
-        raw_results = self._extract_restaurant_cards()
-        
-        # 去重 + 限制數量
-        deduplicated = self._deduplicate_results(raw_results)
-        limited = deduplicated[:limit]
-        
-        print(f"[UberEats] Found {len(raw_results)} raw → {len(deduplicated)} unique → {len(limited)} returned")
-        
-        return limited
+        if self.collector and self.collector.wait_for_records_sync(self.page, timeout_ms=5000):
+            return
+        self.readiness.selector(card_selector, timeout_ms=10000)
     
     def _find_search_box(self) -> Optional[any]:
         """找搜尋框"""
-        selectors = [
-            "input[placeholder*='搜尋']",
-            "input[placeholder*='Search']",
-            "input[type='text'][name*='search']",
-        ]
-        
-        for selector in selectors:
+        for selector in self.SEARCH_BOX_SELECTORS:
             try:
                 box = self.page.locator(selector).first
                 if box.is_visible(timeout=2000):
@@ -75,17 +137,34 @@ class UberEatsSearcher:
         return None
     
     def _extract_restaurant_cards(self) -> List[Dict]:
-        """抓取餐廳卡片資訊"""
-        results = []
+        """抓取餐廳卡片資訊（bulk 失敗時 fallback 到逐一 locator）"""
+        if self.extraction_mode == "bulk":
+            try:
+                return self._extract_restaurant_cards_bulk()
+            except Exception as e:
+                print(f"[WARN] Bulk extraction failed, falling back to locators: {e}")
+        
+        return self._extract_restaurant_cards_locator()
+    
+    def _extract_restaurant_cards_bulk(self) -> List[Dict]:
+        """單次 page.evaluate 抓取所有卡片"""
+        data = self.page.evaluate(CARD_EXTRACTION_JS, self.CARD_SELECTORS)
+        
+        if not data["cards"]:
+            print("[WARN] No restaurant cards found")
+            return []
         
-        # 嘗試多種 selector
-        card_selectors = [
-            "[data-testid*='store-card']",
-            "a[href*='/store/']",
-        ]
+        print(f"[UberEats] Found {len(data['cards'])} cards using: {data['selector']} (bulk)")
+        
+        # 至少要有店名
+        return [card for card in data["cards"] if card.get("name")]
+    
+    def _extract_restaurant_cards_locator(self) -> List[Dict]:
+        """逐一 locator 抓取卡片（每張卡片多次 IPC，作為 fallback）"""
+        results = []
         
         cards = []
-        for selector in card_selectors:
+        for selector in self.CARD_SELECTORS:
             try:
                 cards = self.page.locator(selector).all()
                 if len(cards) > 0:
@@ -131,37 +210,9 @@ class UberEatsSearcher:
             except:
                 continue
         
-        # 抓 ETA（送達時間）
-        try:
-            text = card.inner_text()
-            for line in text.split("\n"):
-                if "分鐘" in line or "min" in line.lower():
-                    restaurant["eta"] = line.strip()
-                    break
-        except:
-            pass
-        
-        # 抓評分和評論數
+        # 抓 ETA、評分和評論數（卡片文字只讀一次）
         try:
-            text = card.inner_text()
-            for line in text.split("\n"):
-                # 格式通常是 "4.9\n(5,000+)" 或 "4.9 (5,000+)"
-                if any(c.isdigit() for c in line) and ("." in line or "(" in line):
-                    parts = line.split("(")
-                    if len(parts) >= 1:
-                        # 評分
-                        rating_part = parts[0].strip()
-                        try:
-                            rating = float(rating_part)
-                            restaurant["rating"] = rating
-                        except:
-                            pass
-                    
-                    if len(parts) >= 2:
-                        # 評論數
-                        review_part = parts[1].replace(")", "").strip()
-                        restaurant["review_count"] = review_part
-                    break
+            restaurant.update(parse_card_text(card.inner_text()))
         except:
             pass
         
@@ -197,34 +248,11 @@ class UberEatsSearcher:
     
     def _normalize_url(self, href: str) -> str:
         """標準化 URL"""
-        if href.startswith("http"):
-            return href
-        elif href.startswith("/"):
-            return f"https://www.ubereats.com{href}"
-        else:
-            return f"https://www.ubereats.com/{href}"
+        return normalize_url(href)
     
     def _deduplicate_results(self, results: List[Dict]) -> List[Dict]:
         """
         去重（根據店名和 URL）
         同一家店可能出現多次（不同 DOM 元素）
         """
-        seen_names = set()
-        seen_urls = set()
-        unique_results = []
-        
-        for restaurant in results:
-            name = restaurant.get("name")
-            url = restaurant.get("url")
-            
-            # 用名字或 URL 判斷是否重複
-            key = url if url else name
-            
-            if key and key not in seen_urls and name not in seen_names:
-                unique_results.append(restaurant)
-                if url:
-                    seen_urls.add(url)
-                if name:
-                    seen_names.add(name)
-        
-        return unique_results
+        return deduplicate_restaurants(results)
@@ -0,0 +1,162 @@
+"""
+Admission Control - 依即時服務時間估計決定是否收下任務
+- 各階段（快取回答 / 開瀏覽器搜尋 / 推送）處理秒數各自做 EWMA
+- 以排程器各 lane 的排隊數、可用 consumer 數估計新任務的等待時間，webhook 回覆實際的排隊位置與預估秒數
+- 預估等待超過 shed_wait：不再排需要開瀏覽器的工作（等到了也會逾時），降級為只用快取回答
+- 排隊總數超過 max_queued：直接請用戶稍後再試，不收任務
+"""
+import math
+from typing import Callable, Dict, Optional, Tuple
+
+# 還沒有觀測值時的預設秒數（與舊的「請稍候 10-20 秒」一致）
+DEFAULT_STAGE_SECONDS = {
+    "cache": 0.3,   # 快取命中：評分 + 產生推薦
+    "scrape": 15.0,  # 開瀏覽器搜尋（含菜單補充）
+    "push": 0.5,    # LINE push_message
+}
+
+# 各 lane 的服務時間由哪些階段組成
+LANE_STAGES = {
+    "fast": ("cache", "push"),
+    "slow": ("scrape", "push"),
+}
+
+ACCEPT = "accept"
+CACHE_ONLY = "cache_only"
+REJECT = "reject"
+
+class ServiceTimeEstimator:
+    """各階段處理秒數的 EWMA"""
+
+    def __init__(self, alpha: float = 0.2, defaults: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            alpha: 新觀測值的權重（越大越快反映最近的狀況）
+            defaults: 還沒有觀測值時各階段的預設秒數
+        """
+        self.alpha = alpha
+        self.defaults = dict(defaults or DEFAULT_STAGE_SECONDS)
+        self._ewma: Dict[str, float] = {}
+        self._samples: Dict[str, int] = {}
+
+    def observe(self, stage: str, seconds: float):
+        """記錄一次階段耗時"""
+        previous = self._ewma.get(stage)
+        self._ewma[stage] = seconds if previous is None else (1 - self.alpha) * previous + self.alpha * seconds
+        self._samples[stage] = self._samples.get(stage, 0) + 1
+
+    def estimate(self, stage: str) -> float:
+        """階段耗時估計（秒）"""
+        return self._ewma.get(stage, self.defaults.get(stage, 0.0))
+
+    def service_time(self, lane: str) -> float:
+        """一個任務在該 lane 的預估處理秒數"""
+        return sum(self.estimate(stage) for stage in LANE_STAGES.get(lane, LANE_STAGES["slow"]))
+
+    def get_stats(self) -> Dict:
+        return {
+            stage: {"ewma_seconds": round(self.estimate(stage), 2), "samples": self._samples.get(stage, 0)}
+            for stage in sorted(set(self.defaults) | set(self._ewma))
+        }
+
+class Admission:
+    """單一任務的收件決定"""
+
+    __slots__ = ("decision", "lane", "position", "wait_seconds")
+
+    def __init__(self, decision: str, lane: str, position: int, wait_seconds: float):
+        self.decision = decision
+        self.lane = lane
+        self.position = position          # 前面還有幾個同 lane 的任務
+        self.wait_seconds = wait_seconds  # 預估多久後拿到結果
+
+    @property
+    def admitted(self) -> bool:
+        """是否放進 Queue（拒絕時只回覆，不收任務）"""
+        return self.decision != REJECT
+
+    @property
+    def cache_only(self) -> bool:
+        return self.decision == CACHE_ONLY
+
+    def reply_text(self) -> str:
+        """webhook 立即回覆的文字"""
+        wait = _format_wait(self.wait_seconds)
+        if self.decision == REJECT:
+            return f"😵 目前搜尋的人太多了（前面還有 {self.position} 位），請約 {wait}後再試一次"
+        if self.decision == CACHE_ONLY:
+            return "⏳ 目前搜尋的人較多，先用最近的搜尋結果幫你推薦，稍後可以再試一次完整搜尋"
+        if self.position > 0:
+            return f"🔍 搜尋中，前面還有 {self.position} 位，預計約 {wait}..."
+        return f"🔍 搜尋中，請稍候約 {wait}..."
+
+def _format_wait(seconds: float) -> str:
+    if seconds < 60:
+        return f"{max(1, math.ceil(seconds / 5) * 5)} 秒"
+    return f"{math.ceil(seconds / 60)} 分鐘"
+
+class AdmissionController:
+    """依排隊狀況與服務時間估計決定收件 / 降級 / 拒絕"""
+
+    def __init__(
+        self,
+        estimator: ServiceTimeEstimator,
+        shed_wait: float = 60,
+        max_queued: int = 200,
+    ):
+        """
+        Args:
+            estimator: 各階段服務時間估計
+            shed_wait: 需要開瀏覽器的任務預估等待超過此秒數就降級為只用快取
+            max_queued: 排隊任務總數上限，超過直接拒絕
+        """
+        self.estimator = estimator
+        self.shed_wait = shed_wait
+        self.max_queued = max_queued
+        self.stats = {ACCEPT: 0, CACHE_ONLY: 0, REJECT: 0}
+
+    def estimate_wait(self, lane: str, ahead: int, running: int, slots: int) -> float:
+        """
+        新任務預估多久後完成：前面的任務（含處理中的）要先讓出 slots 個位置，再加上自己的處理時間
+
+        Args:
+            ahead: 同 lane 排在前面的任務數
+            running: 同 lane 處理中的任務數
+            slots: 同 lane 可同時處理的任務數
+        """
+        slots = max(1, slots)
+        service = self.estimator.service_time(lane)
+        blocking = max(0, ahead + running - slots + 1)
+        return blocking / slots * service + service
+
+    def decide(self, lane: str, load: Callable[[str], Tuple[int, int, int]], queued: int) -> Admission:
+        """
+        Args:
+            lane: 任務的 lane（"fast" 可由快取回答）
+            load: lane -> (排在前面的任務數, 處理中的任務數, 可同時處理數)
+            queued: 目前排隊的任務總數
+        """
+        ahead, running, slots = load(lane)
+        wait = self.estimate_wait(lane, ahead, running, slots)
+        if queued >= self.max_queued:
+            # 回覆整個 Queue 消化完的時間
+            decision = REJECT
+            ahead = queued
+            wait = self.estimate_wait("slow", *load("slow"))
+        elif lane == "slow" and wait > self.shed_wait:
+            # 只用快取回答的任務走 fast lane
+            decision = CACHE_ONLY
+            ahead, running, slots = load("fast")
+            wait = self.estimate_wait("fast", ahead, running, slots)
+        else:
+            decision = ACCEPT
+        self.stats[decision] += 1
+        return Admission(decision, lane, ahead, wait)
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "shed_wait": self.shed_wait,
+            "max_queued": self.max_queued,
+            "stages": self.estimator.get_stats(),
+        }
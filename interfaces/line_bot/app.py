@@ -7,6 +7,7 @@ Background Worker 獨立處理搜尋任務，完成後 push_message 回傳
 import sys
 import os
 import asyncio
+import time
 
 # 加入專案路徑
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
@@ -17,9 +18,13 @@ from linebot.exceptions import InvalidSignatureError
 from linebot.models import MessageEvent, TextMessage, TextSendMessage
 import uvicorn
 
-from interfaces.line_bot.config import LINE_CHANNEL_SECRET, LINE_CHANNEL_ACCESS_TOKEN
+from interfaces.line_bot.config import LINE_CHANNEL_SECRET, LINE_CHANNEL_ACCESS_TOKEN, CACHE_WARMER_ENABLED, TASK_DEADLINE
 # 使用 V2 worker（async Playwright + storage_state）
-from interfaces.line_bot.worker_v2 import task_queue, background_worker, init_browser, close_browser
+from interfaces.line_bot.worker_v2 import (
+    enqueue_task, queued_tasks, admit, init_browser, close_browser,
+    start_workers, stop_workers, get_pool_stats, get_worker_stats, get_browser_stats, get_shard_stats,
+    start_cache_warmer, stop_cache_warmer,
+)
 
 # FastAPI app
 app = FastAPI(title="外送推薦 LINE Bot")
@@ -28,46 +33,55 @@ app = FastAPI(title="外送推薦 LINE Bot")
 line_bot_api = LineBotApi(LINE_CHANNEL_ACCESS_TOKEN)
 handler = WebhookHandler(LINE_CHANNEL_SECRET)
 
-# Background worker task（啟動後會一直運行）
-worker_task = None
+# Background worker tasks（啟動後會一直運行）
+worker_tasks = []
+warmer_task = None  # 用餐時段快取預熱
 
 @app.on_event("startup")
 async def startup_event():
-    """啟動時執行：初始化 browser + 啟動 background worker"""
-    global worker_task
+    """啟動時執行：初始化 browser + 啟動 worker pool + 快取預熱排程"""
+    global worker_tasks, warmer_task
     
     print("\n[Startup] Initializing global browser...")
     await init_browser()
     
-    print("[Startup] Starting background worker...")
-    worker_task = asyncio.create_task(background_worker(line_bot_api))
-    print("[Startup] Background worker started")
+    print("[Startup] Starting background workers...")
+    worker_tasks = start_workers(line_bot_api)
+    print(f"[Startup] {len(worker_tasks)} background workers started")
+    
+    if CACHE_WARMER_ENABLED:
+        warmer_task = start_cache_warmer()
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """關閉時執行：停止 background worker + 關閉 browser"""
-    global worker_task
+    """關閉時執行：停止預熱 + 停止 worker pool（未完成任務留在磁碟 Queue）+ 關閉 browser"""
+    global worker_tasks, warmer_task
+    
+    if warmer_task:
+        await stop_cache_warmer(warmer_task)
+        warmer_task = None
     
-    if worker_task:
-        print("\n[Shutdown] Stopping background worker...")
-        worker_task.cancel()
-        try:
-            await worker_task
-        except asyncio.CancelledError:
-            pass
-        print("[Shutdown] Background worker stopped")
+    if worker_tasks:
+        print("\n[Shutdown] Stopping background workers...")
+        await stop_workers(worker_tasks)
+        worker_tasks = []
+        print("[Shutdown] Background workers stopped")
     
     print("[Shutdown] Closing global browser...")
     await close_browser()
     print("[Shutdown] Shutdown complete")
 
 @app.get("/")
-def health_check():
-    """健康檢查"""
+async def health_check():
+    """健康檢查（分片模式另附各分片子程序的內部統計）"""
     return {
         "status": "ok",
         "service": "LINE Bot Webhook",
-        "queue_size": task_queue.qsize()
+        "queue_size": queued_tasks(),
+        "context_pool": get_pool_stats(),
+        "browser": get_browser_stats(),
+        "workers": get_worker_stats(),
+        "shard_internals": await get_shard_stats(),
     }
 
 @app.post("/webhook")
@@ -89,7 +103,7 @@ async def webhook(request: Request):
 def handle_message(event):
     """
     處理文字訊息（Producer）
-    收到訊息 → 放入 Queue → 立刻回「搜尋中」
+    收到訊息 → admission control → 放入 Queue → 立刻回覆排隊位置 / 預估等待時間
     """
     user_message = event.message.text
     user_id = event.source.user_id
@@ -97,21 +111,29 @@ def handle_message(event):
     print(f"\n[Webhook] Received from user {user_id[:8]}...: {user_message}")
     
     try:
-        # 放入任務 Queue（non-blocking）
-        asyncio.create_task(task_queue.put({
-            'user_id': user_id,
-            'message': user_message
-        }))
+        # 依目前排隊狀況決定收下 / 只用快取回答 / 請用戶稍後再試
+        admission = admit(user_message)
         
-        print(f"[Webhook] Task queued, queue size: {task_queue.qsize()}")
+        if admission.admitted:
+            # 放入任務 Queue（non-blocking，批次寫入磁碟）
+            enqueue_task({
+                'user_id': user_id,
+                'message': user_message,
+                'cache_only': admission.cache_only,
+                'deadline': time.time() + TASK_DEADLINE  # 整個任務的時間預算從收到訊息起算
+            })
+            print(f"[Webhook] Task queued ({admission.decision}, {admission.lane} lane, "
+                  f"~{admission.wait_seconds:.0f}s), queue size: {queued_tasks()}")
+        else:
+            print(f"[Webhook] Task rejected, queue size: {queued_tasks()}")
         
-        # 立刻回覆「搜尋中」
+        # 立刻回覆排隊位置 / 預估等待時間
         line_bot_api.reply_message(
             event.reply_token,
-            TextSendMessage(text="🔍 搜尋中，請稍候 10-20 秒...")
+            TextSendMessage(text=admission.reply_text())
         )
         
-        print(f"[Webhook] Replied '搜尋中', waiting for worker")
+        print(f"[Webhook] Replied '{admission.reply_text()}'")
         
     except Exception as e:
         print(f"[Webhook Error] {e}")
@@ -3,7 +3,7 @@ LINE Bot 對話邏輯
 完整流程：文字 → Intent Parser → 搜尋 → 評分 → Flex Message
 """
 import os
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from linebot.models import TextSendMessage, FlexSendMessage
 
 # 導入 agent 模組
@@ -11,8 +11,10 @@ from agent.planner.intent_parser import IntentParser
 from agent.planner.scorer import ScoringEngine
 from agent.planner.recommender import RecommendationGenerator
 from agent.scrapers.browser_manager import BrowserManager
+from agent.scrapers.deadline import Deadline
 from agent.scrapers.ubereats.search import UberEatsSearcher
 from interfaces.line_bot.flex_messages import create_recommendations_flex
+from interfaces.line_bot.config import TASK_DEADLINE
 
 # 配置
 PROFILE_PATH = os.path.join(os.path.dirname(__file__), "../../chromium_profile")
@@ -53,17 +55,20 @@ def _search_restaurants_sync(search_query: str, limit: int = 15):
             browser.close()
             print(f"[Thread] Browser closed")
 
-def handle_text_message(user_message: str, user_id: str):
+def handle_text_message(user_message: str, user_id: str, deadline: Deadline = None):
     """
     處理用戶文字訊息
     
     Args:
         user_message: 用戶輸入的文字
         user_id: LINE 用戶 ID
+        deadline: 時間預算（預設從現在起 TASK_DEADLINE 秒）
     
     Returns:
         List of reply messages
     """
+    deadline = deadline or Deadline.after(TASK_DEADLINE)
+    
     # Step 1: 解析需求
     parser = IntentParser()
     intent = parser.parse(user_message)
@@ -73,7 +78,13 @@ def handle_text_message(user_message: str, user_id: str):
     
     # Step 2: 搜尋餐廳（在獨立線程中運行同步代碼）
     future = executor.submit(_search_restaurants_sync, search_query, 15)
-    restaurants = future.result(timeout=60)  # 60 秒超時
+    try:
+        # 最多等 60 秒，且不超過剩餘預算（保留 1 秒給評分與回覆）
+        restaurants = future.result(timeout=deadline.timeout(60, reserve=1.0))
+    except FutureTimeoutError:
+        # 同步 Playwright 無法從外部中斷，搜尋 thread 會在自己的 timeout 後結束
+        print(f"[Search] Deadline reached ({deadline}), giving up on search")
+        return [TextSendMessage(text="抱歉，這次搜尋超過時間了，請稍後再試一次 😢")]
     
     print(f"[Search] Found {len(restaurants)} restaurants")
     
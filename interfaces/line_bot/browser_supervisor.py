@@ -0,0 +1,268 @@
+"""
+Browser Supervisor - 監控全域 Chromium 並自動回收
+追蹤：服務過的 context 數、Chromium 程序 RSS、崩潰 / 斷線次數、任務錯誤率
+任一指標超標就啟動新 browser、把 context pool 切過去，舊 browser 等借出的 context 歸還後才關閉；
+Queue 不受影響，排隊中的任務直接用新 browser 的 context
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+from playwright.async_api import Browser
+
+from interfaces.line_bot.context_pool import ContextPool
+
+def _process_tree_rss_mb(root_pid: int, name_markers=("chrom", "headless_shell")) -> Optional[float]:
+    """
+    root_pid 的所有子孫程序中，Chromium 相關程序的 RSS 總和（MB）
+    Playwright driver（node）→ Chromium browser / renderer / gpu 都是本程序的子孫
+    只支援 Linux（/proc），其他平台回傳 None
+    """
+    if not os.path.isdir("/proc"):
+        return None
+
+    parents = {}
+    names = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # comm 可能含空白，以最後一個 ")" 切開
+        comm = stat[stat.find("(") + 1:stat.rfind(")")]
+        fields = stat[stat.rfind(")") + 2:].split()
+        parents[int(entry)] = int(fields[1])
+        names[int(entry)] = comm.lower()
+
+    children: Dict[int, list] = {}
+    for pid, ppid in parents.items():
+        children.setdefault(ppid, []).append(pid)
+
+    total_kb = 0
+    stack = list(children.get(root_pid, []))
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        if not any(marker in names.get(pid, "") for marker in name_markers):
+            continue
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+
+    return round(total_kb / 1024, 1)
+
+class BrowserSupervisor:
+    """全域 browser 的健康監控與回收"""
+
+    def __init__(
+        self,
+        launch: Callable[[], Awaitable[Browser]],
+        max_contexts: int = 500,
+        max_rss_mb: float = 1500,
+        max_error_rate: float = 0.5,
+        error_window: int = 20,
+        check_interval: float = 30,
+        drain_timeout: float = 60,
+    ):
+        """
+        Args:
+            launch: 啟動新 browser 的 coroutine function
+            max_contexts: 單一 browser 最多服務幾次 context 借出
+            max_rss_mb: Chromium 程序樹 RSS 上限（MB）
+            max_error_rate: 最近 error_window 個任務的錯誤率上限
+            error_window: 錯誤率的統計視窗（任務數）
+            check_interval: 健康檢查間隔秒數
+            drain_timeout: 舊 browser 等借出 context 歸還的最長秒數
+        """
+        self._launch = launch
+        self.max_contexts = max_contexts
+        self.max_rss_mb = max_rss_mb
+        self.max_error_rate = max_error_rate
+        self.error_window = error_window
+        self.check_interval = check_interval
+        self.drain_timeout = drain_timeout
+
+        self.browser: Optional[Browser] = None
+        self.pool: Optional[ContextPool] = None
+        self.generation = 0
+        self.launched_at = 0.0
+        self._served_at_launch = 0
+        self._outcomes = deque(maxlen=error_window)
+        self._recycle_lock = asyncio.Lock()
+        self._drain_tasks = set()
+        self._recycle_tasks = set()  # 斷線觸發的回收（保留參照，避免還沒跑完就被 GC）
+        self._monitor_task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.last_rss_mb: Optional[float] = None
+
+        self.stats = {
+            "recycles": 0,
+            "crashes": 0,
+            "drained": 0,
+            "drain_timeouts": 0,
+            "recycle_reasons": {},
+        }
+
+    async def start(self) -> Browser:
+        """啟動第一個 browser"""
+        self.browser = await self._launch_browser()
+        return self.browser
+
+    def attach_pool(self, pool: ContextPool):
+        """綁定 context pool（回收時切換到新 browser），並開始健康檢查"""
+        self.pool = pool
+        self._served_at_launch = self._contexts_served_total()
+        self._monitor_task = asyncio.create_task(self._monitor())
+
+    async def _launch_browser(self) -> Browser:
+        browser = await self._launch()
+        self.generation += 1
+        self.launched_at = time.monotonic()
+        generation = self.generation
+        browser.on("disconnected", lambda _: self._on_disconnected(browser, generation))
+        print(f"[Supervisor] Browser #{generation} launched")
+        return browser
+
+    def _on_disconnected(self, browser: Browser, generation: int):
+        """browser 斷線：是目前使用中的 browser 就立即換新"""
+        if self._closing or browser is not self.browser:
+            return
+        self.stats["crashes"] += 1
+        print(f"[Supervisor] Browser #{generation} disconnected, launching replacement...")
+        task = asyncio.create_task(self.recycle("disconnected"))
+        self._recycle_tasks.add(task)
+        task.add_done_callback(self._recycle_done)
+
+    def _recycle_done(self, task: asyncio.Task):
+        self._recycle_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            print(f"[Supervisor] Replacement after disconnect failed: {task.exception()}")
+
+    def _contexts_served_total(self) -> int:
+        if not self.pool:
+            return 0
+        return self.pool.stats["hits"] + self.pool.stats["misses"]
+
+    def contexts_served(self) -> int:
+        """目前 browser 服務過幾次 context 借出"""
+        return self._contexts_served_total() - self._served_at_launch
+
+    def record_task(self, success: bool):
+        """記錄任務結果（算錯誤率）"""
+        self._outcomes.append(success)
+
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def _recycle_reason(self) -> Optional[str]:
+        """檢查各項指標，需要回收時回傳原因"""
+        if self.browser and not self.browser.is_connected():
+            return "disconnected"
+        if self.contexts_served() >= self.max_contexts:
+            return "contexts"
+        # 舊 browser 還在 drain 時 RSS 會多算，先不看
+        if not self._drain_tasks:
+            self.last_rss_mb = _process_tree_rss_mb(os.getpid())
+            if self.last_rss_mb is not None and self.last_rss_mb >= self.max_rss_mb:
+                return "memory"
+        if len(self._outcomes) >= self.error_window and self.error_rate() >= self.max_error_rate:
+            return "error_rate"
+        return None
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                reason = self._recycle_reason()
+                if reason:
+                    await self.recycle(reason)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Supervisor] Health check failed: {e}")
+
+    async def recycle(self, reason: str):
+        """啟動新 browser → pool 切換 → 背景 drain 舊 browser"""
+        async with self._recycle_lock:
+            if self._closing:
+                return
+            # 等鎖期間已經換過（例如斷線與定期檢查同時觸發）
+            if reason == "disconnected" and self.browser and self.browser.is_connected():
+                return
+
+            old = self.browser
+            print(f"[Supervisor] Recycling browser #{self.generation} ({reason}), "
+                  f"served={self.contexts_served()}, rss={self.last_rss_mb}MB, error_rate={self.error_rate():.2f}")
+
+            self.browser = await self._launch_browser()
+            self._outcomes.clear()
+            if self.pool:
+                self._served_at_launch = self._contexts_served_total()
+                await self.pool.rebind(self.browser)
+
+            self.stats["recycles"] += 1
+            self.stats["recycle_reasons"][reason] = self.stats["recycle_reasons"].get(reason, 0) + 1
+
+            if old:
+                task = asyncio.create_task(self._drain(old))
+                self._drain_tasks.add(task)
+                task.add_done_callback(self._drain_tasks.discard)
+
+    async def _drain(self, browser: Browser):
+        """等舊 browser 上借出的 context 都歸還後關閉（最多 drain_timeout 秒）"""
+        deadline = time.monotonic() + self.drain_timeout
+        while self.pool and self.pool.in_use_on(browser) and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+
+        if self.pool and self.pool.in_use_on(browser):
+            self.stats["drain_timeouts"] += 1
+            print(f"[Supervisor] Drain timed out, closing old browser with "
+                  f"{self.pool.in_use_on(browser)} contexts still in use")
+
+        try:
+            await browser.close()
+        except Exception as e:
+            print(f"[Supervisor] Error closing old browser: {e}")
+        self.stats["drained"] += 1
+        print("[Supervisor] Old browser closed")
+
+    async def close(self):
+        """停止監控、關閉所有 browser"""
+        self._closing = True
+        if self._monitor_task:
+            self._monitor_task.cancel()
+            await asyncio.gather(self._monitor_task, return_exceptions=True)
+        if self._recycle_tasks:
+            await asyncio.gather(*self._recycle_tasks, return_exceptions=True)
+        if self._drain_tasks:
+            await asyncio.gather(*self._drain_tasks, return_exceptions=True)
+        if self.browser:
+            try:
+                await self.browser.close()
+            except Exception as e:
+                print(f"[Supervisor] Error closing browser: {e}")
+            self.browser = None
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "recycle_reasons": dict(self.stats["recycle_reasons"]),
+            "generation": self.generation,
+            "uptime_seconds": round(time.monotonic() - self.launched_at, 1) if self.launched_at else 0,
+            "contexts_served": self.contexts_served(),
+            "rss_mb": self.last_rss_mb,
+            "error_rate": round(self.error_rate(), 3),
+            "draining": len(self._drain_tasks),
+        }
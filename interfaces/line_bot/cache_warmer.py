@@ -0,0 +1,167 @@
+"""
+Cache Warmer - 用餐時段前預熱搜尋快取
+依 IntentParser.MEAL_TYPES 的時段，在每個時段開始前 lead 秒，
+把該時段歷史上最常見的 N 個查詢先跑一次搜尋（+ 菜單補充），填滿 search cache / menu store
+低優先：Queue 有任務或有 consumer 在忙時先讓路
+"""
+import asyncio
+import json
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from agent.planner.intent_parser import IntentParser
+
+# 各餐別時段開始時間（當地時間 時, 分），key 對應 IntentParser.MEAL_TYPES 的值
+MEAL_WINDOWS = {
+    "breakfast": (7, 0),
+    "lunch": (11, 30),
+    "afternoon_tea": (14, 30),
+    "dinner": (17, 30),
+    "late_night": (22, 0),
+}
+
+# 餐別 → 中文查詢（沒有歷史資料時用餐別本身當查詢）
+MEAL_QUERIES = {en: cn for cn, en in IntentParser.MEAL_TYPES.items()}
+
+def meal_type_at(now: datetime) -> str:
+    """目前時間屬於哪個餐別（最近一個已開始的時段，午夜後仍算宵夜）"""
+    current = "late_night"
+    for meal_type, (hour, minute) in sorted(MEAL_WINDOWS.items(), key=lambda kv: kv[1]):
+        if (now.hour, now.minute) >= (hour, minute):
+            current = meal_type
+    return current
+
+def next_warm_time(now: datetime, lead_seconds: float) -> Tuple[datetime, str]:
+    """下一次預熱時間（時段開始前 lead_seconds 秒）與對應餐別"""
+    candidates = []
+    for meal_type, (hour, minute) in MEAL_WINDOWS.items():
+        start = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        warm_at = start - timedelta(seconds=lead_seconds)
+        if warm_at <= now:
+            warm_at += timedelta(days=1)
+        candidates.append((warm_at, meal_type))
+    return min(candidates)
+
+class QueryHistory:
+    """
+    各餐別的查詢次數（可存成 JSON，重啟後保留）
+    每個餐別最多保留 max_queries 個查詢：超過兩倍時在記憶體中修剪，存檔前也修剪，只留次數最多的
+    """
+
+    def __init__(self, path: Optional[str] = None, max_queries: int = 200):
+        self.path = path
+        self.max_queries = max(1, max_queries)
+        self.counts: Dict[str, Counter] = {meal_type: Counter() for meal_type in MEAL_WINDOWS}
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for meal_type, counts in data.items():
+                self.counts.setdefault(meal_type, Counter()).update(counts)
+        except (OSError, ValueError) as e:
+            print(f"[Warmer] Failed to load query history: {e}")
+        self._prune_all()
+
+    def _prune(self, meal_type: str):
+        counts = self.counts[meal_type]
+        if len(counts) > self.max_queries:
+            self.counts[meal_type] = Counter(dict(counts.most_common(self.max_queries)))
+
+    def _prune_all(self):
+        for meal_type in list(self.counts):
+            self._prune(meal_type)
+
+    def save(self):
+        if not self.path:
+            return
+        self._prune_all()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({k: dict(v) for k, v in self.counts.items()}, f, ensure_ascii=False, indent=2)
+
+    def record(self, meal_type: str, search_query: str):
+        counts = self.counts.setdefault(meal_type, Counter())
+        counts[search_query] += 1
+        if len(counts) > 2 * self.max_queries:
+            self._prune(meal_type)
+
+    def top(self, meal_type: str, n: int) -> List[str]:
+        """該餐別最常見的 n 個查詢（沒有歷史時用餐別名稱）"""
+        queries = [query for query, _ in self.counts.get(meal_type, Counter()).most_common(n)]
+        return queries or [MEAL_QUERIES.get(meal_type, "美食")]
+
+class CacheWarmer:
+    """用餐時段前的快取預熱排程"""
+
+    def __init__(
+        self,
+        warm_fn: Callable[[str], Awaitable[bool]],
+        history: QueryHistory,
+        is_busy: Callable[[], bool],
+        top_n: int = 5,
+        lead_seconds: float = 240,
+    ):
+        """
+        Args:
+            warm_fn: 預熱單一查詢，回傳是否真的有抓（快取仍新鮮時回傳 False）
+            history: 查詢歷史
+            is_busy: 是否有即時任務在跑 / 排隊（True 時暫停預熱）
+            top_n: 每個時段預熱幾個查詢
+            lead_seconds: 時段開始前幾秒預熱（需小於 search cache TTL）
+        """
+        self.warm_fn = warm_fn
+        self.history = history
+        self.is_busy = is_busy
+        self.top_n = top_n
+        self.lead_seconds = lead_seconds
+        self.next_run: Optional[Tuple[datetime, str]] = None
+        self._stats = {"runs": 0, "warmed": 0, "skipped_fresh": 0, "failed": 0, "yield_seconds": 0}
+
+    async def run(self):
+        """排程主迴圈（背景 task，cancel 即停止）"""
+        print(f"[Warmer] Cache warmer started (top_n={self.top_n}, lead={self.lead_seconds:.0f}s)")
+        while True:
+            self.next_run = next_warm_time(datetime.now(), self.lead_seconds)
+            warm_at, meal_type = self.next_run
+            print(f"[Warmer] Next warm-up: {meal_type} at {warm_at:%H:%M}")
+
+            # 分段睡，避免系統時間調整後錯過時段
+            while (remaining := (warm_at - datetime.now()).total_seconds()) > 0:
+                await asyncio.sleep(min(remaining, 60))
+
+            await self.warm(meal_type)
+            self.history.save()
+
+    async def warm(self, meal_type: str):
+        """預熱單一餐別的熱門查詢（一次一個，有即時任務就讓路）"""
+        queries = self.history.top(meal_type, self.top_n)
+        print(f"[Warmer] Warming {meal_type}: {queries}")
+        self._stats["runs"] += 1
+
+        for query in queries:
+            await self._yield_to_live()
+            try:
+                if await self.warm_fn(query):
+                    self._stats["warmed"] += 1
+                else:
+                    self._stats["skipped_fresh"] += 1
+            except Exception as e:
+                self._stats["failed"] += 1
+                print(f"[Warmer] Failed to warm '{query}': {e}")
+
+    async def _yield_to_live(self):
+        while self.is_busy():
+            self._stats["yield_seconds"] += 1
+            await asyncio.sleep(1)
+
+    def get_stats(self) -> Dict:
+        stats = dict(self._stats)
+        if self.next_run:
+            stats["next_run"] = f"{self.next_run[1]}@{self.next_run[0]:%Y-%m-%d %H:%M}"
+        return stats
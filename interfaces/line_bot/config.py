@@ -15,3 +15,86 @@ LINE_CHANNEL_ACCESS_TOKEN = os.getenv("LINE_CHANNEL_ACCESS_TOKEN", "")
 
 # 本機測試用（正式環境用 ngrok）
 WEBHOOK_URL_BASE = os.getenv("WEBHOOK_URL_BASE", "http://localhost:8000")
+
+# Uber Eats 登入狀態（export_auth_state.py 匯出）
+AUTH_STATE_PATH = os.getenv("AUTH_STATE_PATH", os.path.join(os.path.dirname(__file__), "../../auth_state.json"))
+
+# BrowserContext Pool 設定
+CONTEXT_POOL_MIN_SIZE = int(os.getenv("CONTEXT_POOL_MIN_SIZE", "2"))
+CONTEXT_POOL_MAX_SIZE = int(os.getenv("CONTEXT_POOL_MAX_SIZE", "4"))
+CONTEXT_POOL_MAX_USES = int(os.getenv("CONTEXT_POOL_MAX_USES", "50"))        # 每個 context 最多使用次數
+CONTEXT_POOL_MAX_AGE = float(os.getenv("CONTEXT_POOL_MAX_AGE", "600"))      # 每個 context 最長存活秒數
+
+# Scraper 分片：N > 0 時啟動 N 個子程序各自持有 browser，webhook 程序只負責分派（0 = 單程序）
+SCRAPER_SHARDS = int(os.getenv("SCRAPER_SHARDS", "0"))
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "64"))  # consistent hash 每個分片的虛擬節點數
+
+# Worker Pool 設定（分片時 consumer 數預設 = 分片數 × 每個分片的 context 上限）
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", str(CONTEXT_POOL_MAX_SIZE * max(1, SCRAPER_SHARDS))))  # consumer 數量
+WORKER_DRAIN_TIMEOUT = float(os.getenv("WORKER_DRAIN_TIMEOUT", "30"))  # 關閉時等待處理中任務完成的秒數
+
+# 攔截圖片 / 字型 / 影片 / 分析 beacon（scraper 用不到）
+BLOCK_RESOURCES = os.getenv("BLOCK_RESOURCES", "true").lower() == "true"
+
+# 優先使用 Uber Eats feed API 回應（拿不到才解析 DOM）
+USE_API_CAPTURE = os.getenv("USE_API_CAPTURE", "true").lower() == "true"
+
+# 錄製 / 重播（離線 benchmark 用；兩者擇一，留空 = 正常連網）
+SCRAPER_RECORD_DIR = os.getenv("SCRAPER_RECORD_DIR") or None
+SCRAPER_REPLAY_DIR = os.getenv("SCRAPER_REPLAY_DIR") or None
+
+# 菜單補充：搜尋後平行開前 K 家店家頁，取真實菜單價格再評分（只在有預算需求時執行）
+ENRICH_TOP_K = int(os.getenv("ENRICH_TOP_K", "5"))                 # 0 = 關閉
+ENRICH_CONCURRENCY = int(os.getenv("ENRICH_CONCURRENCY", "3"))     # 同時開幾個店家分頁
+ENRICH_DEADLINE = float(os.getenv("ENRICH_DEADLINE", "8"))         # 整體秒數上限，逾時就用已抓到的結果
+ENRICH_MENU_LIMIT = int(os.getenv("ENRICH_MENU_LIMIT", "20"))      # 每家最多抓幾個菜單項目
+
+# 搜尋結果快取（同查詢 + 同外送地點在 TTL 內不重新開瀏覽器）
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))                # 秒，0 = 每次都重新搜尋
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "256"))
+DELIVERY_LOCATION = os.getenv("DELIVERY_LOCATION", "default")  # auth_state 帳號設定的外送地址（快取 key 的一部分）
+
+# 店家菜單 SQLite 快取（以 store UUID 為 key，TTL 內不重抓店家頁）
+MENU_STORE_PATH = os.getenv("MENU_STORE_PATH", os.path.join(os.path.dirname(__file__), "../../results/menu_store.db"))
+MENU_STORE_TTL = float(os.getenv("MENU_STORE_TTL", "86400"))  # 秒
+
+# 用餐時段預熱（時段開始前先跑熱門查詢，lead 需小於 SEARCH_CACHE_TTL）
+CACHE_WARMER_ENABLED = os.getenv("CACHE_WARMER_ENABLED", "true").lower() == "true"
+CACHE_WARM_TOP_N = int(os.getenv("CACHE_WARM_TOP_N", "5"))        # 每個時段預熱幾個查詢
+CACHE_WARM_LEAD = float(os.getenv("CACHE_WARM_LEAD", "240"))      # 時段開始前幾秒預熱
+CACHE_WARM_HISTORY_MAX = int(os.getenv("CACHE_WARM_HISTORY_MAX", "200"))  # 每個餐別最多保留幾個查詢的次數
+CACHE_WARM_HISTORY_PATH = os.getenv(
+    "CACHE_WARM_HISTORY_PATH", os.path.join(os.path.dirname(__file__), "../../results/query_history.json")
+)
+
+# Stale-while-revalidate：超過 SEARCH_CACHE_TTL 但在 hard TTL 內的快取先回給用戶，背景重新搜尋
+SEARCH_CACHE_STALE_TTL = float(os.getenv("SEARCH_CACHE_STALE_TTL", "900"))  # 秒，不大於 SEARCH_CACHE_TTL = 關閉
+SWR_PUSH_CORRECTIONS = os.getenv("SWR_PUSH_CORRECTIONS", "false").lower() == "true"  # Top 3 變動時推送更正
+
+# Browser 健康監控：任一指標超標就啟動新 browser，舊的等借出 context 歸還後關閉
+BROWSER_MAX_CONTEXTS = int(os.getenv("BROWSER_MAX_CONTEXTS", "500"))          # 單一 browser 最多借出幾次 context
+BROWSER_MAX_RSS_MB = float(os.getenv("BROWSER_MAX_RSS_MB", "1500"))           # Chromium 程序樹 RSS 上限
+BROWSER_MAX_ERROR_RATE = float(os.getenv("BROWSER_MAX_ERROR_RATE", "0.5"))    # 最近 20 個任務的錯誤率上限
+BROWSER_HEALTH_INTERVAL = float(os.getenv("BROWSER_HEALTH_INTERVAL", "30"))   # 健康檢查間隔秒數
+BROWSER_DRAIN_TIMEOUT = float(os.getenv("BROWSER_DRAIN_TIMEOUT", "60"))       # 舊 browser 最多等幾秒再關閉
+
+# 任務 Queue（SQLite WAL，webhook / worker 重啟不遺失排隊中的任務）
+TASK_QUEUE_PATH = os.getenv("TASK_QUEUE_PATH", os.path.join(os.path.dirname(__file__), "../../results/task_queue.db"))
+TASK_QUEUE_VISIBILITY_TIMEOUT = float(os.getenv("TASK_QUEUE_VISIBILITY_TIMEOUT", "300"))  # 取出後多久沒完成就重新交付
+TASK_QUEUE_MAX_ATTEMPTS = int(os.getenv("TASK_QUEUE_MAX_ATTEMPTS", "3"))                   # 超過就移到 dead_tasks
+TASK_QUEUE_BATCH_MS = float(os.getenv("TASK_QUEUE_BATCH_MS", "5"))                        # put / ack 批次寫入間隔
+
+# 公平排程：各用戶輪流、每人同時處理中任務有上限；快取可回答的任務走 fast lane
+SCHED_PER_USER_LIMIT = int(os.getenv("SCHED_PER_USER_LIMIT", "1"))                                  # 每個用戶同時處理幾個任務
+SCHED_SLOW_SLOTS = int(os.getenv("SCHED_SLOW_SLOTS", str(max(1, WORKER_CONCURRENCY - 1))))           # 需開瀏覽器的任務最多佔幾個 consumer
+SCHED_FAST_BURST = int(os.getenv("SCHED_FAST_BURST", "4"))                                           # fast lane 連續幾個後讓 slow lane 一次
+SUPERSEDE_OLDER_TASKS = os.getenv("SUPERSEDE_OLDER_TASKS", "true").lower() == "true"              # 新訊息取消同一用戶排隊 / 處理中的舊任務
+
+# 任務時間預算：webhook 收到訊息起算，各階段 timeout 依剩餘時間縮短，用完就回傳部分結果 / 快取
+TASK_DEADLINE = float(os.getenv("TASK_DEADLINE", "45"))  # 秒，收到訊息到推送結果的上限
+PUSH_RESERVE = float(os.getenv("PUSH_RESERVE", "3"))     # 保留給推送的秒數
+TASK_REDELIVERY_DEADLINE = float(os.getenv("TASK_REDELIVERY_DEADLINE", "30"))  # 因重啟放回、預算已用完的任務重新給的秒數
+
+# Admission control：依各階段處理時間 EWMA 估計等待時間，webhook 回覆排隊位置 / 預估秒數
+ADMISSION_SHED_WAIT = float(os.getenv("ADMISSION_SHED_WAIT", str(TASK_DEADLINE)))  # 需開瀏覽器的任務預估等待超過此秒數 → 只用快取回答
+ADMISSION_MAX_QUEUED = int(os.getenv("ADMISSION_MAX_QUEUED", "200"))  # 排隊任務總數上限，超過直接請用戶稍後再試
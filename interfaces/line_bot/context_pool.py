@@ -0,0 +1,371 @@
+"""
+BrowserContext Pool - 預熱並重複使用 BrowserContext
+避免每個任務都重新讀取 auth_state.json + new_context 的開銷
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from playwright.async_api import Browser, BrowserContext
+
+from agent.scrapers.resource_blocking import BlockingProfile, ResourceBlocker, RouteStats
+from agent.scrapers.recording import FixtureReplayer, har_path, save_page_html
+
+
+class PooledContext:
+    """池中的單一 context（記錄建立時間、使用次數與所屬 browser）"""
+
+    def __init__(
+        self,
+        context: BrowserContext,
+        blocker: Optional[ResourceBlocker] = None,
+        browser: Optional[Browser] = None,
+    ):
+        self.context = context
+        self.blocker = blocker
+        self.browser = browser
+        self.created_at = time.monotonic()
+        self.uses = 0
+        self.fixture_dir: Optional[str] = None  # 錄製模式：這次查詢的錄製資料夾
+
+    async def save_html(self, page, label: str):
+        """錄製模式：存下目前頁面的 HTML（replay 時用來回應 document 請求）"""
+        if self.fixture_dir:
+            save_page_html(await page.content(), page.url, self.fixture_dir, label)
+
+    @property
+    def route_stats(self) -> Optional[RouteStats]:
+        """本次任務的攔截統計（未啟用 blocking 時為 None）"""
+        return self.blocker.stats if self.blocker else None
+
+    def age(self) -> float:
+        """存活秒數"""
+        return time.monotonic() - self.created_at
+
+
+class ContextPool:
+    """
+    BrowserContext 池
+
+    - 啟動時預先建立 min_size 個 context
+    - 每個任務 acquire 一個 context，用完 release 回池中
+    - release 時重置 context（關閉所有 page、重新寫入 cookies）
+    - 使用超過 max_uses 次或存活超過 max_age 秒就淘汰
+    - 同時存在的 context 不超過 max_size，超過時等待
+    - 有 blocking_profile 時，每個 context 建立時就掛上 route 攔截
+    - record_dir：每個查詢用一個專用 context（lease(record_label)），HAR 與頁面 HTML
+      存到 record_dir/record_label，可直接當 FixtureReplayer 的 replay_dir；錄製模式不預熱、不重用 context
+    - replay_dir：所有請求由錄製資料回應，不連網
+    - rebind(browser)：換成新 browser，舊 browser 的 idle context 立即淘汰，
+      使用中的在 release 時淘汰（in_use_on 可查詢還剩幾個）
+    """
+
+    def __init__(
+        self,
+        browser: Browser,
+        storage_state_path: str,
+        min_size: int = 2,
+        max_size: int = 4,
+        max_uses: int = 50,
+        max_age: float = 600,
+        blocking_profile: Optional[BlockingProfile] = None,
+        record_dir: Optional[str] = None,
+        replay_dir: Optional[str] = None,
+    ):
+        self.browser = browser
+        self.storage_state_path = storage_state_path
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size, 1)
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.blocking_profile = blocking_profile
+        if record_dir and replay_dir:
+            raise ValueError("record_dir and replay_dir are mutually exclusive")
+        self.record_dir = record_dir
+        self.replayer = FixtureReplayer(replay_dir) if replay_dir else None
+        if record_dir:
+            # 每個查詢一個 context，池中不保留 idle context
+            self.min_size = 0
+
+        # auth_state.json 只讀取 / 解析一次
+        self._storage_state = self._load_storage_state()
+
+        self._idle = deque()
+        self._in_use = set()  # 已借出的 PooledContext
+        self._live = 0  # 目前存在的 context 數（idle + in use）
+        self._cond = asyncio.Condition()
+        self._closed = False
+
+        self.stats = {
+            "hits": 0,            # 直接拿到 idle context
+            "misses": 0,          # 需要新建 context
+            "waits": 0,           # 池滿需要等待
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+            "created": 0,
+            "retired": 0,
+            "reset_failures": 0,
+            "rebinds": 0,
+            "requests_blocked": 0,
+            "requests_allowed": 0,
+            "bytes_saved_estimate": 0,
+        }
+
+    def _load_storage_state(self) -> Dict:
+        """讀取 storage_state（cookies + origins）"""
+        with open(self.storage_state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    async def start(self):
+        """預熱：建立 min_size 個 context"""
+        print(f"[ContextPool] Pre-warming {self.min_size} contexts...")
+        for _ in range(self.min_size):
+            async with self._cond:
+                self._live += 1
+            entry = await self._create()
+            async with self._cond:
+                self._idle.append(entry)
+        print(f"[ContextPool] Ready (min={self.min_size}, max={self.max_size})")
+
+    async def _create(self, record_har: Optional[str] = None) -> PooledContext:
+        """
+        建立新 context（呼叫前需先保留 _live 名額；record_har：錄製 HAR 的路徑）
+        失敗或被取消（任務被取代 / deadline）都會關閉建到一半的 context 並歸還名額
+        """
+        browser = self.browser
+        context = None
+        try:
+            record_options = {}
+            if record_har:
+                record_options = {"record_har_path": record_har, "record_har_content": "embed"}
+            context = await browser.new_context(storage_state=self._storage_state, **record_options)
+            blocker = None
+            if self.blocking_profile:
+                blocker = ResourceBlocker(self.blocking_profile)
+                await context.route("**/*", blocker.handle_async)
+            if self.replayer:
+                # 後註冊的 route 先執行：replay 攔下所有請求
+                await context.route("**/*", self.replayer.handle_async)
+        except BaseException:
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception as e:
+                    print(f"[ContextPool] Error closing half-created context: {e}")
+            async with self._cond:
+                self._live -= 1
+                self._cond.notify()
+            raise
+        self.stats["created"] += 1
+        return PooledContext(context, blocker, browser)
+
+    async def _retire(self, entry: PooledContext):
+        """淘汰 context 並釋放名額（關閉途中被取消也會釋放）"""
+        try:
+            await entry.context.close()
+        except Exception as e:
+            print(f"[ContextPool] Error closing context: {e}")
+        finally:
+            self.stats["retired"] += 1
+            async with self._cond:
+                self._live -= 1
+                self._cond.notify()
+
+    def _expired(self, entry: PooledContext) -> bool:
+        """是否超過使用次數、存活時間，或屬於已被替換的 browser"""
+        return (
+            entry.uses >= self.max_uses
+            or entry.age() >= self.max_age
+            or entry.browser is not self.browser
+        )
+
+    async def _reset(self, entry: PooledContext):
+        """重置 context：關閉所有 page、清除並重新寫入 cookies"""
+        for page in list(entry.context.pages):
+            await page.close()
+        await entry.context.clear_cookies()
+        cookies = self._storage_state.get("cookies", [])
+        if cookies:
+            await entry.context.add_cookies(cookies)
+
+    async def acquire(self, record_label: str = "session") -> PooledContext:
+        """
+        取得一個 context（池滿時等待）
+
+        Args:
+            record_label: 錄製模式下這次查詢的資料夾名稱（通常用 recording.fixture_name(query)）
+        """
+        if self._closed:
+            raise RuntimeError("ContextPool is closed")
+
+        start = time.monotonic()
+        waited = False
+        stale = []
+        entry = None
+
+        async with self._cond:
+            while True:
+                # 優先使用 idle context
+                while self._idle:
+                    candidate = self._idle.popleft()
+                    if self._expired(candidate):
+                        stale.append(candidate)
+                        continue
+                    entry = candidate
+                    break
+                if entry:
+                    self.stats["hits"] += 1
+                    break
+
+                # 沒有 idle，還有名額就新建
+                if self._live - len(stale) < self.max_size:
+                    self._live += 1
+                    self.stats["misses"] += 1
+                    break
+
+                if not waited:
+                    self.stats["waits"] += 1
+                    waited = True
+                await self._cond.wait()
+
+        try:
+            while stale:
+                await self._retire(stale.pop())
+        except BaseException:
+            # 淘汰舊 context 時被取消：還沒淘汰的放回（下次 acquire 再淘汰），
+            # 拿到的 idle context 放回、保留的名額歸還
+            async with self._cond:
+                self._idle.extend(stale)
+                if entry is not None:
+                    self._idle.appendleft(entry)
+                else:
+                    self._live -= 1
+                self._cond.notify_all()
+            raise
+
+        if entry is None:
+            if self.record_dir:
+                fixture_dir = os.path.join(self.record_dir, record_label)
+                entry = await self._create(record_har=har_path(fixture_dir))
+                entry.fixture_dir = fixture_dir
+            else:
+                entry = await self._create()
+
+        wait_ms = (time.monotonic() - start) * 1000
+        self.stats["total_wait_ms"] += wait_ms
+        self.stats["max_wait_ms"] = max(self.stats["max_wait_ms"], wait_ms)
+
+        entry.uses += 1
+        self._in_use.add(entry)
+        if entry.blocker:
+            # 每個任務重新計算攔截統計
+            entry.blocker.stats = RouteStats()
+        return entry
+
+    async def release(self, entry: PooledContext, discard: bool = False):
+        """歸還 context；過期、重置失敗或指定 discard 則淘汰"""
+        self._in_use.discard(entry)
+        if entry.route_stats:
+            self.stats["requests_blocked"] += entry.route_stats.blocked
+            self.stats["requests_allowed"] += entry.route_stats.allowed
+            self.stats["bytes_saved_estimate"] += entry.route_stats.bytes_saved
+
+        # 錄製用的 context 關閉時才寫入 HAR，不放回池中
+        if self._closed or discard or entry.fixture_dir or self._expired(entry):
+            await self._retire(entry)
+            await self._replenish()
+            return
+
+        try:
+            await self._reset(entry)
+        except Exception as e:
+            print(f"[ContextPool] Reset failed, retiring context: {e}")
+            self.stats["reset_failures"] += 1
+            await self._retire(entry)
+            await self._replenish()
+            return
+
+        async with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    async def _replenish(self):
+        """淘汰後補回 min_size 個 context"""
+        while not self._closed:
+            async with self._cond:
+                if self._live >= self.min_size:
+                    return
+                self._live += 1
+            try:
+                entry = await self._create()
+            except Exception as e:
+                print(f"[ContextPool] Replenish failed: {e}")
+                return
+            async with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+
+    async def rebind(self, browser: Browser):
+        """
+        改用新的 browser 建立 context（browser 回收 / 崩潰後替換用）
+        舊 browser 的 idle context 立即淘汰並補回，使用中的歸還時淘汰
+        """
+        self.browser = browser
+        self.stats["rebinds"] += 1
+        async with self._cond:
+            stale = [entry for entry in self._idle if entry.browser is not browser]
+            for entry in stale:
+                self._idle.remove(entry)
+        for entry in stale:
+            await self._retire(entry)
+        await self._replenish()
+
+    def in_use_on(self, browser: Browser) -> int:
+        """某個 browser 上還有幾個 context 借出中（drain 舊 browser 用）"""
+        return sum(1 for entry in self._in_use if entry.browser is browser)
+
+    @asynccontextmanager
+    async def lease(self, record_label: str = "session"):
+        """
+        async with pool.lease() as entry:
+            page = await entry.context.new_page()
+            ...
+            entry.route_stats  # 本次任務的攔截統計
+            await entry.save_html(page, "search")  # 錄製模式才會存
+        """
+        entry = await self.acquire(record_label)
+        discard = False
+        try:
+            yield entry
+        except BaseException:
+            # 任務失敗的 context 狀態不可信，直接淘汰
+            discard = True
+            raise
+        finally:
+            await self.release(entry, discard=discard)
+
+    async def close(self):
+        """關閉池中所有 idle context（使用中的會在 release 時關閉）"""
+        self._closed = True
+        async with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for entry in idle:
+            await self._retire(entry)
+        print(f"[ContextPool] Closed ({self.stats['retired']} contexts retired)")
+
+    def get_stats(self) -> Dict:
+        """池統計：hit/miss、等待時間"""
+        acquires = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "live": self._live,
+            "idle": len(self._idle),
+            "in_use": len(self._in_use),
+            "hit_rate": round(self.stats["hits"] / acquires, 3) if acquires else None,
+            "avg_wait_ms": round(self.stats["total_wait_ms"] / acquires, 2) if acquires else None,
+        }
@@ -0,0 +1,467 @@
+"""
+Durable Task Queue - 寫入磁碟的任務 Queue（SQLite WAL）
+取代 in-memory asyncio.Queue：webhook / worker 程序重啟或崩潰時，排隊中的任務不會遺失
+
+- at-least-once：get 只是「租用」任務（visible_at 往後推 visibility_timeout 秒），
+  ack 後才刪除；worker 沒 ack 就掛掉，逾時後任務會重新出現給其他 worker
+- 批次寫入：put / ack / nack 先進記憶體 buffer，batch_interval 後一次 transaction 寫入，
+  put 本身不碰磁碟（sub-ms）；代價是程序在 batch_interval 內崩潰會遺失這一小段
+- 快速取出：一次租用 prefetch 筆放在本地，之後的 get 直接從本地取
+- 多程序共用：同一個 db 檔可以同時有多個 producer / consumer 程序（本程序的 put 立即喚醒，
+  其他程序寫入的任務靠 poll_interval 輪詢）
+- 交付次數：租用時 attempts + 1；正常關閉時還沒處理完的任務放回並退還這一次（不會因為重啟變成 dead），
+  並在任務 dict 記下被放回幾次（_releases），consumer 可據此判斷任務是否因重啟延誤
+- qsize 不查 db：可見任務數在記憶體維護（put / 租用 / nack 時更新，每次租用時順便向 db 校正）
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload      TEXT NOT NULL,
+    enqueued_at  REAL NOT NULL,
+    visible_at   REAL NOT NULL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    lease        TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_visible ON tasks(visible_at, id);
+
+CREATE TABLE IF NOT EXISTS dead_tasks (
+    id           INTEGER PRIMARY KEY,
+    payload      TEXT NOT NULL,
+    enqueued_at  REAL NOT NULL,
+    attempts     INTEGER NOT NULL,
+    died_at      REAL NOT NULL
+);
+"""
+
+# 任務 dict 內由 queue 使用的欄位（寫入時不存）
+TASK_ID = "_task_id"
+TASK_ATTEMPT = "_attempt"
+TASK_RELEASES = "_releases"  # 因關閉 / 中斷被放回的次數（存在 payload 中，重新 put 時不保留）
+
+def _lease_alive(lease: str) -> bool:
+    """lease 的 pid 在本機是否還活著（格式 "<pid>-<random>"）"""
+    try:
+        pid = int(lease.split("-", 1)[0])
+    except ValueError:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class DurableTaskQueue:
+    """SQLite 任務 Queue（在 event loop 中使用；SQL 在 thread 執行）"""
+
+    def __init__(
+        self,
+        db_path: str,
+        visibility_timeout: float = 300,
+        max_attempts: int = 3,
+        batch_interval: float = 0.005,
+        prefetch: int = 4,
+        poll_interval: float = 0.5,
+        on_dead: Optional[Callable[[Dict], None]] = None,
+    ):
+        """
+        Args:
+            db_path: SQLite 檔案路徑
+            visibility_timeout: 任務被取出後多久沒 ack 就重新出現（需大於單一任務最長處理時間）
+            max_attempts: 最多交付幾次，超過移到 dead_tasks（避免毒任務一直讓 worker 崩潰）
+            batch_interval: put / ack 累積多久寫入一次（秒）
+            prefetch: 每次向 db 租用幾筆放在本地
+            poll_interval: 沒有任務時多久查一次 db（其他程序寫入的任務）
+            on_dead: 任務移到 dead_tasks 時呼叫（參數為任務 dict，例如通知用戶處理失敗）
+        """
+        self.db_path = db_path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.batch_interval = batch_interval
+        self.prefetch = max(1, prefetch)
+        self.poll_interval = poll_interval
+        self.on_dead = on_dead
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+        # 每個程序一個 lease 名稱（"<pid>-<random>"），崩潰後下一個啟動的程序依 pid 判斷並放回
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # WAL 下 NORMAL 不會損毀，只可能少最後幾筆 commit
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+        self._recover_orphans()
+
+        self._pending_puts: List[Tuple[str, float]] = []  # (payload json, enqueued_at)
+        self._pending_acks: List[int] = []
+        self._pending_nacks: List[Tuple[int, float]] = []  # (task id, visible_at)
+        self._pending_releases: List[Tuple[int, str]] = []  # (task id, payload) 放回並退還交付次數的任務（關閉 / 處理中被中斷）
+        self._prefetched = deque()  # 已租用、還沒交給 worker
+        self._in_flight: Dict[int, Dict] = {}  # 已交給 worker、還沒 ack
+        self._lease_until: Dict[int, float] = {}  # task id -> 租約到期時間（本程序租用中的任務）
+        self._visible = self._count_visible()  # db 中可見（可租用）的任務數
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_tasks = set()
+        self._wakeup = asyncio.Event()
+        self._closed = False
+
+        self.stats = {
+            "enqueued": 0,
+            "delivered": 0,
+            "redelivered": 0,
+            "acked": 0,
+            "nacked": 0,
+            "dead": 0,
+            "flushes": 0,
+            "total_flush_ms": 0.0,
+            "max_put_us": 0.0,
+        }
+
+    def _recover_orphans(self):
+        """
+        上次崩潰的程序（同一台機器、pid 已不存在）租用的任務立即放回，
+        不必等 visibility_timeout；其他主機的 lease 仍等逾時
+        """
+        with self._lock:
+            leases = [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT lease FROM tasks WHERE lease IS NOT NULL AND visible_at > ?", (time.time(),)
+            )]
+            orphans = [lease for lease in leases if not _lease_alive(lease)]
+            if not orphans:
+                return
+            self._conn.executemany(
+                "UPDATE tasks SET visible_at = ?, lease = NULL WHERE lease = ?",
+                [(time.time(), lease) for lease in orphans],
+            )
+        print(f"[TaskQueue] Recovered tasks from {len(orphans)} dead worker(s)")
+
+    # ---------- producer ----------
+
+    def put_nowait(self, item: Dict):
+        """放入任務（只寫進記憶體 buffer，batch_interval 內寫入磁碟）"""
+        if self._closed:
+            raise RuntimeError("DurableTaskQueue is closed")
+        start = time.perf_counter()
+        payload = {k: v for k, v in item.items() if k not in (TASK_ID, TASK_ATTEMPT, TASK_RELEASES)}
+        self._pending_puts.append((json.dumps(payload, ensure_ascii=False), time.time()))
+        self._schedule_flush()
+        self.stats["enqueued"] += 1
+        self.stats["max_put_us"] = max(self.stats["max_put_us"], (time.perf_counter() - start) * 1e6)
+
+    async def put(self, item: Dict):
+        """同 put_nowait（與 asyncio.Queue 介面相容）"""
+        self.put_nowait(item)
+
+    # ---------- consumer ----------
+
+    async def get(self) -> Dict:
+        """
+        取出一個任務（沒有任務時等待）
+
+        Returns:
+            任務 dict，附帶 _task_id / _attempt；處理完要呼叫 ack(task)
+        """
+        while True:
+            if self._closed:
+                raise RuntimeError("DurableTaskQueue is closed")
+            if self._prefetched:
+                task = self._prefetched.popleft()
+                self._in_flight[task[TASK_ID]] = task
+                self.stats["delivered"] += 1
+                if task[TASK_ATTEMPT] > 1:
+                    self.stats["redelivered"] += 1
+                return task
+
+            # 本程序剛 put 的任務還在 buffer，先寫入才租得到
+            if self._pending_puts:
+                await self.flush()
+
+            self._wakeup.clear()
+            # shield：get 被取消時，已租用的任務仍放進本地（close 時會放回 db）
+            if await asyncio.shield(self._fill_prefetch()):
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def ack(self, task: Dict):
+        """任務完成，從 queue 刪除"""
+        task_id = task.get(TASK_ID)
+        if task_id is None or self._in_flight.pop(task_id, None) is None:
+            return
+        self._lease_until.pop(task_id, None)
+        self._pending_acks.append(task_id)
+        self.stats["acked"] += 1
+        self._schedule_flush()
+
+    def nack(self, task: Dict, delay: float = 0):
+        """放棄任務，delay 秒後重新出現（其他 worker / 下次啟動會再處理）"""
+        task_id = task.get(TASK_ID)
+        if task_id is None or self._in_flight.pop(task_id, None) is None:
+            return
+        self._lease_until.pop(task_id, None)
+        self._pending_nacks.append((task_id, time.time() + delay))
+        self.stats["nacked"] += 1
+        self._schedule_flush()
+
+    def release(self, task: Dict):
+        """
+        處理到一半被中斷（例如關閉時取消 worker）：立即放回並退還這次的交付次數
+        與 nack 不同，這次不算失敗，重啟再多次也不會因此移到 dead_tasks
+        """
+        task_id = task.get(TASK_ID)
+        if task_id is None or self._in_flight.pop(task_id, None) is None:
+            return
+        self._lease_until.pop(task_id, None)
+        self._pending_releases.append(self._release_entry(task))
+        self._schedule_flush()
+
+    async def extend_expiring(self, tasks: List[Dict], within: float) -> int:
+        """
+        延長 within 秒內到期的租約（本地預取的任務 + tasks 中還沒 ack 的任務），
+        給在本地等待排程的任務用，避免逾時後被重複交付
+
+        Returns:
+            延長了幾筆
+        """
+        now = time.time()
+        held = list(self._prefetched) + [task for task in tasks if task.get(TASK_ID) in self._in_flight]
+        task_ids = [
+            task[TASK_ID] for task in held
+            if self._lease_until.get(task[TASK_ID], now) - now < within
+        ]
+        if not task_ids:
+            return 0
+        visible_at = now + self.visibility_timeout
+        await asyncio.to_thread(self._write_extend, task_ids, visible_at)
+        for task_id in task_ids:
+            if task_id in self._lease_until:  # 寫入期間可能已 ack
+                self._lease_until[task_id] = visible_at
+        return len(task_ids)
+
+    def _write_extend(self, task_ids: List[int], visible_at: float):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE tasks SET visible_at = ? WHERE id = ? AND lease = ?",
+                [(visible_at, task_id, self.owner) for task_id in task_ids],
+            )
+
+    # ---------- 批次寫入 ----------
+
+    def _schedule_flush(self):
+        if self._flush_handle is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._flush_handle = loop.call_later(self.batch_interval, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+        task = asyncio.create_task(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self):
+        """把 buffer 中的 put / ack / nack 以一個 transaction 寫入"""
+        puts, self._pending_puts = self._pending_puts, []
+        acks, self._pending_acks = self._pending_acks, []
+        nacks, self._pending_nacks = self._pending_nacks, []
+        releases, self._pending_releases = self._pending_releases, []
+        if not (puts or acks or nacks or releases):
+            return
+
+        start = time.monotonic()
+        try:
+            await asyncio.to_thread(self._write_batch, puts, acks, nacks, releases)
+        except Exception as e:
+            # 寫入失敗放回 buffer，下次再試
+            print(f"[TaskQueue] Flush failed ({len(puts)} puts, {len(acks)} acks): {e}")
+            self._pending_puts[:0] = puts
+            self._pending_acks[:0] = acks
+            self._pending_nacks[:0] = nacks
+            self._pending_releases[:0] = releases
+            if not self._closed:
+                self._schedule_flush()
+            return
+
+        self.stats["flushes"] += 1
+        self.stats["total_flush_ms"] += (time.monotonic() - start) * 1000
+        now = time.time()
+        self._visible += len(puts) + len(releases) + sum(1 for _, visible_at in nacks if visible_at <= now)
+        if puts or nacks or releases:
+            self._wakeup.set()
+
+    def _write_batch(self, puts, acks, nacks, releases):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if puts:
+                    self._conn.executemany(
+                        "INSERT INTO tasks (payload, enqueued_at, visible_at) VALUES (?, ?, ?)",
+                        [(payload, enqueued_at, enqueued_at) for payload, enqueued_at in puts],
+                    )
+                if acks:
+                    self._conn.executemany("DELETE FROM tasks WHERE id = ?", [(task_id,) for task_id in acks])
+                if nacks:
+                    self._conn.executemany(
+                        "UPDATE tasks SET visible_at = ?, lease = NULL WHERE id = ?",
+                        [(visible_at, task_id) for task_id, visible_at in nacks],
+                    )
+                if releases:
+                    # 還沒處理完就關閉：這次不算交付，payload 記下放回次數
+                    self._conn.executemany(
+                        "UPDATE tasks SET visible_at = ?, lease = NULL, attempts = MAX(attempts - 1, 0), payload = ? "
+                        "WHERE id = ? AND lease = ?",
+                        [(time.time(), payload, task_id, self.owner) for task_id, payload in releases],
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _release_entry(task: Dict) -> Tuple[int, str]:
+        """放回用的 (task id, payload)：放回次數 + 1"""
+        payload = {k: v for k, v in task.items() if k not in (TASK_ID, TASK_ATTEMPT)}
+        payload[TASK_RELEASES] = task.get(TASK_RELEASES, 0) + 1
+        return task[TASK_ID], json.dumps(payload, ensure_ascii=False)
+
+    async def _fill_prefetch(self) -> int:
+        claimed, dead, visible = await asyncio.to_thread(self._claim, self.prefetch)
+        self._visible = visible
+        lease_until = time.time() + self.visibility_timeout
+        for task in claimed:
+            self._lease_until[task[TASK_ID]] = lease_until
+        self._prefetched.extend(claimed)
+        for task in dead:
+            if self.on_dead:
+                try:
+                    self.on_dead(task)
+                except Exception as e:
+                    print(f"[TaskQueue] on_dead callback failed for task {task[TASK_ID]}: {e}")
+        return len(claimed)
+
+    def _claim(self, limit: int) -> Tuple[List[Dict], List[Dict], int]:
+        """
+        租用最多 limit 筆可見的任務（超過 max_attempts 的移到 dead_tasks）
+
+        Returns:
+            (租到的任務, 移到 dead_tasks 的任務, 租用後 db 中剩下的可見任務數)
+        """
+        now = time.time()
+        claimed = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, payload, enqueued_at, attempts FROM tasks "
+                    "WHERE visible_at <= ? ORDER BY id LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                dead = [row for row in rows if row[3] >= self.max_attempts]
+                live = [row for row in rows if row[3] < self.max_attempts]
+                if live:
+                    self._conn.executemany(
+                        "UPDATE tasks SET visible_at = ?, attempts = attempts + 1, lease = ? WHERE id = ?",
+                        [(now + self.visibility_timeout, self.owner, row[0]) for row in live],
+                    )
+                if dead:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO dead_tasks (id, payload, enqueued_at, attempts, died_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        [(row[0], row[1], row[2], row[3], now) for row in dead],
+                    )
+                    self._conn.executemany("DELETE FROM tasks WHERE id = ?", [(row[0],) for row in dead])
+                visible = self._conn.execute(
+                    "SELECT COUNT(*) FROM tasks WHERE visible_at <= ?", (now,)
+                ).fetchone()[0]
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        for row in dead:
+            print(f"[TaskQueue] Task {row[0]} failed {row[3]} times, moved to dead_tasks")
+        self.stats["dead"] += len(dead)
+
+        for task_id, payload, _, attempts in live:
+            task = json.loads(payload)
+            task[TASK_ID] = task_id
+            task[TASK_ATTEMPT] = attempts + 1
+            claimed.append(task)
+        dead_tasks = []
+        for task_id, payload, _, attempts in dead:
+            task = json.loads(payload)
+            task[TASK_ID] = task_id
+            task[TASK_ATTEMPT] = attempts
+            dead_tasks.append(task)
+        return claimed, dead_tasks, visible
+
+    # ---------- 狀態 / 關閉 ----------
+
+    def _count_visible(self) -> int:
+        """db 中可見的任務數（只在啟動時查一次，之後由記憶體計數維護）"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE visible_at <= ?", (time.time(),)
+            ).fetchone()[0]
+
+    def qsize(self) -> int:
+        """等待處理的任務數（buffer + 本地預取 + db 中可見的；不碰磁碟）"""
+        if self._closed:
+            return 0
+        return len(self._pending_puts) + len(self._prefetched) + self._visible
+
+    async def close(self):
+        """
+        本程序租用但沒做完的任務立即放回（下次啟動或其他程序接手），寫入 buffer 後關閉
+        放回的任務（預取 / 排程器暫存中 / 處理到一半）退還這次的交付次數，重啟不會讓它們變成 dead
+        """
+        if self._closed:
+            return
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+
+        released = list(self._prefetched) + list(self._in_flight.values())
+        self._prefetched.clear()
+        self._in_flight.clear()
+        self._lease_until.clear()
+        self._pending_releases.extend(self._release_entry(task) for task in released)
+        await self.flush()
+
+        self._closed = True
+        self._wakeup.set()
+        with self._lock:
+            self._conn.close()
+        if released:
+            print(f"[TaskQueue] Released {len(released)} unfinished tasks back to queue")
+
+    def get_stats(self) -> Dict:
+        """排隊 / 處理中 / 交付 / 重送 / dead 統計"""
+        flushes = self.stats["flushes"]
+        return {
+            **self.stats,
+            "queued": self.qsize(),
+            "prefetched": len(self._prefetched),
+            "in_flight": len(self._in_flight),
+            "avg_flush_ms": round(self.stats["total_flush_ms"] / flushes, 2) if flushes else None,
+            "max_put_us": round(self.stats["max_put_us"], 1),
+            "total_flush_ms": round(self.stats["total_flush_ms"], 1),
+        }
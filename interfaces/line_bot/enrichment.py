@@ -0,0 +1,138 @@
+"""
+Menu Enrichment - 搜尋後平行抓取前 K 家店家菜單
+在同一個 context 內開多個分頁（共用 cookies），以 semaphore 限制同時數量，
+整體有 deadline：逾時（或呼叫端被取消）就取消尚未完成的分頁，只用已抓到的菜單
+有 MenuStore 時，TTL 內的店家直接讀 SQLite，不開分頁；新抓的菜單寫回 store（SQLite 讀寫在 thread 執行）
+不傳 context、改傳 open_context 時，真的需要開分頁才借 context（菜單都在 store 就不佔用 pool）
+"""
+import asyncio
+import time
+from typing import AsyncContextManager, Callable, Dict, List, Optional, Tuple
+
+from agent.cache.menu_store import MenuStore
+from agent.scrapers.deadline import Deadline
+from agent.scrapers.ubereats.async_menu import AsyncUberEatsMenuScraper
+
+async def _scrape_one(context, url: str, slots: asyncio.Semaphore, menu_limit: int, budget: Deadline) -> Dict:
+    """開一個分頁抓單一店家，抓完關閉分頁"""
+    async with slots:
+        page = await context.new_page()
+        try:
+            return await AsyncUberEatsMenuScraper(page).scrape_store(url, menu_limit=menu_limit, deadline=budget)
+        finally:
+            try:
+                await page.close()
+            except Exception:
+                pass
+
+async def _scrape_missing(context, urls: List[str], concurrency: int, menu_limit: int,
+                          budget: Deadline, report: Dict) -> Tuple[set, Dict]:
+    """在 budget 內平行抓取 urls；回傳 (完成的 task, task -> url)，逾時的計入 report["timed_out"]"""
+    slots = asyncio.Semaphore(max(1, concurrency))
+    tasks = {
+        asyncio.create_task(_scrape_one(context, url, slots, menu_limit, budget)): url
+        for url in urls
+    }
+
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=budget.remaining())
+    finally:
+        # 逾時或呼叫端被取消（例如任務被新訊息取代）：取消還沒完成的分頁，
+        # 等它們把 page 關掉再歸還 context
+        unfinished = [task for task in tasks if not task.done()]
+        for task in unfinished:
+            task.cancel()
+        if unfinished:
+            await asyncio.gather(*unfinished, return_exceptions=True)
+    report["timed_out"] = len(pending)
+    return done, tasks
+
+def _save_all(menu_store: MenuStore, scraped: Dict[str, Dict]):
+    for url, store_info in scraped.items():
+        menu_store.save(url, store_info)
+
+async def enrich_with_menus(
+    context,
+    restaurants: List[Dict],
+    top_k: int = 5,
+    concurrency: int = 3,
+    deadline: float = 8.0,
+    menu_limit: int = 20,
+    menu_store: Optional[MenuStore] = None,
+    open_context: Optional[Callable[[], AsyncContextManager]] = None,
+) -> Dict:
+    """
+    平行抓取前 top_k 家店的菜單
+
+    Args:
+        context: 已載入 cookies 的 BrowserContext（通常是 pool lease 的 context；None 時用 open_context）
+        restaurants: 已排序的候選店家（取前 top_k 個有店家 URL 的）
+        top_k: 最多補充幾家
+        concurrency: 同時開幾個分頁
+        deadline: 整體秒數上限
+        menu_limit: 每家最多抓幾個菜單項目
+        menu_store: 店家菜單快取（可選）
+        open_context: 需要開分頁時才呼叫，回傳 async context manager（yield BrowserContext）；
+            等 context 的時間也算在 deadline 內
+
+    Returns:
+        {
+            'menu_data': {store_url: scrape_store 結果 / MenuStore 讀出的菜單},
+            'requested': int,
+            'from_store': int,
+            'completed': int,
+            'failed': int,
+            'timed_out': int,
+            'elapsed_ms': int,
+        }
+    """
+    urls = []
+    for restaurant in restaurants:
+        url = restaurant.get("url") or ""
+        if "/store/" in url and url not in urls:
+            urls.append(url)
+        if len(urls) >= top_k:
+            break
+
+    report = {
+        "menu_data": {},
+        "requested": len(urls),
+        "from_store": 0,
+        "completed": 0,
+        "failed": 0,
+        "timed_out": 0,
+        "elapsed_ms": 0,
+    }
+    started = time.monotonic()
+    if menu_store and urls:
+        fresh = await asyncio.to_thread(menu_store.get_fresh_many, urls)
+        report["menu_data"].update(fresh)
+        report["from_store"] = len(fresh)
+        urls = [url for url in urls if url not in fresh]
+    if not urls:
+        report["elapsed_ms"] = int((time.monotonic() - started) * 1000)
+        return report
+
+    # 分頁內的導航 / 等待也依整體 deadline 縮短，逾時前還來得及抽出部分菜單
+    budget = Deadline.after(deadline)
+    if context is None:
+        async with open_context() as leased:
+            done, tasks = await _scrape_missing(leased, urls, concurrency, menu_limit, budget, report)
+    else:
+        done, tasks = await _scrape_missing(context, urls, concurrency, menu_limit, budget, report)
+
+    scraped = {}
+    for task in done:
+        url = tasks[task]
+        if task.exception():
+            report["failed"] += 1
+            print(f"[Enrich] Failed {url}: {task.exception()}")
+            continue
+        scraped[url] = task.result()
+    report["menu_data"].update(scraped)
+    report["completed"] = len(scraped)
+    if menu_store and scraped:
+        await asyncio.to_thread(_save_all, menu_store, scraped)
+
+    report["elapsed_ms"] = int((time.monotonic() - started) * 1000)
+    return report
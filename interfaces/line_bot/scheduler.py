@@ -0,0 +1,294 @@
+"""
+Fair Scheduler - 任務 Queue 與 consumer 之間的公平排程
+- 每個用戶一條佇列，各 lane 內依用戶 round-robin 輪流取（一個用戶連發十則不會卡住其他人）
+- 每個用戶同時處理中的任務數有上限
+- 兩條 lane：fast（可由搜尋快取回答）優先；slow（需要開瀏覽器）最多佔用 slow_slots 個 consumer，
+  保留 consumer 給 fast lane，快取命中的任務不必排在 10-20 秒的爬取後面
+- fast lane 連續取 fast_burst 個後，若有 slow 任務可跑就讓一個（避免 slow lane 餓死）
+- supersede：同一用戶的新訊息進來時，丟掉他還在排隊的舊任務、取消處理中的舊任務
+  （on_superseded 通知 consumer 取消），以各 lane 平均處理時間估算省下的 browser 秒數
+
+任務仍由 DurableTaskQueue 保存：排程器把已租用的任務暫存在記憶體排序（最多 max_buffered 個），
+暫存中（含磁碟 Queue 本地預取）的任務租約剩不到一半就延長，不會被重複交付；程序重啟時由磁碟 Queue 重新交付
+"""
+import asyncio
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from interfaces.line_bot.durable_queue import DurableTaskQueue, TASK_ID
+
+LANES = ("fast", "slow")
+
+class FairScheduler:
+    """per-user round-robin + fast / slow lane"""
+
+    def __init__(
+        self,
+        source: DurableTaskQueue,
+        classify: Callable[[Dict], str],
+        per_user_limit: int = 1,
+        slow_slots: int = 3,
+        consumers: Optional[int] = None,
+        fast_burst: int = 4,
+        max_buffered: int = 1000,
+        supersede: bool = True,
+        on_superseded: Optional[Callable[[Dict], None]] = None,
+    ):
+        """
+        Args:
+            source: 任務來源（磁碟 Queue）
+            classify: task -> "fast" / "slow"
+            per_user_limit: 每個用戶同時處理中的任務上限
+            slow_slots: slow 任務同時最多佔用幾個 consumer
+            consumers: consumer 總數（估計 fast lane 等待時間用，預設 slow_slots + 1）
+            fast_burst: fast lane 連續取幾個後讓 slow lane 一次
+            max_buffered: 記憶體中最多暫存幾個等待中的任務（記憶體上限，需遠大於單一用戶可能連發的數量）
+            supersede: 新訊息是否取代同一用戶較舊的任務
+            on_superseded: 處理中的任務被取代時呼叫（consumer 負責取消）
+        """
+        self.source = source
+        self.classify = classify
+        self.per_user_limit = max(1, per_user_limit)
+        self.slow_slots = max(1, slow_slots)
+        self.consumers = max(self.slow_slots, consumers or self.slow_slots + 1)
+        self.fast_burst = max(1, fast_burst)
+        self.max_buffered = max(1, max_buffered)
+        self.supersede = supersede
+        self.on_superseded = on_superseded
+
+        # lane -> user_id -> 該用戶等待中的任務（OrderedDict 順序即 round-robin 順序）
+        self._lanes: Dict[str, "OrderedDict[str, Deque[Dict]]"] = {lane: OrderedDict() for lane in LANES}
+        self._buffered = 0
+        self._running = Counter()  # user_id -> 處理中任務數
+        self._running_slow = 0
+        self._fast_streak = 0
+        self._meta: Dict[int, tuple] = {}  # task id -> (lane, 進入排程 / 開始處理的時間)
+        self._dispatched: Dict[int, Dict] = {}  # task id -> 處理中的任務
+        self._latest: Dict[str, int] = {}  # user_id -> 最新任務 id（id 遞增 = 訊息先後）
+        self._durations: Dict[str, Optional[float]] = {lane: None for lane in LANES}  # 各 lane 處理秒數 EWMA
+        self._cond = asyncio.Condition()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._pump_task: Optional[asyncio.Task] = None
+        self._renew_task: Optional[asyncio.Task] = None
+
+        self.stats = {
+            "scheduled": {lane: 0 for lane in LANES},
+            "dispatched": {lane: 0 for lane in LANES},
+            "lease_extensions": 0,
+            "superseded_queued": 0,
+            "superseded_running": 0,
+            "browser_seconds_saved": 0.0,
+        }
+        self._waits = {lane: deque(maxlen=500) for lane in LANES}  # 最近的排隊秒數（算 p95）
+
+    def start(self) -> asyncio.Task:
+        """開始從磁碟 Queue 取任務（另開一個 task 定期延長暫存任務的租約）"""
+        self._pump_task = asyncio.create_task(self._pump())
+        self._renew_task = asyncio.create_task(self._renew_leases())
+        return self._pump_task
+
+    async def _pump(self):
+        while True:
+            await self._space.wait()
+            await self._add(await self.source.get())
+
+    async def _add(self, task: Dict):
+        try:
+            lane = self.classify(task)
+        except Exception as e:
+            print(f"[Scheduler] Classify failed, using slow lane: {e}")
+            lane = "slow"
+        lane = lane if lane in self._lanes else "slow"
+
+        async with self._cond:
+            if self.supersede and self._supersede_older(task, lane):
+                return
+            self._lanes[lane].setdefault(task["user_id"], deque()).append(task)
+            self._meta[task[TASK_ID]] = (lane, time.monotonic())
+            self._buffered += 1
+            if self._buffered >= self.max_buffered:
+                self._space.clear()
+            self.stats["scheduled"][lane] += 1
+            self._cond.notify_all()
+
+    async def _renew_leases(self):
+        """
+        每 visibility_timeout / 4 檢查一次：暫存中與磁碟 Queue 本地預取的任務，
+        租約剩不到一半就延長（依各租約的到期時間，不是進入排程的時間）
+        """
+        vt = self.source.visibility_timeout
+        while True:
+            await asyncio.sleep(vt / 4)
+            waiting = [task for users in self._lanes.values() for tasks in users.values() for task in tasks]
+            try:
+                self.stats["lease_extensions"] += await self.source.extend_expiring(waiting, within=vt / 2)
+            except Exception as e:
+                print(f"[Scheduler] Lease extension failed: {e}")
+
+    def _supersede_older(self, task: Dict, lane: str) -> bool:
+        """
+        新任務進來：丟掉同一用戶排隊中的舊任務、通知取消處理中的舊任務
+        若這個任務本身比已知的更舊（例如重啟後重新交付），直接丟掉並回傳 True
+        """
+        user_id = task["user_id"]
+        task_id = task[TASK_ID]
+        if task_id < self._latest.get(user_id, 0):
+            self._drop(task, lane)
+            return True
+        self._latest[user_id] = task_id
+
+        for waiting_lane, users in self._lanes.items():
+            for old in users.pop(user_id, ()):
+                self._buffered -= 1
+                self._drop(old, waiting_lane)
+        self._space.set()
+
+        for running_id, running in self._dispatched.items():
+            if running["user_id"] == user_id and running_id < task_id and not running.get("_superseded"):
+                running["_superseded"] = True
+                print(f"[Scheduler] Task {running_id} superseded by {task_id}, cancelling")
+                if self.on_superseded:
+                    self.on_superseded(running)
+        return False
+
+    def _drop(self, task: Dict, lane: str):
+        """丟掉排隊中被取代的任務（不會再處理，直接 ack）"""
+        self._meta.pop(task[TASK_ID], None)
+        self.source.ack(task)
+        self.stats["superseded_queued"] += 1
+        if lane == "slow":
+            self.stats["browser_seconds_saved"] += self._durations["slow"] or 0.0
+
+    def _pick_from(self, lane: str) -> Optional[Dict]:
+        """lane 內依 round-robin 取第一個未達上限的用戶的任務"""
+        users = self._lanes[lane]
+        for user_id in list(users):
+            if self._running[user_id] >= self.per_user_limit:
+                continue
+            tasks = users[user_id]
+            task = tasks.popleft()
+            if tasks:
+                users.move_to_end(user_id)
+            else:
+                del users[user_id]
+            return task
+        return None
+
+    def _pick(self) -> Optional[Dict]:
+        slow_allowed = self._running_slow < self.slow_slots
+        if slow_allowed and self._fast_streak >= self.fast_burst:
+            task = self._pick_from("slow")
+            if task:
+                return task
+        task = self._pick_from("fast")
+        if task:
+            return task
+        return self._pick_from("slow") if slow_allowed else None
+
+    async def get(self) -> Dict:
+        """取得下一個要處理的任務（consumer 呼叫；處理完要呼叫 done）"""
+        async with self._cond:
+            while True:
+                task = self._pick()
+                if task:
+                    break
+                await self._cond.wait()
+
+            lane, queued_at = self._meta[task[TASK_ID]]
+            self._buffered -= 1
+            self._space.set()
+            self._running[task["user_id"]] += 1
+            if lane == "slow":
+                self._running_slow += 1
+                self._fast_streak = 0
+            else:
+                self._fast_streak += 1
+            self.stats["dispatched"][lane] += 1
+            now = time.monotonic()
+            self._waits[lane].append(now - queued_at)
+            self._meta[task[TASK_ID]] = (lane, now)
+            self._dispatched[task[TASK_ID]] = task
+            task["_lane"] = lane
+            return task
+
+    async def done(self, task: Dict):
+        """任務結束（成功、失敗或取消），釋放該用戶與 lane 的名額"""
+        lane, started = self._meta.pop(task[TASK_ID], ("slow", time.monotonic()))
+        self._dispatched.pop(task[TASK_ID], None)
+        elapsed = time.monotonic() - started
+
+        if task.get("_superseded"):
+            self.stats["superseded_running"] += 1
+            if lane == "slow" and self._durations["slow"] is not None:
+                self.stats["browser_seconds_saved"] += max(0.0, self._durations["slow"] - elapsed)
+        else:
+            previous = self._durations[lane]
+            self._durations[lane] = elapsed if previous is None else 0.8 * previous + 0.2 * elapsed
+
+        async with self._cond:
+            user_id = task["user_id"]
+            self._running[user_id] -= 1
+            if self._running[user_id] <= 0:
+                del self._running[user_id]
+                if not any(user_id in users for users in self._lanes.values()):
+                    self._latest.pop(user_id, None)
+            if lane == "slow":
+                self._running_slow -= 1
+            self._cond.notify_all()
+
+    def lane_load(self, lane: str) -> Tuple[int, int, int]:
+        """(該 lane 等待中的任務數, 處理中的任務數, 可同時處理數)（admission control 估計等待時間用）"""
+        waiting = sum(len(tasks) for tasks in self._lanes[lane].values())
+        if lane == "slow":
+            return waiting, self._running_slow, self.slow_slots
+        return waiting, sum(self._running.values()) - self._running_slow, self.consumers
+
+    def pending(self) -> int:
+        """排程器中等待的任務數"""
+        return self._buffered
+
+    async def close(self):
+        """停止取任務；暫存中的任務由 DurableTaskQueue.close 放回磁碟"""
+        tasks = [task for task in (self._pump_task, self._renew_task) if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    def _percentile(values, pct: float) -> Optional[float]:
+        if not values:
+            return None
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+    def get_stats(self) -> Dict:
+        """各 lane 排隊 / 分派數與排隊時間（avg / p95，毫秒）"""
+        lanes = {}
+        for lane in LANES:
+            waits = self._waits[lane]
+            p95 = self._percentile(waits, 0.95)
+            lanes[lane] = {
+                "waiting": sum(len(tasks) for tasks in self._lanes[lane].values()),
+                "users_waiting": len(self._lanes[lane]),
+                "scheduled": self.stats["scheduled"][lane],
+                "dispatched": self.stats["dispatched"][lane],
+                "avg_wait_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else None,
+                "p95_wait_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            }
+        return {
+            "lanes": lanes,
+            "running_users": len(self._running),
+            "running_slow": self._running_slow,
+            "slow_slots": self.slow_slots,
+            "per_user_limit": self.per_user_limit,
+            "lease_extensions": self.stats["lease_extensions"],
+            "superseded_queued": self.stats["superseded_queued"],
+            "superseded_running": self.stats["superseded_running"],
+            "browser_seconds_saved": round(self.stats["browser_seconds_saved"], 1),
+            "avg_service_seconds": {
+                lane: round(value, 2) if value is not None else None
+                for lane, value in self._durations.items()
+            },
+        }
@@ -0,0 +1,357 @@
+"""
+Scraper Sharding - 多程序分片
+M 個子程序各自執行一個 event loop + async Playwright browser（含自己的 context pool / 快取），
+webhook 程序透過 multiprocessing Queue 分派任務；以 consistent hash 依正規化查詢選分片，
+相同查詢固定落在同一個分片，命中該分片的搜尋快取與 single-flight
+"""
+import asyncio
+import bisect
+import hashlib
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from agent.planner.intent_parser import IntentParser
+from agent.cache.search_cache import SearchCache
+from agent.scrapers.deadline import Deadline
+
+class HashRing:
+    """Consistent hash ring（每個節點 vnodes 個虛擬節點）"""
+
+    def __init__(self, nodes: List[int], vnodes: int = 64):
+        self._ring = sorted(
+            (self._hash(f"{node}#{i}"), node)
+            for node in nodes
+            for i in range(vnodes)
+        )
+        self._keys = [h for h, _ in self._ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.sha1(value.encode("utf-8")).digest()[:8], "big")
+
+    def node_for(self, key: str) -> int:
+        """key 順時針遇到的第一個虛擬節點"""
+        idx = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._ring[idx][1]
+
+def routing_key(search_query: str, location: str) -> str:
+    """分片路由 key：和 search cache 相同的正規化查詢 + 地點"""
+    query, location = SearchCache.make_key(search_query, location)
+    return f"{location}|{query}"
+
+# 等待 stale 更正的任務最多保留幾筆（更正不一定會來）
+MAX_PENDING_UPDATES = 1000
+
+# ---------- 子程序 ----------
+
+def _shard_main(shard_id: int, requests, responses, concurrency: int):
+    """分片子程序進入點（spawn）"""
+    try:
+        asyncio.run(_shard_loop(shard_id, requests, responses, concurrency))
+    except KeyboardInterrupt:
+        pass
+
+async def _shard_loop(shard_id: int, requests, responses, concurrency: int):
+    # 子程序內才載入 worker_v2：每個分片有自己的 browser / pool / 快取（module 全域變數）
+    from interfaces.line_bot import worker_v2
+
+    await worker_v2.init_local_browser()
+    responses.put(("ready", shard_id, None, None))
+    print(f"[Shard-{shard_id}] Ready")
+
+    slots = asyncio.Semaphore(max(1, concurrency))
+    tasks: Dict[int, asyncio.Task] = {}  # req_id -> 處理中的任務
+
+    async def handle(req_id: int, kind: str, payload):
+        if kind == "stats":
+            # 統計不佔處理名額，搜尋塞滿時 /health 也拿得到
+            responses.put(("result", shard_id, req_id, {
+                "context_pool": worker_v2.get_pool_stats(),
+                "browser": worker_v2.get_browser_stats(),
+                "workers": worker_v2.get_worker_stats(),
+            }))
+            return
+        async with slots:
+            try:
+                if kind == "search":
+                    async def on_update(updated):
+                        responses.put(("update", shard_id, req_id, updated))
+                    user_message, cache_only, expires_at = payload
+                    result = await worker_v2.search_and_recommend(
+                        user_message, on_update=on_update, cache_only=cache_only,
+                        deadline=Deadline.from_epoch(expires_at),
+                    )
+                elif kind == "warm":
+                    result = await worker_v2.warm_search(payload)
+                else:
+                    raise ValueError(f"Unknown request kind: {kind}")
+                responses.put(("result", shard_id, req_id, result))
+            except Exception as e:
+                responses.put(("error", shard_id, req_id, f"{type(e).__name__}: {e}"))
+
+    while True:
+        message = await asyncio.to_thread(requests.get)
+        if message is None:
+            break
+        req_id, kind, payload = message
+        if kind == "cancel":
+            # webhook 端取消（任務被新訊息取代）：取消後 context 在 lease 結束時淘汰
+            task = tasks.get(req_id)
+            if task:
+                task.cancel()
+            continue
+        task = asyncio.create_task(handle(req_id, kind, payload))
+        tasks[req_id] = task
+        task.add_done_callback(lambda _, req_id=req_id: tasks.pop(req_id, None))
+
+    # 收到停止訊號：處理完已收到的任務再關閉 browser
+    if tasks:
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+    await worker_v2.close_local_browser()
+    print(f"[Shard-{shard_id}] Stopped")
+
+# ---------- webhook 程序端 ----------
+
+class ShardedSearchClient:
+    """分派搜尋任務到分片子程序（在 webhook 程序的 event loop 使用）"""
+
+    def __init__(
+        self,
+        num_shards: int,
+        concurrency: int = 4,
+        vnodes: int = 64,
+        location: str = "default",
+        start_timeout: float = 120,
+    ):
+        """
+        Args:
+            num_shards: 子程序數
+            concurrency: 每個分片同時處理幾個任務（通常 = CONTEXT_POOL_MAX_SIZE）
+            vnodes: consistent hash 虛擬節點數
+            location: 外送地點（路由 key 的一部分，與 search cache 一致）
+            start_timeout: 等所有分片 browser 啟動完成的秒數
+        """
+        self.num_shards = num_shards
+        self.concurrency = concurrency
+        self.location = location
+        self.start_timeout = start_timeout
+        self.ring = HashRing(list(range(num_shards)), vnodes=vnodes)
+
+        self._mp = multiprocessing.get_context("spawn")
+        self._responses = self._mp.Queue()
+        self._requests: List = []
+        self._processes: List = []
+        self._ready: Dict[int, asyncio.Future] = {}
+        self._pending: Dict[int, tuple] = {}  # req_id -> (shard_id, future, on_update)
+        self._updates: "OrderedDict[int, tuple]" = OrderedDict()  # 回了 stale 結果、可能還會收到更正的任務
+        self._update_tasks = set()  # 執行中的 on_update（保留參照，避免還沒跑完就被 GC）
+        self._ids = itertools.count(1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reader: Optional[threading.Thread] = None
+        self._stopping = False
+        self._shard_stats = [
+            {"dispatched": 0, "completed": 0, "failed": 0, "cancelled": 0, "restarts": 0, "busy_seconds": 0.0}
+            for _ in range(num_shards)
+        ]
+        self._started_at: Dict[int, float] = {}
+
+    def _spawn(self, shard_id: int):
+        requests = self._mp.Queue()
+        process = self._mp.Process(
+            target=_shard_main,
+            args=(shard_id, requests, self._responses, self.concurrency),
+            name=f"scraper-shard-{shard_id}",
+            daemon=True,
+        )
+        process.start()
+        self._ready[shard_id] = self._loop.create_future()
+        if shard_id < len(self._processes):
+            self._requests[shard_id] = requests
+            self._processes[shard_id] = process
+        else:
+            self._requests.append(requests)
+            self._processes.append(process)
+
+    async def start(self):
+        """啟動所有分片，等 browser 都準備好"""
+        self._loop = asyncio.get_running_loop()
+        for shard_id in range(self.num_shards):
+            self._spawn(shard_id)
+
+        self._reader = threading.Thread(target=self._read_responses, name="shard-responses", daemon=True)
+        self._reader.start()
+
+        await asyncio.wait_for(asyncio.gather(*self._ready.values()), timeout=self.start_timeout)
+        print(f"[Shards] {self.num_shards} shards ready")
+
+    def _read_responses(self):
+        """背景 thread：讀取子程序回應，轉交給 event loop；順便檢查子程序是否還活著"""
+        last_check = time.monotonic()
+        while not self._stopping:
+            try:
+                message = self._responses.get(timeout=1)
+                self._loop.call_soon_threadsafe(self._dispatch, message)
+            except queue.Empty:
+                pass
+            except (EOFError, OSError):
+                break
+            if time.monotonic() - last_check >= 1:
+                last_check = time.monotonic()
+                self._loop.call_soon_threadsafe(self._check_processes)
+
+    def _dispatch(self, message):
+        kind, shard_id, req_id, payload = message
+        if kind == "ready":
+            future = self._ready.get(shard_id)
+            if future and not future.done():
+                future.set_result(True)
+            return
+
+        if kind == "update":
+            entry = self._pending.get(req_id) or self._updates.pop(req_id, None)
+            if entry and entry[2]:
+                task = asyncio.create_task(entry[2](payload))
+                self._update_tasks.add(task)
+                task.add_done_callback(self._update_done)
+            return
+
+        entry = self._pending.pop(req_id, None)
+        if not entry:
+            return
+        _, future, on_update = entry
+        if req_id in self._started_at:
+            # 統計查詢（shard_stats）不計入分派 / 完成次數
+            stats = self._shard_stats[shard_id]
+            stats["busy_seconds"] += time.monotonic() - self._started_at.pop(req_id)
+            stats["completed" if kind == "result" else "failed"] += 1
+        if kind == "result":
+            if on_update and isinstance(payload, dict) and payload.get("strategy") == "stale_cache":
+                # 背景更新（stale-while-revalidate）的更正會在結果之後才送達
+                self._updates[req_id] = entry
+                while len(self._updates) > MAX_PENDING_UPDATES:
+                    self._updates.popitem(last=False)
+            if not future.done():
+                future.set_result(payload)
+        else:
+            if not future.done():
+                future.set_exception(RuntimeError(f"Shard {shard_id}: {payload}"))
+
+    def _check_processes(self):
+        """子程序崩潰：讓它手上的任務失敗，並重新啟動該分片"""
+        if self._stopping:
+            return
+        for shard_id, process in enumerate(self._processes):
+            if process.is_alive():
+                continue
+            print(f"[Shards] Shard {shard_id} died (exit code {process.exitcode}), restarting...")
+            for req_id, (owner, future, _) in list(self._pending.items()):
+                if owner == shard_id:
+                    del self._pending[req_id]
+                    if self._started_at.pop(req_id, None) is not None:
+                        self._shard_stats[shard_id]["failed"] += 1
+                    if not future.done():
+                        future.set_exception(RuntimeError(f"Shard {shard_id} crashed"))
+            self._shard_stats[shard_id]["restarts"] += 1
+            self._spawn(shard_id)
+
+    def shard_for(self, search_query: str) -> int:
+        """負責該查詢的分片"""
+        return self.ring.node_for(routing_key(search_query, self.location))
+
+    async def _call(self, shard_id: int, kind: str, payload, on_update=None, track: bool = True):
+        req_id = next(self._ids)
+        future = self._loop.create_future()
+        self._pending[req_id] = (shard_id, future, on_update)
+        if track:
+            self._started_at[req_id] = time.monotonic()
+            self._shard_stats[shard_id]["dispatched"] += 1
+        self._requests[shard_id].put((req_id, kind, payload))
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # 呼叫端取消：通知分片一起取消，不讓它繼續佔用 browser
+            if self._pending.pop(req_id, None) is not None:
+                if self._started_at.pop(req_id, None) is not None:
+                    self._shard_stats[shard_id]["cancelled"] += 1
+                self._requests[shard_id].put((req_id, "cancel", None))
+            raise
+
+    async def search(
+        self,
+        user_message: str,
+        on_update: Optional[Callable[[dict], Awaitable[None]]] = None,
+        shard_id: Optional[int] = None,
+        cache_only: bool = False,
+        deadline: Optional[Deadline] = None,
+    ) -> dict:
+        """
+        在分片上執行 search_and_recommend
+
+        Args:
+            shard_id: 指定分片（預設依查詢 consistent hash）
+            cache_only: 只用快取回答（過載降級）
+            deadline: 任務時間預算（以 epoch 秒傳給分片）
+        """
+        if shard_id is None:
+            parser = IntentParser()
+            shard_id = self.shard_for(parser.to_search_query(parser.parse(user_message)))
+        return await self._call(shard_id, "search", (user_message, cache_only, deadline.expires_at if deadline else None), on_update)
+
+    async def warm(self, search_query: str) -> bool:
+        """在負責該查詢的分片上預熱（cache warmer 用）"""
+        return await self._call(self.shard_for(search_query), "warm", search_query)
+
+    async def shard_stats(self, timeout: float = 2.0) -> List[Dict]:
+        """各分片內部統計（pool / browser / 快取；/health 用，逾時或失敗的分片回傳 error）"""
+        async def one(shard_id: int) -> Dict:
+            try:
+                return await asyncio.wait_for(self._call(shard_id, "stats", None, track=False), timeout)
+            except Exception as e:
+                return {"error": f"{type(e).__name__}: {e}"}
+
+        return await asyncio.gather(*(one(shard_id) for shard_id in range(self.num_shards)))
+
+    def _update_done(self, task: asyncio.Task):
+        self._update_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            print(f"[Shards] on_update callback failed: {task.exception()}")
+
+    async def close(self, timeout: float = 30):
+        """送出停止訊號，等子程序處理完手上的任務後結束（並等推送中的更正送完）"""
+        self._stopping = True
+        for requests in self._requests:
+            requests.put(None)
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            await asyncio.to_thread(process.join, max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+        for req_id, (_, future, _) in list(self._pending.items()):
+            if not future.done():
+                future.set_exception(RuntimeError("Shards stopped"))
+        self._pending.clear()
+        if self._update_tasks:
+            await asyncio.gather(*self._update_tasks, return_exceptions=True)
+        print("[Shards] All shards stopped")
+
+    def get_stats(self) -> Dict:
+        """各分片分派 / 完成 / 失敗 / 取消次數與存活狀態"""
+        in_flight = [0] * self.num_shards
+        for shard_id, _, _ in self._pending.values():
+            in_flight[shard_id] += 1
+        return {
+            "shards": [
+                {
+                    **stats,
+                    "busy_seconds": round(stats["busy_seconds"], 1),
+                    "in_flight": in_flight[shard_id],
+                    "alive": shard_id < len(self._processes) and self._processes[shard_id].is_alive(),
+                }
+                for shard_id, stats in enumerate(self._shard_stats)
+            ],
+        }
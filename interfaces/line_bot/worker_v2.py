@@ -3,7 +3,12 @@ Background Worker V2 - 使用 storage_state 取代 persistent_context
 使用 async Playwright + storage_state，完全相容 FastAPI
 """
 import asyncio
+import copy
 import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime
 from linebot import LineBotApi
 from linebot.models import TextSendMessage
 from playwright.async_api import async_playwright, Browser
@@ -12,38 +17,200 @@ from playwright.async_api import async_playwright, Browser
 from agent.planner.intent_parser import IntentParser
 from agent.planner.scorer import ScoringEngine
 from agent.planner.recommender import RecommendationGenerator
+from agent.cache.search_cache import SearchCache
+from agent.cache.menu_store import MenuStore
+from agent.cache.single_flight import SingleFlight
+from agent.scrapers.resource_blocking import BlockingProfile
+from agent.scrapers.deadline import Deadline
+from agent.scrapers.recording import fixture_name
+from agent.scrapers.ubereats.async_search import AsyncUberEatsSearcher
 from interfaces.line_bot.flex_messages import create_recommendations_flex
+from interfaces.line_bot.context_pool import ContextPool
+from interfaces.line_bot.browser_supervisor import BrowserSupervisor
+from interfaces.line_bot.sharding import ShardedSearchClient
+from interfaces.line_bot.enrichment import enrich_with_menus
+from interfaces.line_bot.cache_warmer import CacheWarmer, QueryHistory, meal_type_at
+from interfaces.line_bot.durable_queue import DurableTaskQueue, TASK_ID, TASK_RELEASES
+from interfaces.line_bot.scheduler import FairScheduler
+from interfaces.line_bot.admission import Admission, AdmissionController, ServiceTimeEstimator
+from interfaces.line_bot.config import (
+    AUTH_STATE_PATH,
+    CONTEXT_POOL_MIN_SIZE,
+    CONTEXT_POOL_MAX_SIZE,
+    CONTEXT_POOL_MAX_USES,
+    CONTEXT_POOL_MAX_AGE,
+    WORKER_CONCURRENCY,
+    WORKER_DRAIN_TIMEOUT,
+    BLOCK_RESOURCES,
+    USE_API_CAPTURE,
+    SCRAPER_RECORD_DIR,
+    SCRAPER_REPLAY_DIR,
+    ENRICH_TOP_K,
+    ENRICH_CONCURRENCY,
+    ENRICH_DEADLINE,
+    ENRICH_MENU_LIMIT,
+    SEARCH_CACHE_TTL,
+    SEARCH_CACHE_MAX_ENTRIES,
+    SEARCH_CACHE_STALE_TTL,
+    SWR_PUSH_CORRECTIONS,
+    DELIVERY_LOCATION,
+    MENU_STORE_PATH,
+    MENU_STORE_TTL,
+    CACHE_WARM_TOP_N,
+    CACHE_WARM_LEAD,
+    CACHE_WARM_HISTORY_PATH,
+    CACHE_WARM_HISTORY_MAX,
+    BROWSER_MAX_CONTEXTS,
+    BROWSER_MAX_RSS_MB,
+    BROWSER_MAX_ERROR_RATE,
+    BROWSER_HEALTH_INTERVAL,
+    BROWSER_DRAIN_TIMEOUT,
+    SCRAPER_SHARDS,
+    SHARD_VNODES,
+    TASK_QUEUE_PATH,
+    TASK_QUEUE_VISIBILITY_TIMEOUT,
+    TASK_QUEUE_MAX_ATTEMPTS,
+    TASK_QUEUE_BATCH_MS,
+    SCHED_PER_USER_LIMIT,
+    SCHED_SLOW_SLOTS,
+    SCHED_FAST_BURST,
+    SUPERSEDE_OLDER_TASKS,
+    ADMISSION_SHED_WAIT,
+    ADMISSION_MAX_QUEUED,
+    TASK_DEADLINE,
+    PUSH_RESERVE,
+    TASK_REDELIVERY_DEADLINE,
+)
 
-# 配置
-AUTH_STATE_PATH = os.path.join(os.path.dirname(__file__), "../../auth_state.json")
+MAX_CARDS = 15  # 每次搜尋最多抓幾家
+MIN_SCRAPE_BUDGET = 3.0  # 剩餘預算少於此秒數就不開瀏覽器，盡力用快取回答
+RANK_RESERVE = 0.5  # 菜單補充結束後保留給評分 / 產生推薦的秒數
+HOME_URL = "https://www.ubereats.com/tw"  # 卡片沒有有效店家連結時的預設 URL（Flex 按鈕需要 https）
 
 # 全域 Queue 和 Browser
-task_queue = asyncio.Queue()
-global_browser: Browser = None
+task_queue: DurableTaskQueue = None  # 寫入磁碟，重啟後未完成的任務會重新交付（start_workers 時開啟，分片子程序不開）
+scheduler: FairScheduler = None  # 從 task_queue 取任務，依用戶輪流 + fast / slow lane 分派給 consumer
+active_jobs = {}  # task id -> 處理中的 asyncio.Task（被新訊息取代時取消）
+service_times = ServiceTimeEstimator()  # 各階段（快取回答 / 開瀏覽器搜尋 / 推送）處理秒數 EWMA
+admission = AdmissionController(service_times, shed_wait=ADMISSION_SHED_WAIT, max_queued=ADMISSION_MAX_QUEUED)
 global_playwright = None
+browser_supervisor: BrowserSupervisor = None  # 持有目前的全域 browser，超標 / 崩潰時自動換新
+shard_client: ShardedSearchClient = None  # SCRAPER_SHARDS > 0 時，搜尋交給分片子程序
+context_pool: ContextPool = None
+context_slots: asyncio.Semaphore = None  # 同時存活 context 上限
+menu_store: MenuStore = None  # 店家菜單 SQLite 快取
+worker_stats = {}  # worker_id -> 統計
+navigation_stats = {"direct_url": 0, "search_box": 0, "direct_url_failed": 0}  # 各導航策略次數（direct_url_failed：失敗且沒時間 fallback）
+extraction_stats = {"api": 0, "dom": 0}  # 結果來源：feed API / DOM 解析
+search_cache = SearchCache(
+    ttl=SEARCH_CACHE_TTL,
+    max_entries=SEARCH_CACHE_MAX_ENTRIES,
+    stale_ttl=SEARCH_CACHE_STALE_TTL,
+)
+revalidation_tasks = set()  # 背景更新中的 stale 快取
+notify_tasks = set()  # 推送中的 dead task 通知
+search_flight = SingleFlight()  # 合併同時進行中的相同查詢
+query_history = QueryHistory(CACHE_WARM_HISTORY_PATH, max_queries=CACHE_WARM_HISTORY_MAX)  # 各餐別查詢次數（預熱用）
+cache_warmer: CacheWarmer = None
+recent_searches: "OrderedDict[tuple, float]" = OrderedDict()  # 分片模式：最近實際抓過的查詢（本程序看不到分片的快取）
+deadline_stats = {  # 預算用完：整體逾時 / 部分結果 / 改用快取 / 取出時已逾時（重啟延誤重新給預算 / 排隊太久只用快取）
+    "timed_out": 0, "partial": 0, "degraded": 0, "renewed": 0, "expired_in_queue": 0,
+}
+enrichment_stats = {"runs": 0, "stores": 0, "from_store": 0, "failed": 0, "timed_out": 0, "total_ms": 0}  # 菜單補充
 
 async def init_browser():
-    """初始化全域 browser（app 啟動時調用一次）"""
-    global global_browser, global_playwright
+    """
+    app 啟動時調用一次
+    SCRAPER_SHARDS > 0：啟動分片子程序（各自有 browser），本程序不開 browser
+    否則：在本程序初始化 browser + context pool
+    """
+    global shard_client
+    
+    if SCRAPER_SHARDS > 0:
+        print(f"[Browser] Starting {SCRAPER_SHARDS} scraper shards...")
+        shard_client = ShardedSearchClient(
+            SCRAPER_SHARDS,
+            concurrency=CONTEXT_POOL_MAX_SIZE,
+            vnodes=SHARD_VNODES,
+            location=DELIVERY_LOCATION,
+        )
+        await shard_client.start()
+        return
+    
+    await init_local_browser()
+
+async def close_browser():
+    """app 關閉時調用：停止分片子程序，或關閉本程序的 browser"""
+    global shard_client
+    
+    if shard_client:
+        await shard_client.close()
+        shard_client = None
+        return
+    
+    await close_local_browser()
+
+async def init_local_browser():
+    """初始化本程序的全域 browser + context pool（單程序模式 / 分片子程序）"""
+    global global_playwright, browser_supervisor, context_pool, context_slots, menu_store
     
     print("[Browser] Initializing global browser...")
     
     global_playwright = await async_playwright().start()
-    global_browser = await global_playwright.chromium.launch(
-        headless=True,
-        args=['--disable-blink-features=AutomationControlled']
+    
+    async def launch_browser() -> Browser:
+        return await global_playwright.chromium.launch(
+            headless=True,
+            args=['--disable-blink-features=AutomationControlled']
+        )
+    
+    browser_supervisor = BrowserSupervisor(
+        launch_browser,
+        max_contexts=BROWSER_MAX_CONTEXTS,
+        max_rss_mb=BROWSER_MAX_RSS_MB,
+        max_error_rate=BROWSER_MAX_ERROR_RATE,
+        check_interval=BROWSER_HEALTH_INTERVAL,
+        drain_timeout=BROWSER_DRAIN_TIMEOUT,
     )
+    browser = await browser_supervisor.start()
     
     print("[Browser] Global browser initialized")
+    
+    menu_store = MenuStore(MENU_STORE_PATH, ttl=MENU_STORE_TTL)
+    print(f"[Browser] Menu store: {MENU_STORE_PATH} {menu_store.get_stats()}")
+    
+    context_slots = asyncio.Semaphore(CONTEXT_POOL_MAX_SIZE)
+    context_pool = ContextPool(
+        browser,
+        AUTH_STATE_PATH,
+        min_size=CONTEXT_POOL_MIN_SIZE,
+        max_size=CONTEXT_POOL_MAX_SIZE,
+        max_uses=CONTEXT_POOL_MAX_USES,
+        max_age=CONTEXT_POOL_MAX_AGE,
+        blocking_profile=BlockingProfile() if BLOCK_RESOURCES else None,
+        record_dir=SCRAPER_RECORD_DIR,
+        replay_dir=SCRAPER_REPLAY_DIR,
+    )
+    await context_pool.start()
+    browser_supervisor.attach_pool(context_pool)
 
-async def close_browser():
-    """關閉全域 browser（app 關閉時調用）"""
-    global global_browser, global_playwright
+async def close_local_browser():
+    """關閉本程序的 context pool + 全域 browser"""
+    global global_playwright, browser_supervisor, context_pool, menu_store
     
-    if global_browser:
-        print("[Browser] Closing global browser...")
-        await global_browser.close()
-        global_browser = None
+    if context_pool:
+        print(f"[Browser] Context pool stats: {context_pool.get_stats()}")
+        await context_pool.close()
+        context_pool = None
+    
+    if menu_store:
+        menu_store.close()
+        menu_store = None
+    
+    if browser_supervisor:
+        print(f"[Browser] Closing global browser... {browser_supervisor.get_stats()}")
+        await browser_supervisor.close()
+        browser_supervisor = None
     
     if global_playwright:
         await global_playwright.stop()
@@ -51,10 +218,233 @@ async def close_browser():
     
     print("[Browser] Global browser closed")
 
-async def search_and_recommend(user_message: str) -> dict:
+def get_pool_stats() -> dict:
+    """取得 context pool 統計（hit/miss、等待時間）"""
+    return context_pool.get_stats() if context_pool else {}
+
+def get_browser_stats() -> dict:
+    """取得 browser 健康統計（回收次數、RSS、錯誤率）"""
+    return browser_supervisor.get_stats() if browser_supervisor else {}
+
+async def get_shard_stats() -> list:
+    """分片模式：各分片子程序內部的 pool / browser / consumer 統計（非分片模式回傳空列表）"""
+    return await shard_client.shard_stats() if shard_client else []
+
+async def _scrape_candidates(search_query: str, deadline: Deadline = None) -> tuple:
+    """
+    開瀏覽器搜尋候選店家（菜單補充另外由 _enrich_candidates 依每個用戶的 intent 決定）
+    
+    Args:
+        deadline: 任務時間預算（None = 各步驟用原本的 timeout）
+    
+    Returns:
+        (restaurants, strategy, partial)；partial = 預算用完，搜尋結果可能不完整
+    """
+    # 從 pool 取得 context（已預熱、已載入 cookies）
+    # 錄製模式（SCRAPER_RECORD_DIR）：每個查詢錄一份 HAR + 搜尋頁 HTML，資料夾名稱同 tests/bench_replay.py
+    async with context_slots, context_pool.lease(record_label=fixture_name(search_query)) as lease:
+        page = await lease.context.new_page()
+        
+        # 與 CLI scraper 共用同一套解析核心（feed API 優先，拿不到才解析 DOM）
+        print(f"[Worker] Searching for: {search_query}")
+        searcher = AsyncUberEatsSearcher(page, use_api=USE_API_CAPTURE, deadline=deadline)
+        restaurants = await searcher.search(search_query, limit=MAX_CARDS)
+        await lease.save_html(page, "search")
+        strategy = searcher.last_strategy
+        partial = searcher.partial
+        navigation_stats[strategy] += 1
+        extraction_stats[searcher.last_source] += 1
+        
+        for restaurant in restaurants:
+            if not (restaurant.get("url") or "").startswith("https://"):
+                restaurant["url"] = HOME_URL
+        
+        print(f"[Worker] Found {len(restaurants)} restaurants")
+        
+        if lease.route_stats:
+            print(f"[Worker] Requests: {lease.route_stats.to_dict()}")
+    
+    # context 已歸還 pool（重置後供下一個任務使用）
+    print(f"[Worker] Context released to pool")
+    
+    return restaurants, strategy, partial
+
+@asynccontextmanager
+async def _enrichment_context():
+    """菜單補充需要開分頁時才借 context（菜單都在 menu store 就不佔用 pool）"""
+    async with context_slots, context_pool.lease() as lease:
+        yield lease.context
+
+async def _enrich_candidates(restaurants: list, intent: dict, deadline: Deadline = None, force: bool = False) -> dict:
+    """
+    有預算需求時（或 force），平行抓前 K 家菜單，用真實價格評分
+    在快取 / single-flight 之後依每個用戶自己的 intent 執行：同一查詢的其他用戶沒有預算也不影響
+    
+    Returns:
+        {store_url: 菜單}；不需要補充或預算不足時為 None
+    """
+    if not restaurants or ENRICH_TOP_K <= 0 or not (force or intent.get("budget_max")):
+        return None
+    # 菜單補充的 deadline 取設定值與剩餘預算的較小者，不到 1 秒就跳過
+    enrich_budget = deadline.timeout(ENRICH_DEADLINE, reserve=RANK_RESERVE) if deadline else ENRICH_DEADLINE
+    if enrich_budget < 1:
+        return None
+    
+    candidates = ScoringEngine().score_restaurants(copy.deepcopy(restaurants), intent)
+    report = await enrich_with_menus(
+        None,
+        candidates,
+        top_k=ENRICH_TOP_K,
+        concurrency=ENRICH_CONCURRENCY,
+        deadline=enrich_budget,
+        menu_limit=ENRICH_MENU_LIMIT,
+        menu_store=menu_store,
+        open_context=_enrichment_context,
+    )
+    enrichment_stats["runs"] += 1
+    enrichment_stats["stores"] += report["completed"]
+    enrichment_stats["from_store"] += report["from_store"]
+    enrichment_stats["failed"] += report["failed"]
+    enrichment_stats["timed_out"] += report["timed_out"]
+    enrichment_stats["total_ms"] += report["elapsed_ms"]
+    print(f"[Worker] Enriched {report['completed'] + report['from_store']}/{report['requested']} menus "
+          f"({report['from_store']} from store) in {report['elapsed_ms']}ms "
+          f"(failed={report['failed']}, timed_out={report['timed_out']})")
+    return report["menu_data"]
+
+async def _coalesced_scrape(search_query: str, deadline: Deadline = None) -> tuple:
+    """
+    搜尋並寫入快取；同一查詢正在被其他 consumer 抓取時，直接等它的結果（不再開一個 context）
+    
+    Returns:
+        (restaurants, strategy, partial)，每個呼叫者各自一份副本（評分會寫入分數欄位）
+    """
+    async def scrape_and_cache():
+        scraped = await _scrape_candidates(search_query, deadline=deadline)
+        # 部分結果不寫入快取，避免之後的用戶一直拿到不完整的候選
+        if scraped[0] and not scraped[2]:
+            search_cache.put(search_query, DELIVERY_LOCATION, scraped[0])
+        return scraped
+    
+    key = search_cache.make_key(search_query, DELIVERY_LOCATION)
+    shared = await search_flight.do(key, scrape_and_cache)
+    return copy.deepcopy(shared)
+
+async def warm_search(search_query: str) -> bool:
+    """
+    預熱單一查詢（cache warmer 用）：搜尋 + 補充菜單，填入 search cache / menu store
+    
+    Returns:
+        是否真的有抓（快取仍新鮮時直接跳過）
+    """
+    if search_cache.is_fresh(search_query, DELIVERY_LOCATION):
+        return False
+    intent = IntentParser().parse(search_query)
+    restaurants, _, _ = await _coalesced_scrape(search_query)
+    await _enrich_candidates(restaurants, intent, force=True)
+    return True
+
+def queued_tasks() -> int:
+    """等待處理的任務數（磁碟 Queue + 排程器中等待的）"""
+    if task_queue is None:
+        return 0
+    return task_queue.qsize() + (scheduler.pending() if scheduler else 0)
+
+def enqueue_task(task: dict):
+    """webhook 放入任務（non-blocking，批次寫入磁碟）"""
+    if task_queue is None:
+        raise RuntimeError("Workers are not started")
+    task_queue.put_nowait(task)
+
+def _live_tasks_pending() -> bool:
+    """Queue 有任務或有 consumer 在處理（預熱讓路用）"""
+    return queued_tasks() > 0 or any(s["current_user"] for s in worker_stats.values())
+
+def start_cache_warmer():
+    """啟動用餐時段預熱排程（回傳背景 task）"""
+    global cache_warmer
+    cache_warmer = CacheWarmer(
+        shard_client.warm if shard_client else warm_search,
+        query_history,
+        is_busy=_live_tasks_pending,
+        top_n=CACHE_WARM_TOP_N,
+        lead_seconds=CACHE_WARM_LEAD,
+    )
+    return asyncio.create_task(cache_warmer.run())
+
+async def stop_cache_warmer(task):
+    """停止預熱排程並保存查詢歷史"""
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    query_history.save()
+
+async def _rank(restaurants: list, menu_data: dict, intent: dict) -> list:
+    """評分排序 + 取 Top 3（沒抓到菜單的店用店名估價）"""
+    # 有預算需求：其他候選店家若 menu store 有新鮮菜單，也用真實價格評分（SQLite 讀取放到 thread）
+    if intent.get("budget_max") and menu_store:
+        stored = await asyncio.to_thread(menu_store.get_fresh_many, [r.get("url") for r in restaurants])
+        if stored:
+            menu_data = {**stored, **(menu_data or {})}
+    
+    scored_restaurants = ScoringEngine().score_restaurants(restaurants, intent, menu_data=menu_data)
+    recommender = RecommendationGenerator()
+    return recommender.generate_top_recommendations(scored_restaurants, intent, top_n=3)
+
+def _ranking_changed(old: list, new: list) -> bool:
+    """Top 3 是否有實質變動（有店家進出榜；只是順序互換不算）"""
+    return {r.get("url") or r.get("name") for r in old} != {r.get("url") or r.get("name") for r in new}
+
+async def _revalidate(search_query: str, intent: dict, user_message: str, shown: list, on_update=None):
+    """
+    背景更新 stale 快取（stale-while-revalidate）
+    重新抓取後用同一個 intent 排名，Top 3 有變動且有 on_update 時推送更正
+    """
+    try:
+        restaurants, strategy, _ = await _coalesced_scrape(search_query)
+        if not restaurants:
+            return
+        menu_data = await _enrich_candidates(restaurants, intent)
+        
+        recommendations = await _rank(restaurants, menu_data, intent)
+        changed = _ranking_changed(shown, recommendations)
+        search_cache.record_revalidation(changed)
+        print(f"[Worker] Revalidated '{search_query}': ranking {'changed' if changed else 'unchanged'}")
+        
+        if changed and on_update:
+            await on_update({
+                'success': True,
+                'recommendations': recommendations,
+                'total_found': len(restaurants),
+                'query': user_message,
+                'strategy': strategy,
+                'correction': True,
+            })
+    except Exception as e:
+        print(f"[Worker] Revalidation failed for '{search_query}': {e}")
+
+def _schedule_revalidation(*args, **kwargs):
+    """建立背景更新 task（保留參照，避免還沒跑完就被 GC）"""
+    task = asyncio.create_task(_revalidate(*args, **kwargs))
+    revalidation_tasks.add(task)
+    task.add_done_callback(revalidation_tasks.discard)
+
+async def search_and_recommend(
+    user_message: str,
+    on_update=None,
+    cache_only: bool = False,
+    deadline: Deadline = None,
+    record_history: bool = True,
+) -> dict:
     """
     async 函數：執行搜尋 + 評分 + 推薦
-    使用 new_context(storage_state) 載入 cookies
+    從 context pool 取得已載入 cookies 的 context
+    
+    Args:
+        user_message: 用戶訊息
+        on_update: 回傳的是 stale 快取、背景更新後 Top 3 又變動時呼叫（async，參數為新的結果）
+        cache_only: 過載降級，只用快取（含已過 hard TTL 但還沒淘汰的）回答，不開瀏覽器
+        deadline: 任務時間預算；各步驟依剩餘時間縮短 timeout，不夠開瀏覽器時改用快取
+        record_history: 是否計入查詢歷史（同一則訊息逾時後改用快取重答時不重複計）
     
     Returns:
         {
@@ -73,204 +463,399 @@ async def search_and_recommend(user_message: str) -> dict:
     
     print(f"[Worker] Intent parsed: {search_query}")
     
-    # Step 2: 建立新 context（載入 cookies）
-    context = await global_browser.new_context(
-        storage_state=AUTH_STATE_PATH
-    )
+    if record_history:
+        query_history.record(intent["meal_type"] or meal_type_at(datetime.now()), search_query)
     
-    try:
-        page = await context.new_page()
-        
-        # 前往 Uber Eats 搜尋
-        print(f"[Worker] Navigating to Uber Eats...")
-        await page.goto("https://www.ubereats.com/tw")
-        await page.wait_for_timeout(2000)
-        
-        # 搜尋
-        print(f"[Worker] Searching for: {search_query}")
-        
-        # 找搜尋框並輸入
-        search_input = page.locator('input[data-testid="search-suggestions-input"]')
-        if await search_input.count() > 0:
-            await search_input.fill(search_query)
-            await search_input.press("Enter")
-            await page.wait_for_timeout(3000)
-        else:
-            # 備用方案：直接導航到搜尋結果頁
-            await page.goto(f"https://www.ubereats.com/tw/search?q={search_query}")
-            await page.wait_for_timeout(5000)
-        
-        # 等待搜尋結果
-        print(f"[Worker] Waiting for search results...")
-        await page.wait_for_selector('[data-testid*="store-card"]', timeout=10000)
-        
-        # 抓取餐廳資訊
-        print(f"[Worker] Extracting restaurant data...")
-        cards = await page.locator('[data-testid*="store-card"]').all()
-        
-        restaurants = []
-        for idx, card in enumerate(cards[:15]):  # 限制 15 家
-            try:
-                # 店名
-                name_elem = card.locator('h3')
-                name = await name_elem.inner_text() if await name_elem.count() > 0 else f"店家 {idx+1}"
-                
-                # 評分（精確選擇器：包含「評分」或「顆星」）
-                rating_elem = card.locator('[aria-label*="評分"]').first
-                rating_text = None
-                if await rating_elem.count() > 0:
-                    aria_label = await rating_elem.get_attribute('aria-label')
-                    # 從 aria-label 解析：「評分：4.1 顆星. 29 評論」
-                    if aria_label and '：' in aria_label:
-                        parts = aria_label.split('：')[1].split()
-                        if parts:
-                            rating_text = parts[0]  # "4.1"
-                
-                rating = float(rating_text) if rating_text and rating_text.replace('.', '').isdigit() else None
-                
-                # 評論數（從同一個 aria-label 解析）
-                review_count = None
-                if await rating_elem.count() > 0:
-                    aria_label = await rating_elem.get_attribute('aria-label')
-                    if aria_label and '評論' in aria_label:
-                        # 解析「29 評論」或「320+ 評論」
-                        import re
-                        match = re.search(r'(\d+\+?)\s*評論', aria_label)
-                        if match:
-                            review_count = match.group(1)
-                
-                # ETA（精確選擇器：包含「預估出發時間」）
-                eta_elem = card.locator('[aria-label*="預估出發時間"]').first
-                eta = None
-                if await eta_elem.count() > 0:
-                    aria_label = await eta_elem.get_attribute('aria-label')
-                    # 從 aria-label 解析：「預估出發時間：31 分鐘」
-                    if aria_label and '：' in aria_label:
-                        eta = aria_label.split('：')[1]  # "31 分鐘"
-                
-                # URL（確保有效）
-                link_elem = card.locator('a[href*="/store/"]')
-                url = await link_elem.get_attribute('href') if await link_elem.count() > 0 else None
-                if url:
-                    if not url.startswith('http'):
-                        url = f"https://www.ubereats.com{url}"
-                else:
-                    # 沒有 URL 就用首頁
-                    url = "https://www.ubereats.com/tw"
-                
-                # 最終驗證：確保是有效的 https URL
-                if not url.startswith('https://'):
-                    url = "https://www.ubereats.com/tw"
-                
-                restaurants.append({
-                    "name": name,
-                    "rating": rating,
-                    "review_count": review_count,
-                    "eta": eta,
-                    "url": url
-                })
-                
-            except Exception as e:
-                print(f"[Worker] Error extracting card {idx}: {e}")
-                continue
-        
-        print(f"[Worker] Found {len(restaurants)} restaurants")
-        
-    finally:
-        # 關閉 context（browser 保持開啟）
-        await context.close()
-        print(f"[Worker] Context closed")
+    if deadline and not cache_only and deadline.remaining() < MIN_SCRAPE_BUDGET:
+        print(f"[Worker] Only {deadline.remaining():.1f}s left, answering from cache only")
+        deadline_stats["degraded"] += 1
+        cache_only = True
+    
+    partial = False
+    
+    # Step 2: 先查快取（同查詢 + 同地點，TTL 內直接重用候選店家；過了 soft TTL 先回舊資料再背景更新）
+    cached = search_cache.get(search_query, DELIVERY_LOCATION, allow_expired=cache_only)
+    if cached:
+        restaurants, menu_data = cached.restaurants, cached.menu_data
+        strategy = "stale_cache" if cached.stale else "cache"
+        print(f"[Worker] Cache hit{' (stale)' if cached.stale else ''}: {len(restaurants)} restaurants "
+              f"(age {time.monotonic() - cached.created_at:.0f}s)")
+    elif cache_only:
+        print(f"[Worker] Cache-only miss (load shedding): {search_query}")
+        return {
+            'success': False,
+            'error': '目前搜尋的人太多了，這個查詢還沒有最近的結果，請稍後再試一次',
+            'strategy': 'shed'
+        }
+    else:
+        restaurants, strategy, partial = await _coalesced_scrape(search_query, deadline=deadline)
+        menu_data = None
+        if partial:
+            deadline_stats["partial"] += 1
     
     if not restaurants:
         return {
             'success': False,
-            'error': '抱歉，找不到符合需求的餐廳'
+            'error': '抱歉，這次搜尋超過時間了，請稍後再試一次' if partial else '抱歉，找不到符合需求的餐廳'
         }
     
-    # Step 3: 評分排序
-    scorer = ScoringEngine()
-    scored_restaurants = scorer.score_restaurants(restaurants, intent)
+    # Step 2.5: 這個用戶有預算需求時補充菜單（快取 / 合併的搜尋結果不帶菜單，各用戶依自己的 intent 決定）
+    # 降級中不開瀏覽器，只用 menu store 已有的菜單
+    if not cache_only:
+        enriched = await _enrich_candidates(restaurants, intent, deadline=deadline)
+        if enriched:
+            menu_data = {**(menu_data or {}), **enriched}
     
-    # Step 4: 生成推薦
-    recommender = RecommendationGenerator()
-    recommendations = recommender.generate_top_recommendations(scored_restaurants, intent, top_n=3)
+    # Step 3 + 4: 用這個用戶的 intent 評分排序，生成推薦
+    recommendations = await _rank(restaurants, menu_data, intent)
     
     print(f"[Worker] Top 3: {[r['name'] for r in recommendations]}")
     
+    # 降級中不排背景更新（不增加瀏覽器工作）
+    if cached and cached.stale and not cache_only:
+        _schedule_revalidation(
+            search_query, intent, user_message, recommendations,
+            on_update=on_update if SWR_PUSH_CORRECTIONS else None,
+        )
+    
     return {
         'success': True,
         'recommendations': recommendations,
         'total_found': len(restaurants),
-        'query': user_message
+        'query': user_message,
+        'strategy': strategy,
+        'partial': partial
     }
 
-async def background_worker(line_bot_api: LineBotApi):
+async def run_search(
+    user_message: str,
+    on_update=None,
+    cache_only: bool = False,
+    deadline: Deadline = None,
+    record_history: bool = True,
+) -> dict:
+    """執行一個搜尋任務：分片模式交給負責該查詢的子程序，否則在本程序執行"""
+    if shard_client:
+        # 分片子程序的查詢歷史不會保存，預熱排程在本程序，這裡記錄
+        parser = IntentParser()
+        intent = parser.parse(user_message)
+        search_query = parser.to_search_query(intent)
+        if record_history:
+            query_history.record(intent["meal_type"] or meal_type_at(datetime.now()), search_query)
+        result = await shard_client.search(user_message, on_update=on_update, cache_only=cache_only, deadline=deadline)
+        if result.get("success") and result.get("strategy") not in ("cache", "stale_cache"):
+            key = search_cache.make_key(search_query, DELIVERY_LOCATION)
+            recent_searches[key] = time.monotonic()
+            recent_searches.move_to_end(key)
+            while len(recent_searches) > SEARCH_CACHE_MAX_ENTRIES:
+                recent_searches.popitem(last=False)
+        return result
+    return await search_and_recommend(
+        user_message, on_update=on_update, cache_only=cache_only, deadline=deadline, record_history=record_history
+    )
+
+def _task_lane(task: dict) -> str:
+    """可由搜尋快取回答的任務走 fast lane，需要開瀏覽器的走 slow lane"""
+    if task.get("cache_only"):
+        return "fast"
+    parser = IntentParser()
+    search_query = parser.to_search_query(parser.parse(task["message"]))
+    if not shard_client:
+        return "fast" if search_cache.contains(search_query, DELIVERY_LOCATION) else "slow"
+    searched_at = recent_searches.get(search_cache.make_key(search_query, DELIVERY_LOCATION))
+    if searched_at is not None and time.monotonic() - searched_at <= search_cache.stale_ttl:
+        return "fast"
+    return "slow"
+
+async def _push_result(line_bot_api: LineBotApi, user_id: str, result: dict, timeout: float = None):
+    """
+    推送搜尋結果（push_message 是同步 HTTP，放到 thread 避免卡住其他 consumer）
+    timeout：HTTP 逾時秒數（依任務剩餘預算）
+    """
+    if result['success']:
+        # Debug: 打印 URL
+        print(f"\n[Worker Debug] Recommendations URLs:")
+        for idx, rec in enumerate(result['recommendations'], 1):
+            print(f"  {idx}. {rec.get('name')}: URL='{rec.get('url')}'")
+        
+        # 建立 Flex Message
+        flex_msg = create_recommendations_flex(
+            result['recommendations'],
+            result['query']
+        )
+        
+        # 推送結果給用戶（文字 + Flex Message）
+        if result.get('correction'):
+            header = f"剛剛的推薦已更新！最新 {result['total_found']} 家餐廳中的 Top 3："
+        else:
+            header = f"找到 {result['total_found']} 家餐廳！為你推薦 Top 3："
+        if result.get('partial'):
+            header += "\n（搜尋時間有限，結果可能不完整）"
+        messages = [
+            TextSendMessage(text=header),
+            flex_msg
+        ]
+    else:
+        # 推送錯誤訊息
+        messages = TextSendMessage(text=result['error'])
+    
+    await asyncio.to_thread(line_bot_api.push_message, user_id, messages, timeout=timeout)
+
+def _lane_load(lane: str) -> tuple:
+    """(該 lane 排在前面的任務數, 處理中的任務數, 可同時處理數)"""
+    if scheduler is None:
+        return queued_tasks(), 0, 1
+    ahead, running, slots = scheduler.lane_load(lane)
+    if lane == "slow":
+        # 還在磁碟 Queue、排程器尚未分流的任務一律當 slow 計算
+        ahead += task_queue.qsize()
+    return ahead, running, slots
+
+def admit(user_message: str) -> Admission:
+    """webhook 收件前的決定（收下 / 只用快取 / 拒絕），附排隊位置與預估等待秒數"""
+    return admission.decide(_task_lane({"message": user_message}), _lane_load, queued_tasks())
+
+def _task_budget(task: dict) -> tuple:
+    """
+    任務的時間預算（從 webhook 收到訊息起算；舊版任務沒有 deadline 就從現在起算）
+    
+    取出時預算已不夠開瀏覽器：
+    - 因重啟被放回的任務（延誤不是用戶造成的）：重新給 TASK_REDELIVERY_DEADLINE 秒，照常搜尋
+    - 在 Queue 排太久的任務：只用快取（含 stale）回答，給查快取 + 推送的短預算；沒有快取就請用戶稍後再試
+    
+    Returns:
+        (deadline, cache_only)
+    """
+    deadline = Deadline.from_epoch(task.get("deadline")) or Deadline.after(TASK_DEADLINE)
+    cache_only = task.get("cache_only", False)
+    if deadline.shrink(PUSH_RESERVE).remaining() >= MIN_SCRAPE_BUDGET:
+        return deadline, cache_only
+    if task.get(TASK_RELEASES):
+        print(f"[Worker] Task {task.get(TASK_ID)} expired during restart, renewing its budget")
+        deadline_stats["renewed"] += 1
+        return Deadline.after(TASK_REDELIVERY_DEADLINE), cache_only
+    print(f"[Worker] Task {task.get(TASK_ID)} expired in queue, answering from cache only")
+    deadline_stats["expired_in_queue"] += 1
+    return Deadline.after(PUSH_RESERVE * 2), True
+
+def _cancel_superseded(task: dict):
+    """排程器通知：處理中的任務被同一用戶的新訊息取代，取消它"""
+    job = active_jobs.get(task[TASK_ID])
+    if job and not job.done():
+        job.cancel()
+
+async def background_worker(line_bot_api: LineBotApi, worker_id: int = 0):
     """
     Background Worker - 從 Queue 取任務並處理
-    使用 async Playwright
+    多個 consumer 共用同一個 browser，各自從 pool 取 context
     """
-    print("[Worker] Background worker started")
+    stats = worker_stats.setdefault(worker_id, {
+        "processed": 0,
+        "failed": 0,
+        "superseded": 0,
+        "busy_seconds": 0.0,
+        "current_user": None,
+    })
+    print(f"[Worker-{worker_id}] Background worker started")
     
     while True:
         try:
-            # 從 Queue 取任務（blocking）
-            task = await task_queue.get()
+            # 從排程器取任務（blocking；各用戶輪流、快取可回答的優先）
+            task = await scheduler.get()
             
             user_id = task['user_id']
             user_message = task['message']
             
-            print(f"[Worker] Got task from user {user_id[:8]}...")
+            print(f"[Worker-{worker_id}] Got task from user {user_id[:8]}...")
+            stats["current_user"] = user_id[:8]
+            started = time.monotonic()
             
-            try:
+            deadline, cache_only = _task_budget(task)
+            
+            async def process(user_id=user_id, user_message=user_message,
+                              cache_only=cache_only, deadline=deadline):
                 # 執行搜尋（async）
-                result = await search_and_recommend(user_message)
+                async def push_correction(updated):
+                    await _push_result(line_bot_api, user_id, updated)
                 
-                if result['success']:
-                    # Debug: 打印 URL
-                    print(f"\n[Worker Debug] Recommendations URLs:")
-                    for idx, rec in enumerate(result['recommendations'], 1):
-                        print(f"  {idx}. {rec.get('name')}: URL='{rec.get('url')}'")
-                    
-                    # 建立 Flex Message
-                    flex_msg = create_recommendations_flex(
-                        result['recommendations'],
-                        result['query']
-                    )
-                    
-                    # 推送結果給用戶（文字 + Flex Message）
-                    line_bot_api.push_message(
-                        user_id,
-                        [
-                            TextSendMessage(text=f"找到 {result['total_found']} 家餐廳！為你推薦 Top 3："),
-                            flex_msg
-                        ]
-                    )
-                else:
-                    # 推送錯誤訊息
-                    line_bot_api.push_message(
-                        user_id,
-                        TextSendMessage(text=result['error'])
+                # 搜尋只能用到 deadline 前 PUSH_RESERVE 秒，保留時間推送
+                search_deadline = deadline.shrink(PUSH_RESERVE)
+                stage_started = time.monotonic()
+                try:
+                    result = await asyncio.wait_for(
+                        run_search(user_message, on_update=push_correction, cache_only=cache_only,
+                                   deadline=search_deadline),
+                        timeout=search_deadline.remaining(),
                     )
+                    stage = "cache" if result.get("strategy") in ("cache", "stale_cache", "shed") else "scrape"
+                except asyncio.TimeoutError:
+                    # 整體逾時（已取消進行中的搜尋）：用推送保留時間的一半盡力用快取回答
+                    print(f"[Worker] Deadline reached for '{user_message}', falling back to cache")
+                    deadline_stats["timed_out"] += 1
+                    stage = "scrape"
+                    fallback_deadline = deadline.shrink(PUSH_RESERVE / 2)
+                    try:
+                        result = await asyncio.wait_for(
+                            run_search(user_message, cache_only=True, deadline=fallback_deadline,
+                                       record_history=False),
+                            timeout=fallback_deadline.remaining(),
+                        )
+                    except asyncio.TimeoutError:
+                        result = {'success': False}
+                    if not result.get("success"):
+                        result = {'success': False, 'error': '抱歉，這次搜尋超過時間了，請稍後再試一次'}
+                service_times.observe(stage, time.monotonic() - stage_started)
                 
-                print(f"[Worker] Task completed, result pushed to user")
+                stage_started = time.monotonic()
+                await _push_result(line_bot_api, user_id, result, timeout=max(1.0, deadline.remaining()))
+                service_times.observe("push", time.monotonic() - stage_started)
+            
+            # 獨立 task 執行：同一用戶送了新訊息時可以只取消這個任務（_cancel_superseded）
+            job = asyncio.create_task(process())
+            active_jobs[task[TASK_ID]] = job
+            
+            try:
+                try:
+                    await asyncio.wait({job})
+                except asyncio.CancelledError:
+                    job.cancel()
+                    await asyncio.gather(job, return_exceptions=True)
+                    raise
+                
+                if job.cancelled():
+                    # 被新訊息取代：不推送結果，context 已在 lease 結束時淘汰
+                    stats["superseded"] += 1
+                    print(f"[Worker-{worker_id}] Task superseded by a newer message, dropped")
+                else:
+                    job.result()
+                    stats["processed"] += 1
+                    if browser_supervisor:
+                        browser_supervisor.record_task(True)
+                    
+                    print(f"[Worker-{worker_id}] Task completed, result pushed to user")
                 
             except Exception as e:
-                print(f"[Worker] Error processing task: {e}")
+                stats["failed"] += 1
+                if browser_supervisor:
+                    browser_supervisor.record_task(False)
+                print(f"[Worker-{worker_id}] Error processing task: {e}")
                 import traceback
                 traceback.print_exc()
                 
                 # 推送錯誤訊息
-                line_bot_api.push_message(
+                await asyncio.to_thread(
+                    line_bot_api.push_message,
                     user_id,
                     TextSendMessage(text=f"抱歉，處理時發生錯誤：{str(e)[:100]}")
                 )
             
+            except asyncio.CancelledError:
+                # 關閉時被取消：任務放回 Queue 並退還交付次數，下次啟動重新處理（不算失敗）
+                task_queue.release(task)
+                raise
+            
             finally:
-                # 標記任務完成
-                task_queue.task_done()
+                active_jobs.pop(task[TASK_ID], None)
+                stats["busy_seconds"] += time.monotonic() - started
+                stats["current_user"] = None
+                await scheduler.done(task)
+                # 標記任務完成（已放回的任務不受影響）
+                task_queue.ack(task)
                 
+        except asyncio.CancelledError:
+            print(f"[Worker-{worker_id}] Cancelled")
+            raise
         except Exception as e:
-            print(f"[Worker] Fatal error in background worker: {e}")
+            print(f"[Worker-{worker_id}] Fatal error in background worker: {e}")
             import traceback
             traceback.print_exc()
             await asyncio.sleep(1)  # 避免瘋狂重試
+
+def _notify_dead(line_bot_api: LineBotApi, task: dict):
+    """任務交付太多次仍失敗、移到 dead_tasks：通知用戶這則訊息沒辦法處理"""
+    async def push():
+        try:
+            await asyncio.to_thread(
+                line_bot_api.push_message,
+                task['user_id'],
+                TextSendMessage(text=f"抱歉，「{task['message'][:30]}」處理失敗了，請再傳一次試試看"),
+            )
+        except Exception as e:
+            print(f"[Worker] Failed to notify user about dead task {task.get(TASK_ID)}: {e}")
+    
+    job = asyncio.create_task(push())
+    notify_tasks.add(job)
+    job.add_done_callback(notify_tasks.discard)
+
+def start_workers(line_bot_api: LineBotApi, num_workers: int = WORKER_CONCURRENCY) -> list:
+    """開啟磁碟 Queue，啟動排程器 + N 個 consumer coroutine（共用全域 browser）"""
+    global task_queue, scheduler
+    task_queue = DurableTaskQueue(
+        TASK_QUEUE_PATH,
+        visibility_timeout=TASK_QUEUE_VISIBILITY_TIMEOUT,
+        max_attempts=TASK_QUEUE_MAX_ATTEMPTS,
+        batch_interval=TASK_QUEUE_BATCH_MS / 1000,
+        on_dead=lambda task: _notify_dead(line_bot_api, task),
+    )
+    scheduler = FairScheduler(
+        task_queue,
+        classify=_task_lane,
+        per_user_limit=SCHED_PER_USER_LIMIT,
+        slow_slots=min(SCHED_SLOW_SLOTS, num_workers),
+        consumers=num_workers,
+        fast_burst=SCHED_FAST_BURST,
+        supersede=SUPERSEDE_OLDER_TASKS,
+        on_superseded=_cancel_superseded,
+    )
+    scheduler.start()
+    tasks = [
+        asyncio.create_task(background_worker(line_bot_api, worker_id))
+        for worker_id in range(num_workers)
+    ]
+    print(f"[Worker] Started {num_workers} consumers ({task_queue.qsize()} tasks waiting in queue)")
+    return tasks
+
+async def stop_workers(tasks: list, drain_timeout: float = WORKER_DRAIN_TIMEOUT):
+    """
+    關閉 worker pool
+    等處理中的任務完成（最多 drain_timeout 秒）再取消所有 consumer；
+    還沒開始的任務留在磁碟 Queue，下次啟動時處理，被取消的任務也會放回
+    """
+    def running() -> int:
+        return sum(1 for s in worker_stats.values() if s["current_user"])
+    
+    if running():
+        print(f"[Worker] Waiting for {running()} running tasks (timeout {drain_timeout}s), "
+              f"{queued_tasks()} queued tasks kept for next start...")
+        deadline = time.monotonic() + drain_timeout
+        while running() and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if running():
+            print(f"[Worker] Drain timed out, {running()} running tasks released back to queue")
+    
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if scheduler:
+        await scheduler.close()
+    if task_queue:
+        await task_queue.close()
+    print(f"[Worker] All consumers stopped: {get_worker_stats()}")
+
+def get_worker_stats() -> dict:
+    """各 consumer 的統計 + 導航策略統計"""
+    return {
+        "consumers": {worker_id: dict(stats) for worker_id, stats in worker_stats.items()},
+        "navigation": dict(navigation_stats),
+        "extraction": dict(extraction_stats),
+        "enrichment": dict(enrichment_stats),
+        "search_cache": search_cache.get_stats(),
+        "single_flight": search_flight.get_stats(),
+        "cache_warmer": cache_warmer.get_stats() if cache_warmer else {},
+        "shards": shard_client.get_stats() if shard_client else {},
+        "task_queue": task_queue.get_stats() if task_queue else {},
+        "scheduler": scheduler.get_stats() if scheduler else {},
+        "admission": admission.get_stats(),
+        "deadline": dict(deadline_stats),
+        "menu_store": menu_store.get_stats() if menu_store else {},
+    }
@@ -0,0 +1,116 @@
+"""
+Benchmark: 搜尋結果卡片抓取（bulk evaluate vs 逐一 locator）
+比較兩種模式的 Playwright round-trip 次數與耗時
+
+使用方式：
+    # 先存一份搜尋結果頁（例如在 debug 時執行 page.content() 寫入檔案）
+    python tests/bench_card_extraction.py results/search_page.html --repeat 5
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from playwright.sync_api import sync_playwright, Locator
+from agent.scrapers.ubereats.search import UberEatsSearcher
+
+# 只建立 locator、不會送出 IPC 的方法
+LAZY_METHODS = {"locator", "nth", "filter", "get_by_text", "get_by_role", "get_by_test_id"}
+LAZY_PROPERTIES = {"first", "last"}
+
+class CallCounter:
+    """計算實際送到瀏覽器的呼叫次數"""
+
+    def __init__(self):
+        self.calls = 0
+
+class CountingProxy:
+    """包裝 Page / Locator，每次非 lazy 呼叫計為一次 round-trip"""
+
+    def __init__(self, target, counter: CallCounter):
+        self._target = target
+        self._counter = counter
+
+    def _wrap(self, value):
+        if isinstance(value, Locator):
+            return CountingProxy(value, self._counter)
+        if isinstance(value, list):
+            return [self._wrap(v) for v in value]
+        return value
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+
+        if name in LAZY_PROPERTIES:
+            return self._wrap(attr)
+
+        if not callable(attr):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if name not in LAZY_METHODS:
+                self._counter.calls += 1
+            return self._wrap(result)
+
+        return wrapper
+
+def run_mode(page, mode: str, repeat: int) -> dict:
+    """執行指定模式 repeat 次，回傳平均耗時與 round-trip 數"""
+    counter = CallCounter()
+    searcher = UberEatsSearcher(CountingProxy(page, counter), extraction_mode=mode)
+    extract = (
+        searcher._extract_restaurant_cards_bulk
+        if mode == "bulk"
+        else searcher._extract_restaurant_cards_locator
+    )
+
+    timings = []
+    results = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = extract()
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "mode": mode,
+        "cards": len(results),
+        "round_trips": counter.calls // repeat,
+        "avg_ms": sum(timings) / len(timings) * 1000,
+        "min_ms": min(timings) * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Card extraction benchmark")
+    parser.add_argument("html_path", help="存下來的搜尋結果頁 HTML")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.html_path, "r", encoding="utf-8") as f:
+        html = f.read()
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        page = browser.new_page()
+        page.set_content(html, wait_until="domcontentloaded")
+
+        reports = [run_mode(page, mode, args.repeat) for mode in ("locator", "bulk")]
+
+        browser.close()
+
+    print("=" * 60)
+    print(f"Card Extraction Benchmark ({os.path.basename(args.html_path)}, repeat={args.repeat})")
+    print("=" * 60)
+    for r in reports:
+        print(f"  {r['mode']:<8} cards={r['cards']:<4} round_trips={r['round_trips']:<5} "
+              f"avg={r['avg_ms']:.1f}ms min={r['min_ms']:.1f}ms")
+
+    locator, bulk = reports
+    if bulk["avg_ms"] > 0:
+        print(f"\n  Speedup: {locator['avg_ms'] / bulk['avg_ms']:.1f}x, "
+              f"round-trips {locator['round_trips']} -> {bulk['round_trips']}")
+
+if __name__ == "__main__":
+    main()
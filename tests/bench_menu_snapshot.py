@@ -0,0 +1,127 @@
+"""
+Benchmark: 店家頁面表頭欄位抓取（單次快照 vs 每個欄位各自 inner_text）
+比較 inner_text("body") 呼叫次數與耗時，並確認兩種方式結果一致
+
+使用方式：
+    python tests/bench_menu_snapshot.py results/store_a.html results/store_b.html --repeat 5
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from playwright.sync_api import sync_playwright
+from agent.scrapers.ubereats.parsing import StorePageSnapshot
+
+# ---- 舊版 UberEatsMenuScraper 的 per-field 抽取（原樣移植，作為比對基準）----
+
+def _old_rating(page):
+    for line in page.inner_text("body").split("\n"):
+        line = line.strip()
+        if len(line) > 1 and len(line) < 5:
+            try:
+                rating = float(line)
+                if 0 <= rating <= 5:
+                    return rating
+            except ValueError:
+                continue
+    return None
+
+def _old_review_count(page):
+    for line in page.inner_text("body").split("\n"):
+        if "(" in line and ")" in line and any(c.isdigit() for c in line):
+            return line.strip()
+        if "rating" in line.lower() and any(c.isdigit() for c in line):
+            return line.strip()
+    return None
+
+def _old_delivery_fee(page):
+    for line in page.inner_text("body").split("\n"):
+        line = line.strip()
+        if ("運費" in line or "delivery" in line.lower() or "fee" in line.lower()) and "$" in line:
+            return line
+    return None
+
+def _old_service_fee(page):
+    for line in page.inner_text("body").split("\n"):
+        line = line.strip()
+        if ("服務費" in line or "service" in line.lower()) and "$" in line:
+            return line
+    return None
+
+def _old_min_order(page):
+    for line in page.inner_text("body").split("\n"):
+        line = line.strip()
+        if ("最低" in line or "minimum" in line.lower()) and "$" in line:
+            return line
+    return None
+
+OLD_EXTRACTORS = {
+    "rating": _old_rating,
+    "review_count": _old_review_count,
+    "delivery_fee": _old_delivery_fee,
+    "service_fee": _old_service_fee,
+    "min_order": _old_min_order,
+}
+
+def extract_per_field(page) -> tuple:
+    """舊做法：每個欄位各自序列化一次 body 並掃描"""
+    fields = {name: extractor(page) for name, extractor in OLD_EXTRACTORS.items()}
+    return fields, len(OLD_EXTRACTORS)
+
+def extract_snapshot(page) -> tuple:
+    """新做法：一次快照，單次掃描"""
+    return StorePageSnapshot(page.inner_text("body")).fields, 1
+
+def time_it(func, page, repeat: int) -> dict:
+    timings = []
+    fields, calls = None, 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fields, calls = func(page)
+        timings.append(time.perf_counter() - start)
+    return {
+        "fields": fields,
+        "calls": calls,
+        "avg_ms": sum(timings) / len(timings) * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Store page snapshot benchmark")
+    parser.add_argument("html_paths", nargs="+", help="存下來的店家頁 HTML")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"Store Snapshot Benchmark (repeat={args.repeat})")
+    print("=" * 60)
+
+    total_old, total_new = 0.0, 0.0
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        page = browser.new_page()
+
+        for path in args.html_paths:
+            with open(path, "r", encoding="utf-8") as f:
+                page.set_content(f.read(), wait_until="domcontentloaded")
+
+            old = time_it(extract_per_field, page, args.repeat)
+            new = time_it(extract_snapshot, page, args.repeat)
+            total_old += old["avg_ms"]
+            total_new += new["avg_ms"]
+
+            same = "OK" if old["fields"] == new["fields"] else "MISMATCH"
+            print(f"\n  {os.path.basename(path)} [{same}]")
+            print(f"    per-field: inner_text x{old['calls']}  avg={old['avg_ms']:.1f}ms")
+            print(f"    snapshot : inner_text x{new['calls']}  avg={new['avg_ms']:.1f}ms")
+
+        browser.close()
+
+    if total_new > 0:
+        print(f"\n  Total: {total_old:.1f}ms -> {total_new:.1f}ms ({total_old / total_new:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark: 以錄製資料離線重播，量測 scraper 端到端耗時
+
+使用方式：
+    # 1. 錄製（需要已登入的 chromium_profile，會連網）
+    python tests/bench_replay.py record 麻辣
+
+    # 2. 重播（完全不連網，可重複執行比較優化前後）
+    python tests/bench_replay.py replay 麻辣 --repeat 5
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent.scrapers.browser_manager import BrowserManager
+from agent.scrapers.recording import fixture_name
+from agent.scrapers.ubereats.search import UberEatsSearcher
+from agent.scrapers.ubereats.menu import UberEatsMenuScraper
+
+# 配置
+PROFILE_PATH = os.path.join(os.path.dirname(__file__), "..", "chromium_profile")
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def record(query: str, fixtures_root: str):
+    """連網執行一次搜尋 + 菜單抓取，存下 HAR 與頁面 HTML"""
+    fixture_dir = os.path.join(fixtures_root, fixture_name(query))
+    if os.path.exists(fixture_dir):
+        shutil.rmtree(fixture_dir)
+
+    manager = BrowserManager(PROFILE_PATH, headless=True, record_dir=fixture_dir)
+    with manager as context:
+        page = manager.get_page(context)
+
+        results = UberEatsSearcher(page).search(query, limit=10)
+        manager.save_html(page, "search")
+
+        store_url = next((r["url"] for r in results if r.get("url")), None)
+        if store_url:
+            UberEatsMenuScraper(page).scrape_store(store_url, menu_limit=20)
+            manager.save_html(page, "store")
+
+    with open(os.path.join(fixture_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"query": query, "store_url": store_url, "results": len(results)}, f, ensure_ascii=False, indent=2)
+
+    print(f"\n[Saved] {fixture_dir}")
+
+def replay(query: str, fixtures_root: str, repeat: int):
+    """從錄製資料重播，量測 search / scrape_store 耗時"""
+    fixture_dir = os.path.join(fixtures_root, fixture_name(query))
+    with open(os.path.join(fixture_dir, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    timings = {"search": [], "scrape_store": []}
+    profile_dir = tempfile.mkdtemp(prefix="bench_profile_")
+
+    try:
+        with BrowserManager(profile_dir, headless=True, replay_dir=fixture_dir) as context:
+            page = context.pages[0] if context.pages else context.new_page()
+
+            for i in range(repeat):
+                start = time.perf_counter()
+                results = UberEatsSearcher(page).search(query, limit=10)
+                timings["search"].append(time.perf_counter() - start)
+
+                if meta.get("store_url"):
+                    start = time.perf_counter()
+                    UberEatsMenuScraper(page).scrape_store(meta["store_url"], menu_limit=20)
+                    timings["scrape_store"].append(time.perf_counter() - start)
+
+                print(f"  run {i + 1}: {len(results)} stores")
+    finally:
+        shutil.rmtree(profile_dir, ignore_errors=True)
+
+    print("\n" + "=" * 60)
+    print(f"Replay Benchmark: {query} (repeat={repeat})")
+    print("=" * 60)
+    for name, values in timings.items():
+        if values:
+            avg = sum(values) / len(values) * 1000
+            print(f"  {name:<13} avg={avg:.0f}ms min={min(values) * 1000:.0f}ms max={max(values) * 1000:.0f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline scraper benchmark")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("query")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--fixtures", default=FIXTURES_PATH)
+    args = parser.parse_args()
+
+    if args.mode == "record":
+        record(args.query, args.fixtures)
+    else:
+        replay(args.query, args.fixtures, args.repeat)
+
+if __name__ == "__main__":
+    main()
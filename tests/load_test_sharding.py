@@ -0,0 +1,172 @@
+"""
+Load test: 分片數 vs 搜尋吞吐量
+依序以 1, 2, 4 ... 個分片子程序跑相同的工作量，比較 req/s 是否接近線性成長
+（搜尋快取、菜單補充關閉，每一波的查詢互不重複，避免快取 / single-flight 影響結果）
+
+使用方式：
+    # 連網（需要 auth_state.json）
+    python tests/load_test_sharding.py --shards 1,2,4 --rounds 3
+
+    # 離線：先用 bench_replay.py record 錄下每個查詢，再從錄製資料重播
+    python tests/load_test_sharding.py --shards 1,2,4 --replay tests/fixtures
+
+    # 不開瀏覽器，只看 consistent hash 的分配（吞吐量上限 = 查詢數 / 最忙分片的查詢數）
+    python tests/load_test_sharding.py --shards 1,2,4 --placement-only
+
+預設 24 個查詢的 hash 分配（vnodes=64，--placement-only 的輸出）：
+    1 shard [24]、2 shards [10, 14]、4 shards [6, 8, 4, 6]
+最忙的分片決定整波的時間，所以 hash 路由下的加速上限是 2 shards 1.71x、4 shards 3.0x（不是線性）；
+要看 CPU / browser 本身能不能線性擴展，用 --routing round_robin。
+req/s 依機器核心數與記憶體而定，本檔不附實測數字，請在部署環境執行
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agent.scrapers.recording import fixture_name
+
+DEFAULT_QUERIES = [
+    "拉麵", "牛肉麵", "pizza", "壽司", "便當", "咖哩", "漢堡", "炸雞",
+    "火鍋", "滷味", "燒肉", "義大利麵", "水餃", "鍋貼", "粥", "三明治",
+    "蛋餅", "咖啡", "珍珠奶茶", "鹽酥雞", "越南河粉", "泰式", "韓式", "早午餐",
+]
+
+def merge_fixtures(fixtures_root: str, queries: list, target_dir: str) -> list:
+    """
+    把各查詢的錄製資料夾（HAR + pages/ HTML + pages.json）整個複製到同一個重播目錄的子資料夾，
+    FixtureReplayer 會一併載入；回傳有錄製資料的查詢
+    """
+    available = []
+    for query in queries:
+        fixture_dir = os.path.join(fixtures_root, fixture_name(query))
+        if not os.path.isdir(fixture_dir):
+            print(f"  [skip] no fixture for {query}")
+            continue
+        shutil.copytree(fixture_dir, os.path.join(target_dir, fixture_name(query)))
+        available.append(query)
+    return available
+
+def configure_env(work_dir: str, replay_dir: str = None):
+    """子程序以 spawn 啟動，會繼承這裡設定的環境變數"""
+    os.environ["SEARCH_CACHE_TTL"] = "0"
+    os.environ["SEARCH_CACHE_STALE_TTL"] = "0"
+    os.environ["ENRICH_TOP_K"] = "0"
+    os.environ["MENU_STORE_PATH"] = os.path.join(work_dir, "menu_store.db")
+    os.environ["CACHE_WARM_HISTORY_PATH"] = os.path.join(work_dir, "query_history.json")
+    os.environ["TASK_QUEUE_PATH"] = os.path.join(work_dir, "task_queue.db")
+    if replay_dir:
+        os.environ["SCRAPER_REPLAY_DIR"] = replay_dir
+        # 重播不需要登入，給一份空的 storage state
+        auth_path = os.path.join(work_dir, "auth_state.json")
+        with open(auth_path, "w", encoding="utf-8") as f:
+            json.dump({"cookies": [], "origins": []}, f)
+        os.environ["AUTH_STATE_PATH"] = auth_path
+
+async def run_load(num_shards: int, queries: list, rounds: int, concurrency: int, routing: str) -> dict:
+    """啟動 num_shards 個分片，跑 rounds 波（每波每個查詢一次），回傳吞吐量"""
+    from interfaces.line_bot.sharding import ShardedSearchClient
+
+    client = ShardedSearchClient(num_shards, concurrency=concurrency)
+    await client.start()
+
+    placement = Counter()
+    failures = 0
+    try:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            jobs = []
+            for idx, query in enumerate(queries):
+                shard_id = idx % num_shards if routing == "round_robin" else client.shard_for(query)
+                placement[shard_id] += 1
+                jobs.append(client.search(query, shard_id=shard_id))
+            results = await asyncio.gather(*jobs, return_exceptions=True)
+            failures += sum(1 for r in results if isinstance(r, Exception) or not r.get("success"))
+        elapsed = time.perf_counter() - start
+    finally:
+        await client.close()
+
+    total = len(queries) * rounds
+    return {
+        "shards": num_shards,
+        "requests": total,
+        "failures": failures,
+        "elapsed": elapsed,
+        "throughput": total / elapsed if elapsed > 0 else 0.0,
+        "placement": [placement[i] for i in range(num_shards)],
+    }
+
+def print_placement(shard_counts: list, queries: list, vnodes: int = 64):
+    """consistent hash 的查詢分配與理論加速上限（不需要 browser）"""
+    from interfaces.line_bot.sharding import HashRing, routing_key
+
+    print(f"  {'shards':>6} {'max':>4} {'bound':>7}  placement")
+    for num_shards in shard_counts:
+        ring = HashRing(list(range(num_shards)), vnodes=vnodes)
+        placement = Counter(ring.node_for(routing_key(query, "default")) for query in queries)
+        busiest = max(placement.values())
+        print(f"  {num_shards:>6} {busiest:>4} {len(queries) / busiest:>6.2f}x  "
+              f"{[placement[i] for i in range(num_shards)]}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Scraper sharding load test")
+    parser.add_argument("--shards", default="1,2,4", help="要測的分片數（逗號分隔）")
+    parser.add_argument("--rounds", type=int, default=3, help="每個查詢跑幾次")
+    parser.add_argument("--concurrency", type=int, default=4, help="每個分片同時處理幾個任務")
+    parser.add_argument("--routing", choices=["hash", "round_robin"], default="hash",
+                        help="hash = 正式的 consistent hash；round_robin = 平均分配，只看 CPU 擴展")
+    parser.add_argument("--replay", help="錄製資料根目錄（tests/fixtures），不給則連網")
+    parser.add_argument("--queries", nargs="*", default=DEFAULT_QUERIES)
+    parser.add_argument("--placement-only", action="store_true", help="只印 hash 分配與加速上限，不啟動分片")
+    args = parser.parse_args()
+
+    shard_counts = [int(n) for n in args.shards.split(",")]
+    if args.placement_only:
+        print_placement(shard_counts, args.queries)
+        return
+    work_dir = tempfile.mkdtemp(prefix="shard_load_")
+    queries = args.queries
+
+    try:
+        replay_dir = None
+        if args.replay:
+            replay_dir = os.path.join(work_dir, "replay")
+            os.makedirs(replay_dir)
+            queries = merge_fixtures(args.replay, queries, replay_dir)
+            if not queries:
+                print("[ERROR] No fixtures found, record some with tests/bench_replay.py first")
+                return
+        configure_env(work_dir, replay_dir)
+
+        print("=" * 60)
+        print(f"Sharding Load Test ({len(queries)} queries x {args.rounds} rounds, "
+              f"routing={args.routing}, cpus={os.cpu_count()})")
+        print("=" * 60)
+
+        results = []
+        for num_shards in shard_counts:
+            print(f"\n[*] {num_shards} shard(s)...")
+            results.append(asyncio.run(
+                run_load(num_shards, queries, args.rounds, args.concurrency, args.routing)
+            ))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    base = results[0]["throughput"] / results[0]["shards"] if results and results[0]["throughput"] else None
+    print("\n" + "=" * 60)
+    print(f"  {'shards':>6} {'req':>5} {'fail':>5} {'elapsed':>9} {'req/s':>7} {'speedup':>8} {'eff':>5}  placement")
+    for r in results:
+        speedup = r["throughput"] / (base * results[0]["shards"]) if base else 0.0
+        efficiency = r["throughput"] / (base * r["shards"]) if base else 0.0
+        print(f"  {r['shards']:>6} {r['requests']:>5} {r['failures']:>5} {r['elapsed']:>8.1f}s "
+              f"{r['throughput']:>7.2f} {speedup:>7.2f}x {efficiency:>5.0%}  {r['placement']}")
+
+if __name__ == "__main__":
+    main()
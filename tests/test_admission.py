@@ -0,0 +1,57 @@
+"""
+Admission Control 測試：EWMA 服務時間、等待時間估計、收件 / 降級 / 拒絕
+"""
+import pytest
+
+from interfaces.line_bot.admission import (
+    ACCEPT,
+    CACHE_ONLY,
+    REJECT,
+    AdmissionController,
+    ServiceTimeEstimator,
+)
+
+
+def _load(fast=(0, 0, 4), slow=(0, 0, 3)):
+    lanes = {"fast": fast, "slow": slow}
+    return lambda lane: lanes[lane]
+
+
+def test_ewma_starts_from_first_sample_then_smooths():
+    estimator = ServiceTimeEstimator(alpha=0.5, defaults={"scrape": 15.0, "push": 0.5})
+    assert estimator.estimate("scrape") == 15.0
+    estimator.observe("scrape", 10.0)
+    assert estimator.estimate("scrape") == 10.0
+    estimator.observe("scrape", 20.0)
+    assert estimator.estimate("scrape") == 15.0
+    assert estimator.service_time("slow") == pytest.approx(15.5)
+
+
+def test_estimate_wait_counts_tasks_ahead_per_slot():
+    estimator = ServiceTimeEstimator(defaults={"scrape": 9.0, "push": 1.0})
+    controller = AdmissionController(estimator)
+    # 有空位：只要自己的處理時間
+    assert controller.estimate_wait("slow", ahead=0, running=2, slots=3) == 10.0
+    # 3 個名額都在忙、前面還有 3 個：要等 4 個任務讓位（4 / 3 輪）
+    assert controller.estimate_wait("slow", ahead=3, running=3, slots=3) == pytest.approx(4 / 3 * 10 + 10)
+
+
+def test_decide_accepts_sheds_and_rejects():
+    estimator = ServiceTimeEstimator(defaults={"cache": 0.5, "scrape": 10.0, "push": 0.5})
+    controller = AdmissionController(estimator, shed_wait=30, max_queued=50)
+
+    accepted = controller.decide("slow", _load(), queued=0)
+    assert accepted.decision == ACCEPT and accepted.admitted
+
+    shed = controller.decide("slow", _load(slow=(9, 3, 3), fast=(2, 1, 4)), queued=12)
+    assert shed.decision == CACHE_ONLY and shed.cache_only
+    assert shed.position == 2
+    assert shed.wait_seconds == 1.0
+
+    rejected = controller.decide("fast", _load(), queued=50)
+    assert rejected.decision == REJECT and not rejected.admitted
+    assert rejected.position == 50
+
+    assert controller.get_stats()[ACCEPT] == 1
+    assert controller.get_stats()[CACHE_ONLY] == 1
+    assert controller.get_stats()[REJECT] == 1
@@ -0,0 +1,75 @@
+"""
+Feed API 擷取測試：第一份回應只是第一頁時，要等後續回應收完才使用結果
+"""
+import asyncio
+
+from agent.scrapers.ubereats.api_capture import FeedResponseCollector
+
+
+class FakePage:
+    async def wait_for_timeout(self, ms):
+        await asyncio.sleep(ms / 1000)
+
+
+class FakeResponse:
+    url = "https://www.ubereats.com/_p/api/getSearchFeedV1"
+    status = 200
+
+    def __init__(self, stores: list, parse_delay: float = 0):
+        self.stores = stores
+        self.parse_delay = parse_delay
+
+    async def json(self):
+        await asyncio.sleep(self.parse_delay)
+        return {"data": {"feedItems": [{"store": store} for store in self.stores]}}
+
+
+def _stores(start: int, count: int) -> list:
+    return [
+        {"storeUuid": f"uuid-{i}", "title": {"text": f"店家 {i}"}, "slug": f"s{i}"}
+        for i in range(start, start + count)
+    ]
+
+
+async def _feed_in_pages(collector: FeedResponseCollector, pages: int, per_page: int, gap: float):
+    for page in range(pages):
+        await collector.handle_async(FakeResponse(_stores(page * per_page, per_page), parse_delay=gap / 2))
+        await asyncio.sleep(gap / 2)
+
+
+def test_wait_for_settled_collects_incremental_pages():
+    async def run():
+        collector = FeedResponseCollector()
+        feeding = asyncio.ensure_future(_feed_in_pages(collector, pages=3, per_page=4, gap=0.1))
+        assert await collector.wait_for_records_async(FakePage(), timeout_ms=1000)
+        assert len(collector.records) < 12  # 只收到第一頁
+
+        assert await collector.wait_for_settled_async(FakePage(), settle_ms=300, timeout_ms=2000, poll_ms=20)
+        assert len(collector.records) == 12
+        await feeding
+
+    asyncio.run(run())
+
+
+def test_wait_for_settled_stops_early_when_enough_records():
+    async def run():
+        collector = FeedResponseCollector()
+        feeding = asyncio.ensure_future(_feed_in_pages(collector, pages=3, per_page=4, gap=0.2))
+        assert await collector.wait_for_settled_async(
+            FakePage(), settle_ms=2000, timeout_ms=3000, enough=8, poll_ms=20
+        )
+        assert 8 <= len(collector.records) < 12
+        await feeding
+
+    asyncio.run(run())
+
+
+def test_wait_for_settled_times_out_while_pages_keep_arriving():
+    async def run():
+        collector = FeedResponseCollector()
+        feeding = asyncio.ensure_future(_feed_in_pages(collector, pages=6, per_page=2, gap=0.1))
+        assert await collector.wait_for_records_async(FakePage(), timeout_ms=1000)
+        assert not await collector.wait_for_settled_async(FakePage(), settle_ms=300, timeout_ms=250, poll_ms=20)
+        await feeding
+
+    asyncio.run(run())
@@ -0,0 +1,98 @@
+"""
+ContextPool 測試：建立 context 途中被取消（任務被取代 / deadline）要歸還名額
+"""
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("playwright")
+
+from interfaces.line_bot.context_pool import ContextPool
+from agent.scrapers.resource_blocking import BlockingProfile
+
+
+class FakeContext:
+    def __init__(self, hang_route: bool = False):
+        self.hang_route = hang_route
+        self.closed = False
+        self.pages = []
+
+    async def route(self, pattern, handler):
+        if self.hang_route:
+            await asyncio.Event().wait()
+
+    async def close(self):
+        self.closed = True
+
+    async def clear_cookies(self):
+        pass
+
+    async def add_cookies(self, cookies):
+        pass
+
+
+class HangingBrowser:
+    """前 hang 次 new_context 卡住不回（模擬慢的 browser），之後正常建立"""
+
+    def __init__(self, hang: int, hang_route: bool = False):
+        self.hang = hang
+        self.hang_route = hang_route
+        self.created = []
+
+    async def new_context(self, **kwargs):
+        if self.hang_route:
+            context = FakeContext(hang_route=self.hang > 0)
+            self.hang -= 1
+            self.created.append(context)
+            return context
+        if self.hang > 0:
+            self.hang -= 1
+            await asyncio.Event().wait()
+        context = FakeContext()
+        self.created.append(context)
+        return context
+
+
+def _pool(tmp_path, browser, **kwargs) -> ContextPool:
+    state_path = tmp_path / "auth_state.json"
+    state_path.write_text(json.dumps({"cookies": [], "origins": []}))
+    return ContextPool(browser, str(state_path), min_size=0, max_size=2, **kwargs)
+
+
+async def _cancel_acquires(pool: ContextPool, count: int):
+    acquires = [asyncio.ensure_future(pool.acquire()) for _ in range(count)]
+    await asyncio.sleep(0.05)
+    for acquire in acquires:
+        acquire.cancel()
+    await asyncio.gather(*acquires, return_exceptions=True)
+
+
+def test_cancelled_create_releases_slot(tmp_path):
+    async def run():
+        pool = _pool(tmp_path, HangingBrowser(hang=2))
+        await _cancel_acquires(pool, 2)
+        assert pool.get_stats()["live"] == 0
+
+        # 名額都還回來：後續 acquire 不會永遠等待
+        entries = await asyncio.wait_for(asyncio.gather(pool.acquire(), pool.acquire()), timeout=1)
+        for entry in entries:
+            await pool.release(entry)
+        await pool.close()
+
+    asyncio.run(run())
+
+
+def test_cancelled_create_closes_half_created_context(tmp_path):
+    async def run():
+        browser = HangingBrowser(hang=1, hang_route=True)
+        pool = _pool(tmp_path, browser, blocking_profile=BlockingProfile())
+        await _cancel_acquires(pool, 1)
+        assert pool.get_stats()["live"] == 0
+        assert browser.created[0].closed
+
+        entry = await asyncio.wait_for(pool.acquire(), timeout=1)
+        await pool.release(entry)
+        await pool.close()
+
+    asyncio.run(run())
@@ -0,0 +1,35 @@
+"""
+Deadline 測試：剩餘時間、階段 timeout 與子預算
+"""
+import time
+
+from agent.scrapers.deadline import Deadline, stage_timeout_ms
+
+
+def test_timeout_is_capped_by_stage_limit_and_remaining_budget():
+    deadline = Deadline.after(10)
+    assert deadline.timeout(5) == 5
+    assert 7.5 < deadline.timeout(30, reserve=2) <= 8
+    assert deadline.timeout(30, reserve=20) == 0
+    assert not deadline.expired()
+
+
+def test_expired_deadline_never_returns_playwright_unlimited_timeout():
+    deadline = Deadline(time.time() - 1)
+    assert deadline.expired()
+    assert deadline.remaining() == 0
+    # Playwright 的 timeout=0 是不限時
+    assert deadline.timeout_ms(10000) == 1
+
+
+def test_shrink_and_epoch_round_trip():
+    deadline = Deadline.after(45)
+    search = deadline.shrink(3)
+    assert abs((deadline.remaining() - search.remaining()) - 3) < 0.01
+    assert Deadline.from_epoch(deadline.expires_at).expires_at == deadline.expires_at
+    assert Deadline.from_epoch(None) is None
+
+
+def test_stage_timeout_without_deadline_uses_cap():
+    assert stage_timeout_ms(None, 15000) == 15000
+    assert stage_timeout_ms(Deadline.after(2), 15000) <= 2000
@@ -0,0 +1,187 @@
+"""
+DurableTaskQueue 測試：租用 / ack / nack / dead-letter / 關閉放回
+"""
+import asyncio
+import sqlite3
+
+from interfaces.line_bot.durable_queue import DurableTaskQueue, TASK_ATTEMPT, TASK_ID, TASK_RELEASES
+
+
+def _open(db_path, **kwargs) -> DurableTaskQueue:
+    kwargs.setdefault("batch_interval", 0.001)
+    kwargs.setdefault("poll_interval", 0.01)
+    return DurableTaskQueue(str(db_path), **kwargs)
+
+
+def _rows(db_path, table: str) -> int:
+    conn = sqlite3.connect(str(db_path))
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_put_get_ack(tmp_path):
+    async def run():
+        queue = _open(tmp_path / "q.db")
+        queue.put_nowait({"user_id": "u1", "message": "便當"})
+        task = await asyncio.wait_for(queue.get(), timeout=1)
+        assert task["message"] == "便當"
+        assert task[TASK_ATTEMPT] == 1
+        queue.ack(task)
+        await queue.close()
+
+    asyncio.run(run())
+    assert _rows(tmp_path / "q.db", "tasks") == 0
+
+
+def test_nack_redelivers_and_counts_attempt(tmp_path):
+    async def run():
+        queue = _open(tmp_path / "q.db")
+        queue.put_nowait({"user_id": "u1", "message": "拉麵"})
+        first = await asyncio.wait_for(queue.get(), timeout=1)
+        queue.nack(first)
+        second = await asyncio.wait_for(queue.get(), timeout=1)
+        assert second[TASK_ID] == first[TASK_ID]
+        assert second[TASK_ATTEMPT] == 2
+        assert queue.get_stats()["redelivered"] == 1
+        queue.ack(second)
+        await queue.close()
+
+    asyncio.run(run())
+
+
+def test_dead_letter_after_max_attempts(tmp_path):
+    dead = []
+
+    async def run():
+        queue = _open(tmp_path / "q.db", max_attempts=2, on_dead=dead.append)
+        queue.put_nowait({"user_id": "u1", "message": "毒任務"})
+        for _ in range(2):
+            queue.nack(await asyncio.wait_for(queue.get(), timeout=1))
+        queue.put_nowait({"user_id": "u2", "message": "正常"})
+        task = await asyncio.wait_for(queue.get(), timeout=1)
+        assert task["message"] == "正常"
+        queue.ack(task)
+        await queue.close()
+
+    asyncio.run(run())
+    assert [task["user_id"] for task in dead] == ["u1"]
+    assert _rows(tmp_path / "q.db", "dead_tasks") == 1
+
+
+def test_graceful_restarts_do_not_dead_letter_unprocessed_tasks(tmp_path):
+    """預取 / 暫存中還沒處理完的任務，關閉時放回並退還交付次數"""
+    db_path = tmp_path / "q.db"
+    dead = []
+
+    async def first_run():
+        queue = _open(db_path, max_attempts=3, prefetch=4, on_dead=dead.append)
+        for i in range(3):
+            queue.put_nowait({"user_id": f"u{i}", "message": f"m{i}"})
+        queue.ack(await asyncio.wait_for(queue.get(), timeout=1))
+        await queue.close()
+
+    async def restart():
+        queue = _open(db_path, max_attempts=3, prefetch=4, on_dead=dead.append)
+        # 交給排程器暫存但沒開始處理就關閉
+        await asyncio.wait_for(queue.get(), timeout=1)
+        await queue.close()
+
+    asyncio.run(first_run())
+    for _ in range(3):
+        asyncio.run(restart())
+
+    assert dead == []
+    assert _rows(db_path, "dead_tasks") == 0
+    assert _rows(db_path, "tasks") == 2
+
+
+def test_qsize_tracks_visible_tasks_in_memory(tmp_path):
+    async def run():
+        queue = _open(tmp_path / "q.db", prefetch=1)
+        for i in range(3):
+            queue.put_nowait({"user_id": "u1", "message": f"m{i}"})
+        assert queue.qsize() == 3
+        await queue.flush()
+        assert queue.qsize() == 3
+        task = await asyncio.wait_for(queue.get(), timeout=1)
+        assert queue.qsize() == 2
+        queue.nack(task)
+        await queue.flush()
+        assert queue.qsize() == 3
+        await queue.close()
+
+    asyncio.run(run())
+
+
+def test_extend_expiring_covers_prefetched_tasks(tmp_path):
+    async def run():
+        queue = _open(tmp_path / "q.db", visibility_timeout=10, prefetch=4)
+        for i in range(3):
+            queue.put_nowait({"user_id": "u1", "message": f"m{i}"})
+        held = await asyncio.wait_for(queue.get(), timeout=1)
+        # 剛租用的租約還有 10 秒：8 秒內到期的不用延長
+        assert await queue.extend_expiring([held], within=8) == 0
+        # 全部（1 筆已交付 + 2 筆預取）都延長
+        assert await queue.extend_expiring([held], within=11) == 3
+        await queue.close()
+
+    asyncio.run(run())
+
+
+def test_tasks_interrupted_mid_processing_are_refunded(tmp_path):
+    """處理到一半被關閉取消的任務（release 或仍在 in-flight）重啟多次也不會變成 dead"""
+    db_path = tmp_path / "q.db"
+    dead = []
+
+    async def first_run():
+        queue = _open(db_path, max_attempts=2, on_dead=dead.append)
+        queue.put_nowait({"user_id": "u1", "message": "處理中"})
+        await queue.flush()
+        await queue.close()
+
+    async def interrupted(explicit_release: bool):
+        queue = _open(db_path, max_attempts=2, on_dead=dead.append)
+        task = await asyncio.wait_for(queue.get(), timeout=1)
+        assert task[TASK_ATTEMPT] == 1
+        if explicit_release:
+            queue.release(task)
+            queue.ack(task)  # worker 的 finally 仍會呼叫 ack：已放回的任務不受影響
+        await queue.close()
+
+    asyncio.run(first_run())
+    for i in range(4):
+        asyncio.run(interrupted(explicit_release=i % 2 == 0))
+
+    assert dead == []
+    assert _rows(db_path, "dead_tasks") == 0
+    assert _rows(db_path, "tasks") == 1
+
+
+def test_released_tasks_record_release_count(tmp_path):
+    """因關閉放回的任務帶 _releases（worker 據此判斷預算是否因重啟延誤）；重新 put 不保留"""
+    db_path = tmp_path / "q.db"
+
+    async def first_run():
+        queue = _open(db_path)
+        queue.put_nowait({"user_id": "u1", "message": "咖哩", "deadline": 1.0})
+        task = await asyncio.wait_for(queue.get(), timeout=1)
+        assert TASK_RELEASES not in task
+        queue.release(task)
+        await queue.close()
+
+    async def second_run():
+        queue = _open(db_path)
+        task = await asyncio.wait_for(queue.get(), timeout=1)
+        assert task[TASK_RELEASES] == 1
+        assert task["deadline"] == 1.0
+        queue.ack(task)
+        queue.put_nowait(task)
+        again = await asyncio.wait_for(queue.get(), timeout=1)
+        assert TASK_RELEASES not in again
+        queue.ack(again)
+        await queue.close()
+
+    asyncio.run(first_run())
+    asyncio.run(second_run())
@@ -0,0 +1,121 @@
+"""
+菜單補充測試：呼叫端被取消時，平行分頁也要一起取消
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("playwright")
+
+from interfaces.line_bot import enrichment
+
+
+class FakePage:
+    def __init__(self, opened: list):
+        self.opened = opened
+        opened.append(self)
+
+    async def close(self):
+        self.opened.remove(self)
+
+
+class FakeContext:
+    def __init__(self):
+        self.opened = []
+
+    async def new_page(self):
+        return FakePage(self.opened)
+
+
+def _restaurants(count: int) -> list:
+    return [{"name": f"店家 {i}", "url": f"https://www.ubereats.com/tw/store/s{i}/abc{i}"} for i in range(count)]
+
+
+def test_cancelling_caller_cancels_child_scrapes(monkeypatch):
+    finished = []
+
+    class SlowScraper:
+        def __init__(self, page):
+            self.page = page
+
+        async def scrape_store(self, url, menu_limit=20, deadline=None):
+            await asyncio.sleep(0.5)
+            finished.append(url)
+            return {"url": url, "menu_items": []}
+
+    monkeypatch.setattr(enrichment, "AsyncUberEatsMenuScraper", SlowScraper)
+
+    async def run():
+        context = FakeContext()
+        caller = asyncio.ensure_future(
+            enrichment.enrich_with_menus(context, _restaurants(3), top_k=3, concurrency=3, deadline=5)
+        )
+        await asyncio.sleep(0.2)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        # 分頁都已關閉，也不會在之後跑完
+        assert context.opened == []
+        await asyncio.sleep(0.5)
+        assert finished == []
+
+    asyncio.run(run())
+
+
+def test_deadline_keeps_finished_menus(monkeypatch):
+    class MixedScraper:
+        def __init__(self, page):
+            self.page = page
+
+        async def scrape_store(self, url, menu_limit=20, deadline=None):
+            await asyncio.sleep(0.01 if url.endswith("abc0") else 1)
+            return {"url": url, "menu_items": [{"name": "便當", "price": "$100"}]}
+
+    monkeypatch.setattr(enrichment, "AsyncUberEatsMenuScraper", MixedScraper)
+
+    async def run():
+        context = FakeContext()
+        report = await enrichment.enrich_with_menus(context, _restaurants(2), top_k=2, deadline=0.2)
+        assert report["completed"] == 1
+        assert report["timed_out"] == 1
+        assert list(report["menu_data"]) == [_restaurants(1)[0]["url"]]
+        assert context.opened == []
+
+    asyncio.run(run())
+
+
+def test_open_context_only_when_menus_are_missing(monkeypatch, tmp_path):
+    from contextlib import asynccontextmanager
+
+    from agent.cache.menu_store import MenuStore
+
+    class QuickScraper:
+        def __init__(self, page):
+            self.page = page
+
+        async def scrape_store(self, url, menu_limit=20, deadline=None):
+            return {"name": url, "menu_items": [{"name": "牛肉麵", "price": "$150"}]}
+
+    monkeypatch.setattr(enrichment, "AsyncUberEatsMenuScraper", QuickScraper)
+    leases = []
+
+    @asynccontextmanager
+    async def open_context():
+        context = FakeContext()
+        leases.append(context)
+        yield context
+
+    async def run():
+        store = MenuStore(str(tmp_path / "menus.db"))
+        first = await enrichment.enrich_with_menus(
+            None, _restaurants(2), top_k=2, deadline=5, menu_store=store, open_context=open_context
+        )
+        assert first["completed"] == 2 and len(leases) == 1
+        # 菜單都在 store：不借 context
+        second = await enrichment.enrich_with_menus(
+            None, _restaurants(2), top_k=2, deadline=5, menu_store=store, open_context=open_context
+        )
+        assert second["from_store"] == 2 and len(leases) == 1
+        store.close()
+
+    asyncio.run(run())
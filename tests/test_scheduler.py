@@ -0,0 +1,136 @@
+"""
+FairScheduler 測試：用戶輪流、lane 名額、暫存任務的租約延長
+"""
+import asyncio
+
+from interfaces.line_bot.durable_queue import DurableTaskQueue
+from interfaces.line_bot.scheduler import FairScheduler
+
+
+def _open(db_path, **kwargs) -> DurableTaskQueue:
+    kwargs.setdefault("batch_interval", 0.001)
+    kwargs.setdefault("poll_interval", 0.01)
+    return DurableTaskQueue(str(db_path), **kwargs)
+
+
+def _by_message(task) -> str:
+    return "slow" if task["message"].startswith("slow") else "fast"
+
+
+async def _settle(scheduler: FairScheduler, count: int):
+    """等排程器從磁碟 Queue 收齊 count 個任務"""
+    for _ in range(200):
+        if scheduler.pending() >= count:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"scheduler only buffered {scheduler.pending()} of {count} tasks")
+
+
+def test_round_robin_between_users(tmp_path):
+    async def run():
+        queue = _open(tmp_path / "q.db", prefetch=10)
+        scheduler = FairScheduler(queue, classify=_by_message, per_user_limit=5, supersede=False)
+        for i in range(3):
+            queue.put_nowait({"user_id": "flood", "message": f"f{i}"})
+        queue.put_nowait({"user_id": "other", "message": "o0"})
+        scheduler.start()
+        await _settle(scheduler, 4)
+
+        order = [(await scheduler.get())["user_id"] for _ in range(3)]
+        assert order[:2] == ["flood", "other"]
+        await scheduler.close()
+        await queue.close()
+
+    asyncio.run(run())
+
+
+def test_per_user_limit_and_slow_slots(tmp_path):
+    async def run():
+        queue = _open(tmp_path / "q.db", prefetch=10)
+        scheduler = FairScheduler(queue, classify=_by_message, per_user_limit=1, slow_slots=1, supersede=False)
+        queue.put_nowait({"user_id": "a", "message": "slow a1"})
+        queue.put_nowait({"user_id": "a", "message": "fast a2"})
+        queue.put_nowait({"user_id": "b", "message": "slow b1"})
+        queue.put_nowait({"user_id": "c", "message": "fast c1"})
+        scheduler.start()
+        await _settle(scheduler, 4)
+
+        first = await scheduler.get()
+        second = await scheduler.get()
+        assert {first["message"], second["message"]} == {"fast a2", "fast c1"}
+        third = await scheduler.get()
+        assert third["message"] == "slow b1"
+
+        # a 已有任務在處理、slow 名額也用完：拿不到下一個
+        waiter = asyncio.ensure_future(scheduler.get())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        await scheduler.done(first)
+        await asyncio.sleep(0.05)
+        assert not waiter.done()  # slow 名額仍被 b 佔用
+        await scheduler.done(third)
+        assert (await asyncio.wait_for(waiter, timeout=1))["message"] == "slow a1"
+
+        await scheduler.close()
+        await queue.close()
+
+    asyncio.run(run())
+
+
+def test_buffered_and_prefetched_leases_are_renewed(tmp_path):
+    """排隊超過 visibility_timeout 的任務不會被其他程序重複租用"""
+    db_path = tmp_path / "q.db"
+
+    async def run():
+        queue = _open(db_path, visibility_timeout=0.4, prefetch=2)
+        scheduler = FairScheduler(queue, classify=_by_message, max_buffered=1, supersede=False)
+        for i in range(3):
+            queue.put_nowait({"user_id": f"u{i}", "message": f"m{i}"})
+        scheduler.start()
+        await _settle(scheduler, 1)
+        await asyncio.sleep(1.0)
+
+        # m0 在排程器暫存、m1 在本地預取：都不能被其他程序租走；m2 還沒被租用
+        other = _open(db_path, visibility_timeout=0.4)
+        claimed, _, _ = other._claim(10)
+        assert [task["message"] for task in claimed] == ["m2"]
+        await other.close()
+        assert scheduler.get_stats()["lease_extensions"] > 0
+
+        await scheduler.close()
+        await queue.close()
+
+    asyncio.run(run())
+
+
+def test_newer_message_supersedes_queued_and_running_tasks(tmp_path):
+    async def run():
+        cancelled = []
+        queue = _open(tmp_path / "q.db", prefetch=10)
+        scheduler = FairScheduler(queue, classify=_by_message, on_superseded=cancelled.append)
+        queue.put_nowait({"user_id": "u1", "message": "第一則"})
+        scheduler.start()
+        await _settle(scheduler, 1)
+        running = await scheduler.get()
+
+        queue.put_nowait({"user_id": "u1", "message": "第二則"})
+        queue.put_nowait({"user_id": "u1", "message": "第三則"})
+        for _ in range(200):
+            if scheduler.get_stats()["superseded_queued"]:
+                break
+            await asyncio.sleep(0.01)
+
+        assert [task["message"] for task in cancelled] == ["第一則"]
+        assert running.get("_superseded")
+        stats = scheduler.get_stats()
+        assert stats["superseded_queued"] == 1
+        assert stats["lanes"]["fast"]["waiting"] == 1
+
+        await scheduler.done(running)
+        latest = await asyncio.wait_for(scheduler.get(), timeout=1)
+        assert latest["message"] == "第三則"
+        assert scheduler.get_stats()["superseded_running"] == 1
+        await scheduler.close()
+        await queue.close()
+
+    asyncio.run(run())
@@ -0,0 +1,51 @@
+"""
+SingleFlight 測試：合併相同查詢、leader 被取消時 follower 接手
+"""
+import asyncio
+
+import pytest
+
+from agent.cache.single_flight import SingleFlight
+
+
+def test_followers_share_leader_result():
+    async def run():
+        flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return ["A", "B"]
+
+        results = await asyncio.gather(*(flight.do("便當", fetch) for _ in range(3)))
+        assert results == [["A", "B"]] * 3
+        assert len(calls) == 1
+        assert flight.get_stats()["followers"] == 2
+        assert flight.in_flight() == 0
+
+    asyncio.run(run())
+
+
+def test_follower_takes_over_when_leader_is_cancelled():
+    async def run():
+        flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return len(calls)
+
+        leader = asyncio.ensure_future(flight.do("拉麵", fetch))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(flight.do("拉麵", fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+
+        assert await asyncio.wait_for(follower, timeout=1) == 2
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert flight.get_stats()["leaders"] == 2
+
+    asyncio.run(run())